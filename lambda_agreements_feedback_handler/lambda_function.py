@@ -1,10 +1,9 @@
 import json
 import boto3
 from botocore.exceptions import ClientError
-import psycopg2
-from urllib.parse import urlparse
 from datetime import date, datetime
 import os
+from shared.db import database_from_env
 
 SECRET_NAME = os.getenv("APP_SECRET_NAME")
 
@@ -28,23 +27,84 @@ def get_secret(secret_parameter):
     secret = json.loads(secret)
     return secret[secret_parameter]
 
-_conn = None
-DB_URL = get_secret("DATABASE_URL")
-
-def get_conn():
-    global _conn
-    if _conn is None or _conn.closed:
-        url = urlparse(DB_URL)
-        _conn = psycopg2.connect(
-            dbname=url.path.lstrip("/"),
-            user=url.username,
-            password=url.password,
-            host=url.hostname,
-            port=url.port or 5432,
-            connect_timeout=5,
-        )
-        _conn.autocommit = True  # or manage commit/rollback explicitly
-    return _conn
+db = database_from_env(lambda: get_secret("DATABASE_URL"))
+
+UPSERT_AGREEMENT_SQL = """
+INSERT INTO public.agreements (
+    s3_path,
+    document_title,
+    student_first_name,
+    student_last_name,
+    student_nickname,
+    parent_guardian_full_name,
+    parent_guardian_email,
+    second_parent_guardian_full_name,
+    second_parent_guardian_email,
+    student_courses,
+    student_campus,
+    student_college_bound,
+    current_grade,
+    total_tuition,
+    one_to_one_sessions,
+    homework_studio_sessions,
+    scheduled_start_date,
+    scholarship_type,
+    scholarship_payment,
+    is_single_payment,
+    payment_amount,
+    is_human_approved,
+    document_id
+)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (s3_path)
+DO UPDATE SET
+    document_title = EXCLUDED.document_title,
+    student_first_name = EXCLUDED.student_first_name,
+    student_last_name = EXCLUDED.student_last_name,
+    student_nickname = EXCLUDED.student_nickname,
+    parent_guardian_full_name = EXCLUDED.parent_guardian_full_name,
+    parent_guardian_email = EXCLUDED.parent_guardian_email,
+    second_parent_guardian_full_name = EXCLUDED.second_parent_guardian_full_name,
+    second_parent_guardian_email = EXCLUDED.second_parent_guardian_email,
+    student_courses = EXCLUDED.student_courses,
+    student_campus = EXCLUDED.student_campus,
+    student_college_bound = EXCLUDED.student_college_bound,
+    current_grade = EXCLUDED.current_grade,
+    total_tuition = EXCLUDED.total_tuition,
+    one_to_one_sessions = EXCLUDED.one_to_one_sessions,
+    homework_studio_sessions = EXCLUDED.homework_studio_sessions,
+    scheduled_start_date = EXCLUDED.scheduled_start_date,
+    scholarship_type = EXCLUDED.scholarship_type,
+    scholarship_payment = EXCLUDED.scholarship_payment,
+    is_single_payment = EXCLUDED.is_single_payment,
+    payment_amount = EXCLUDED.payment_amount,
+    is_human_approved = TRUE,
+    document_id = EXCLUDED.document_id,
+    -- lambda_db_save skips saves whose fingerprint matches the stored one;
+    -- this save does not compute it, so the next one there always writes
+    content_fingerprint = NULL
+RETURNING id;
+"""
+
+AGREEMENT_BY_S3_PATH_SQL = """
+SELECT
+a.*,
+COALESCE(
+    json_agg(s.*) FILTER (WHERE s.id IS NOT NULL),
+    '[]'::json
+) AS services
+FROM public.agreements a
+LEFT JOIN public.agreements_service_agreements asa
+ON asa.agreement_id = a.id
+LEFT JOIN public.agreement_services s
+ON s.id = asa.agreement_service_id
+WHERE a.s3_path = %s
+GROUP BY a.id;
+"""
+
+db.prepare("upsert_agreement", UPSERT_AGREEMENT_SQL)
+db.prepare("agreement_by_s3_path", AGREEMENT_BY_S3_PATH_SQL)
+
 
 def upsert_agreement(conn, agreement, s3_path):
     """
@@ -52,63 +112,10 @@ def upsert_agreement(conn, agreement, s3_path):
     Returns agreement.id
     """
 
-    sql = """
-    INSERT INTO public.agreements (
-        s3_path,
-        document_title,
-        student_first_name,
-        student_last_name,
-        student_nickname,
-        parent_guardian_full_name,
-        parent_guardian_email,
-        second_parent_guardian_full_name,
-        second_parent_guardian_email,
-        student_courses,
-        student_campus,
-        student_college_bound,
-        current_grade,
-        total_tuition,
-        one_to_one_sessions,
-        homework_studio_sessions,
-        scheduled_start_date,
-        scholarship_type,
-        scholarship_payment,
-        is_single_payment,
-        payment_amount,
-        is_human_approved,
-        document_id
-    )
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (s3_path)
-    DO UPDATE SET
-        document_title = EXCLUDED.document_title,
-        student_first_name = EXCLUDED.student_first_name,
-        student_last_name = EXCLUDED.student_last_name,
-        student_nickname = EXCLUDED.student_nickname,
-        parent_guardian_full_name = EXCLUDED.parent_guardian_full_name,
-        parent_guardian_email = EXCLUDED.parent_guardian_email,
-        second_parent_guardian_full_name = EXCLUDED.second_parent_guardian_full_name,
-        second_parent_guardian_email = EXCLUDED.second_parent_guardian_email,
-        student_courses = EXCLUDED.student_courses,
-        student_campus = EXCLUDED.student_campus,
-        student_college_bound = EXCLUDED.student_college_bound,
-        current_grade = EXCLUDED.current_grade,
-        total_tuition = EXCLUDED.total_tuition,
-        one_to_one_sessions = EXCLUDED.one_to_one_sessions,
-        homework_studio_sessions = EXCLUDED.homework_studio_sessions,
-        scheduled_start_date = EXCLUDED.scheduled_start_date,
-        scholarship_type = EXCLUDED.scholarship_type,
-        scholarship_payment = EXCLUDED.scholarship_payment,
-        is_single_payment = EXCLUDED.is_single_payment,
-        payment_amount = EXCLUDED.payment_amount,
-        is_human_approved = TRUE,
-        document_id = EXCLUDED.document_id
-    RETURNING id;
-    """
-
     with conn.cursor() as cur:
-        cur.execute(
-            sql,
+        db.execute(
+            cur,
+            "upsert_agreement",
             (
                 s3_path,
                 agreement["document_title"],
@@ -141,24 +148,22 @@ def upsert_agreement(conn, agreement, s3_path):
 
 
 def lambda_handler(event, context):
+    db.begin_request()
+    try:
+        return _handle(event)
+    finally:
+        db.report()
+
+
+def _handle(event):
     qs_params = event.get("queryStringParameters") or {}
     path_value = qs_params.get("s3_path")  # will be None if not provided
     method = event["httpMethod"]
 
-    DB_URL = get_secret("DATABASE_URL")
-
     if method == "GET":
         if not path_value:
             try:
-                url = urlparse(DB_URL)
-                conn = psycopg2.connect(
-                    dbname=url.path.lstrip('/'),
-                    user=url.username,
-                    password=url.password,
-                    host=url.hostname,
-                    port=url.port or 5432,
-                    connect_timeout=5,
-                )
+                conn = db.connection()
                 cur = conn.cursor()
                 cur.execute("SELECT * FROM public.agreements;")
                 rows = cur.fetchall()
@@ -166,7 +171,6 @@ def lambda_handler(event, context):
                 colnames = [desc[0] for desc in cur.description]
 
                 cur.close()
-                conn.close()
 
                 results = [
                     {col: convert(val) for col, val in zip(colnames, row)}
@@ -184,6 +188,7 @@ def lambda_handler(event, context):
                 }
 
             except Exception as e:
+                db.close()
                 return {
                     "statusCode": 500,
                     "headers": {
@@ -195,31 +200,7 @@ def lambda_handler(event, context):
         if path_value:
             print(f"There is path value: {path_value}")
             try:
-                url = urlparse(DB_URL)
-                conn = psycopg2.connect(
-                    dbname=url.path.lstrip('/'),
-                    user=url.username,
-                    password=url.password,
-                    host=url.hostname,
-                    port=url.port or 5432,
-                    connect_timeout=5,
-                )
-                sql = """
-                    SELECT
-                    a.*,
-                    COALESCE(
-                        json_agg(s.*) FILTER (WHERE s.id IS NOT NULL),
-                        '[]'::json
-                    ) AS services
-                    FROM public.agreements a
-                    LEFT JOIN public.agreements_service_agreements asa
-                    ON asa.agreement_id = a.id
-                    LEFT JOIN public.agreement_services s
-                    ON s.id = asa.agreement_service_id
-                    WHERE a.s3_path = %s
-                    GROUP BY a.id;
-                    """
-
+                conn = db.connection()
                 cur = conn.cursor()
                 """
                 cur.execute(
@@ -227,13 +208,12 @@ def lambda_handler(event, context):
                     (path_value,)
                 )
                 """
-                cur.execute(sql, (path_value,))
+                db.execute(cur, "agreement_by_s3_path", (path_value,))
 
                 row = cur.fetchone()
                 colnames = [desc[0] for desc in cur.description]
 
                 cur.close()
-                conn.close()
 
                 # result = dict(zip(colnames, row))
                 results = {col: val for col, val in zip(colnames, row)}
@@ -245,6 +225,7 @@ def lambda_handler(event, context):
                 results.pop("created_at")
                 results.pop("updated_at")
                 results.pop("deleted_at")
+                results.pop("content_fingerprint", None)
 
                 return {
                     "statusCode": 200,
@@ -257,6 +238,7 @@ def lambda_handler(event, context):
 
             except Exception as e:
                 print(f"ERROR: {e}")
+                db.close()
                 return {
                     "statusCode": 500,
                     "headers": {
@@ -277,7 +259,7 @@ def lambda_handler(event, context):
             }
 
         agreement = json.loads(event["body"])
-        conn = get_conn()
+        conn = db.connection()
 
         try:
             print("UPDATE...")
@@ -292,13 +274,6 @@ def lambda_handler(event, context):
                 "body": json.dumps("UPDATED")
             }
         except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            # optionally force reconnect next time:
-            try:
-                conn.close()
-            except Exception:
-                pass
+            # Roll back and reconnect on the next request
+            db.close()
             raise
@@ -0,0 +1,103 @@
+"""
+How a validated agreement (AgreementData.model_dump()) maps onto the
+agreements and agreement_services columns, and the content fingerprints of
+those rows. Shared by the single upsert and the bulk ingest.
+"""
+import hashlib
+import json
+
+# agreements columns after s3_path, in the order agreement_values returns them
+AGREEMENT_COLUMNS = (
+    "document_title",
+    "student_first_name",
+    "student_last_name",
+    "student_nickname",
+    "parent_guardian_full_name",
+    "parent_guardian_email",
+    "second_parent_guardian_full_name",
+    "second_parent_guardian_email",
+    "student_courses",
+    "student_campus",
+    "student_college_bound",
+    "current_grade",
+    "total_tuition",
+    "one_to_one_sessions",
+    "homework_studio_sessions",
+    "scheduled_start_date",
+    "scholarship_type",
+    "scholarship_payment",
+    "is_single_payment",
+    "payment_amount",
+    "is_human_approved",
+    "is_valid",
+    "document_id",
+)
+
+SERVICE_COLUMNS = ("service_name", "cost_per_unit", "units", "tuition")
+
+
+def agreement_values(agreement):
+    """The AGREEMENT_COLUMNS values as they are written to agreements."""
+    return (
+        agreement["document_title"],
+        agreement["student_first_name"],
+        agreement["student_last_name"],
+        agreement["student_nickname"],
+        agreement["parent_guardian_full_name"],
+        agreement["parent_guardian_email"],
+        agreement["second_parent_guardian_full_name"],
+        agreement["second_parent_guardian_email"],
+        agreement["student_courses"],
+        agreement["student_campus"],
+        agreement["student_college_bound"],
+        int(agreement["current_grade"] or 0),
+        float(agreement["total_tuition"] or 0),
+        int(agreement["one_to_one_sessions"] or 0),
+        int(agreement["homework_studio_sessions"] or 0),
+        str(agreement["scheduled_start_date"]),
+        agreement["scholarship_type"],
+        agreement["scholarship_payment"],
+        bool(agreement["is_single_payment"] or False),
+        float(agreement["payment_amount"] or 0),
+        agreement["is_human_approved"],
+        agreement["is_valid"],
+        agreement["document_id"]
+    )
+
+
+def service_row(service):
+    """(service_name, cost_per_unit, units, tuition) as they are written to agreement_services."""
+    return (
+        service["service_name"],
+        float(service["cost_per_unit"] or 0),
+        int(service["units"] or 0),
+        float(service["tuition"] or 0),
+    )
+
+
+def service_fingerprint(service_name, cost_per_unit, units, tuition):
+    """
+    Content hash of a service. Amounts are rounded so a row read back from a
+    numeric column matches the float it was written from.
+    """
+    canonical = "|".join([
+        (service_name or "").strip(),
+        f"{float(cost_per_unit or 0):.4f}",
+        f"{float(units or 0):.4f}",
+        f"{float(tuition or 0):.4f}",
+    ])
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def agreement_fingerprint(values, services):
+    """
+    Content hash of everything upsert_agreement writes for an agreement: the
+    column values and the services in any order. Stored as
+    agreements.content_fingerprint so a save with nothing new is skipped.
+    """
+    canonical = json.dumps(
+        {"values": values, "services": sorted(service_fingerprint(*service_row(s)) for s in services)},
+        default=str,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
@@ -0,0 +1,87 @@
+"""
+Ingest throughput of bulk.merge_agreements against one upsert_agreement per
+agreement, on a scratch Postgres.
+
+    PYTHONPATH=.. DATABASE_URL=postgresql://postgres@localhost/scratch python -m benchmarks.bulk_ingest --agreements 2000
+    PYTHONPATH=.. python -m benchmarks.bulk_ingest --dsn postgresql://... --agreements 5000 --services 4 --rtt 0.02
+
+Each path ingests the same number of new agreements, then the same batch
+again unchanged, then again with one service changed in each agreement.
+--rtt sleeps that many seconds before every statement, as in
+benchmarks.upsert_services.
+"""
+import argparse
+import contextlib
+import os
+import time
+import uuid
+
+import psycopg2
+
+from benchmarks.upsert_services import SCHEMA_SQL, SlowCursor, sample_agreement, with_changed_service
+
+
+def _batch(prefix: str, count: int, services: int) -> list:
+    return [(i, dict(sample_agreement(services), s3_path=f"{prefix}/{i:06d}.pdf")) for i in range(count)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Scratch database (default DATABASE_URL)")
+    parser.add_argument("--agreements", type=int, default=1000)
+    parser.add_argument("--services", type=int, default=3, help="Services per agreement")
+    parser.add_argument("--rtt", type=float, default=0.0, help="Simulated round trip per statement, in seconds")
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    os.environ["DATABASE_URL"] = args.dsn
+    import bulk
+    import lambda_function
+    import maintenance
+
+    SlowCursor.rtt = args.rtt
+    conn = psycopg2.connect(args.dsn, cursor_factory=SlowCursor)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+
+    def one_by_one(agreements):
+        for _, agreement in agreements:
+            lambda_function.upsert_agreement(conn, agreement, agreement["s3_path"])
+
+    def merged(agreements):
+        bulk.merge_agreements(conn, agreements)
+
+    prefix = f"bench/{uuid.uuid4().hex[:8]}"
+    print(f"{args.agreements} agreements with {args.services} services each, rows/s (statements)")
+    print(f"{'':>12} {'new':>18} {'unchanged':>18} {'one changed':>18}")
+    devnull = open(os.devnull, "w")
+    try:
+        for name, ingest in (("one by one", one_by_one), ("bulk", merged)):
+            batch = _batch(f"{prefix}/{name.replace(' ', '-')}", args.agreements, args.services)
+            changed = [(i, with_changed_service(a)) for i, a in batch]
+            cells = []
+            for agreements in (batch, batch, changed):
+                SlowCursor.statements = 0
+                with contextlib.redirect_stdout(devnull):
+                    started = time.perf_counter()
+                    ingest(agreements)
+                    elapsed = time.perf_counter() - started
+                cells.append(f"{len(agreements) / elapsed:.0f} ({SlowCursor.statements})")
+            print(f"{name:>12} " + " ".join(f"{cell:>18}" for cell in cells))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM public.agreements_service_agreements WHERE agreement_id IN "
+                "(SELECT id FROM public.agreements WHERE s3_path LIKE %s)", (f"{prefix}/%",))
+            cur.execute("DELETE FROM public.agreements WHERE s3_path LIKE %s", (f"{prefix}/%",))
+        with contextlib.redirect_stdout(devnull):
+            maintenance.collect_orphan_services(conn)
+        devnull.close()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
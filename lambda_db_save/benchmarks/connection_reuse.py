@@ -0,0 +1,108 @@
+"""
+Per-request database time for the two hot statements with shared.db.Database:
+a new connection per request (what the feedback handler's GET used to do),
+one reused connection, and one reused connection with PREPAREd statements.
+
+    cd lambda_db_save
+    PYTHONPATH=.. DATABASE_URL=postgresql://postgres@localhost/scratch python -m benchmarks.connection_reuse
+
+Seeds one agreement with --services services into a scratch database, then
+runs --requests requests of each kind: the single-agreement join query of
+the feedback handler and an unchanged re-save through upsert_agreement.
+"""
+import argparse
+import contextlib
+import importlib.util
+import os
+import statistics
+import time
+import uuid
+
+import psycopg2
+
+from benchmarks.upsert_services import SCHEMA_SQL, sample_agreement
+
+FEEDBACK_HANDLER = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "lambda_agreements_feedback_handler", "lambda_function.py")
+
+
+def _feedback_handler():
+    # Both Lambdas call their module lambda_function
+    spec = importlib.util.spec_from_file_location("feedback_handler", FEEDBACK_HANDLER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Scratch database (default DATABASE_URL)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--services", type=int, default=5)
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    os.environ["DATABASE_URL"] = args.dsn
+    import lambda_function
+
+    feedback = _feedback_handler()
+    s3_path = f"bench/{uuid.uuid4().hex[:8]}/agreement.pdf"
+    agreement = sample_agreement(args.services)
+
+    devnull = open(os.devnull, "w")
+    seed = psycopg2.connect(args.dsn)
+    seed.autocommit = True
+    with seed.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+    with contextlib.redirect_stdout(devnull):
+        lambda_function.upsert_agreement(seed, agreement, s3_path)
+
+    # The handler's own Database, with the feedback handler's query added
+    db = lambda_function.db
+    db.prepare("agreement_by_s3_path", feedback.AGREEMENT_BY_S3_PATH_SQL)
+    db.health_check_seconds = 3600
+
+    def get_agreement():
+        with db.connection().cursor() as cur:
+            db.execute(cur, "agreement_by_s3_path", (s3_path,))
+            cur.fetchall()
+
+    def resave():
+        # Unchanged, so a single statement
+        lambda_function.upsert_agreement(db.connection(), agreement, s3_path)
+
+    requests = {"agreement_by_s3_path": get_agreement, "upsert_agreement (unchanged)": resave}
+    modes = [("connect per request", False, True), ("reused", False, False), ("reused + prepared", True, False)]
+    print(f"{'':>20} " + " ".join(f"{name:>30}" for name in requests))
+    try:
+        for label, prepared, reconnect in modes:
+            db.close()
+            db.use_prepared = prepared
+            cells = []
+            for request in requests.values():
+                samples = []
+                with contextlib.redirect_stdout(devnull):
+                    for i in range(args.requests + 1):
+                        if reconnect:
+                            db.close()
+                        started = time.perf_counter()
+                        db.begin_request()
+                        request()
+                        # The first request of a mode warms up (connects, prepares)
+                        if i:
+                            samples.append(time.perf_counter() - started)
+                cells.append(f"{statistics.median(samples) * 1000:.2f}ms")
+            print(f"{label:>20} " + " ".join(f"{cell:>30}" for cell in cells))
+    finally:
+        devnull.close()
+        with seed.cursor() as cur:
+            cur.execute("DELETE FROM public.agreements_service_agreements WHERE agreement_id IN "
+                        "(SELECT id FROM public.agreements WHERE s3_path = %s)", (s3_path,))
+            cur.execute("DELETE FROM public.agreements WHERE s3_path = %s", (s3_path,))
+        seed.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,218 @@
+"""
+Write latency of upsert_agreement against a local Postgres as the number of
+services per agreement grows.
+
+    PYTHONPATH=.. DATABASE_URL=postgresql://postgres@localhost/scratch python -m benchmarks.upsert_services
+    PYTHONPATH=.. python -m benchmarks.upsert_services --dsn postgresql://... --services 1,5,20,50 --rtt 0.02
+
+Creates the three tables it writes to if they are missing, so point it at a
+scratch database. Each size is saved --repeat times with the old
+per-service INSERT loop, with upsert_agreement changing one service per save,
+and with upsert_agreement re-saving an unchanged agreement (one statement,
+no writes). --rtt sleeps that many seconds before every statement to
+stand in for a remote database.
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import time
+import uuid
+
+import psycopg2
+import psycopg2.extensions
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS public.agreements (
+    id serial PRIMARY KEY,
+    s3_path text UNIQUE NOT NULL,
+    document_title text,
+    student_first_name text,
+    student_last_name text,
+    student_nickname text,
+    parent_guardian_full_name text,
+    parent_guardian_email text,
+    second_parent_guardian_full_name text,
+    second_parent_guardian_email text,
+    student_courses text,
+    student_campus text,
+    student_college_bound text,
+    current_grade integer,
+    total_tuition numeric,
+    one_to_one_sessions integer,
+    homework_studio_sessions integer,
+    scheduled_start_date text,
+    scholarship_type text,
+    scholarship_payment numeric,
+    is_single_payment boolean,
+    payment_amount numeric,
+    is_human_approved boolean,
+    is_valid boolean,
+    document_id text,
+    content_fingerprint text
+);
+CREATE TABLE IF NOT EXISTS public.agreement_services (
+    id serial PRIMARY KEY,
+    service_name text,
+    cost_per_unit numeric,
+    units numeric,
+    tuition numeric
+);
+CREATE TABLE IF NOT EXISTS public.agreements_service_agreements (
+    id serial PRIMARY KEY,
+    agreement_id integer REFERENCES public.agreements (id),
+    agreement_service_id integer REFERENCES public.agreement_services (id)
+);
+"""
+
+
+class SlowCursor(psycopg2.extensions.cursor):
+    """Counts statements and waits rtt seconds before each one."""
+
+    rtt = 0.0
+    statements = 0
+
+    def execute(self, query, vars=None):
+        SlowCursor.statements += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+        return super().execute(query, vars)
+
+    def copy_expert(self, sql, file, size=8192):
+        SlowCursor.statements += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+        return super().copy_expert(sql, file, size)
+
+
+def sample_agreement(services: int) -> dict:
+    return {
+        "document_title": "tuition agreement",
+        "student_first_name": "Bench",
+        "student_last_name": "Student",
+        "student_nickname": None,
+        "parent_guardian_full_name": "Bench Parent",
+        "parent_guardian_email": "parent@example.com",
+        "second_parent_guardian_full_name": None,
+        "second_parent_guardian_email": None,
+        "student_courses": "Algebra I",
+        "student_campus": "Bellevue",
+        "student_college_bound": None,
+        "current_grade": 10,
+        "total_tuition": 100.0 * services,
+        "one_to_one_sessions": services,
+        "homework_studio_sessions": 0,
+        "scheduled_start_date": "2026-09-01",
+        "scholarship_type": None,
+        "scholarship_payment": None,
+        "is_single_payment": True,
+        "payment_amount": 100.0 * services,
+        "is_human_approved": True,
+        "is_valid": True,
+        "document_id": uuid.uuid4().hex,
+        "services_list": [
+            {"service_name": f"Service {i}", "cost_per_unit": 50.0, "units": 2, "tuition": 100.0}
+            for i in range(services)
+        ],
+    }
+
+
+def per_service_upsert(conn, agreement: dict, s3_path: str) -> int:
+    """The loop upsert_agreement used to run: unlink everything, then two INSERTs per service."""
+    import lambda_function
+
+    # A new document_id forces the agreement write the old code always did
+    agreement_id, _ = lambda_function.upsert_agreement(
+        conn, dict(agreement, services_list=[], document_id=uuid.uuid4().hex), s3_path)
+    with conn:
+        with conn.cursor() as cur:
+            for s in agreement["services_list"]:
+                cur.execute(
+                    "INSERT INTO public.agreement_services (service_name, cost_per_unit, units, tuition) "
+                    "VALUES (%s, %s, %s, %s) RETURNING id;",
+                    (s["service_name"], float(s["cost_per_unit"] or 0), int(s["units"] or 0), float(s["tuition"] or 0)),
+                )
+                service_id = cur.fetchone()[0]
+                cur.execute(
+                    "INSERT INTO public.agreements_service_agreements (agreement_id, agreement_service_id) "
+                    "VALUES (%s, %s) RETURNING id;",
+                    (agreement_id, service_id),
+                )
+    return agreement_id
+
+
+def with_changed_service(agreement: dict) -> dict:
+    services = [dict(s) for s in agreement["services_list"]]
+    if services:
+        services[-1]["tuition"] += 1
+    return dict(agreement, services_list=services)
+
+
+def _time_saves(conn, upsert, agreements: list, s3_path: str, repeat: int) -> tuple[float, float]:
+    """Saves the agreements in turn to one s3_path; the first save is not timed."""
+    upsert(conn, agreements[-1], s3_path)
+    samples = []
+    SlowCursor.statements = 0
+    for i in range(repeat):
+        started = time.perf_counter()
+        upsert(conn, agreements[i % len(agreements)], s3_path)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), SlowCursor.statements / repeat
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Scratch database (default DATABASE_URL)")
+    parser.add_argument("--services", default="0,1,2,5,10,20,50", help="Comma separated services per agreement")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rtt", type=float, default=0.0, help="Simulated round trip per statement, in seconds")
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    # lambda_function reads DATABASE_URL at import instead of Secrets Manager
+    os.environ["DATABASE_URL"] = args.dsn
+    import lambda_function
+    import maintenance
+
+    SlowCursor.rtt = args.rtt
+    conn = psycopg2.connect(args.dsn, cursor_factory=SlowCursor)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+
+    prefix = f"bench/{uuid.uuid4().hex[:8]}"
+    print(f"{'services':>8} {'per-service':>16} {'one changed':>16} {'unchanged':>16}")
+    devnull = open(os.devnull, "w")
+    try:
+        for services in (int(n) for n in args.services.split(",")):
+            agreement = sample_agreement(services)
+            changed = [agreement, with_changed_service(agreement)]
+            runs = [
+                (per_service_upsert, [agreement], "loop"),
+                (lambda_function.upsert_agreement, changed, "changed"),
+                (lambda_function.upsert_agreement, [agreement], "unchanged"),
+            ]
+            cells = []
+            for upsert, variants, name in runs:
+                # upsert_agreement prints a line per save
+                with contextlib.redirect_stdout(devnull):
+                    seconds, statements = _time_saves(
+                        conn, upsert, variants, f"{prefix}/{name}-{services}.pdf", args.repeat)
+                cells.append(f"{seconds * 1000:.2f}ms/{statements:.0f} st")
+            print(f"{services:>8} " + " ".join(f"{cell:>16}" for cell in cells))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM public.agreements_service_agreements WHERE agreement_id IN "
+                "(SELECT id FROM public.agreements WHERE s3_path LIKE %s)", (f"{prefix}/%",))
+            cur.execute("DELETE FROM public.agreements WHERE s3_path LIKE %s", (f"{prefix}/%",))
+        with contextlib.redirect_stdout(devnull):
+            maintenance.collect_orphan_services(conn)
+        devnull.close()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
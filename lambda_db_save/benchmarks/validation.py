@@ -0,0 +1,122 @@
+"""
+Validation throughput of check_agreements (one prebuilt list validator)
+against check_agreement_data called per agreement, for both input formats.
+
+    cd lambda_db_save
+    python -m benchmarks.validation --agreements 5000 --services 4
+
+No database needed. Reports validated agreements per second (median of
+--rounds), tracemalloc's peak traced memory per agreement while a batch is
+validated, and the memory blocks still allocated per agreement afterwards
+(the results). check_agreement_data prints every call; that output goes to
+/dev/null but is still formatted, as it is in the Lambda.
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import time
+import tracemalloc
+import uuid
+
+from validators.agreement_validator import check_agreement_data, check_agreements
+
+
+def user_save(i: int, services: int) -> dict:
+    return {
+        "input_format": "user save",
+        "s3_path": f"bench/{i:06d}.pdf",
+        "document_id": uuid.uuid4().hex,
+        "document_title": "tuition agreement",
+        "student_first_name": "Bench",
+        "student_last_name": f"Student {i}",
+        "student_nickname": "",
+        "parent_guardian_full_name": "Bench Parent",
+        "parent_guardian_email": f"parent{i}@example.com",
+        "student_campus": "Bellevue",
+        "courses": "Algebra I",
+        "current_grade": "10",
+        "total_tuition": 100.0 * services,
+        "one_to_one_sessions": str(services),
+        "homework_studio_sessions": "",
+        "scheduled_start_date": "2026-09-01",
+        "is_single_payment": True,
+        "payment_amount": str(100.0 * services),
+        "services_list": [
+            {"service_name": f"Service {n}", "cost_per_unit": 50, "units": 2, "tuition": 100}
+            for n in range(services)
+        ],
+    }
+
+
+def extracted(i: int, services: int) -> dict:
+    return {
+        "input_format": "extracted from model",
+        "s3_path": f"bench/{i:06d}.pdf",
+        "document_id": uuid.uuid4().hex,
+        "document_title": "tuition agreement",
+        "student": {"first_name": "Bench", "last_name": f"Student {i}", "nickname": None},
+        "parent_guardian": {"full_name": "Bench Parent", "email": f"parent{i}@example.com"},
+        "second_parent_guardian": None,
+        "student_program": {"campus": "Bellevue", "courses": "Algebra I", "current_grade": 10},
+        "payment": {"multiple_payment": [{"amount": 50.0 * services}, {"amount": 50.0 * services}]},
+        "services": [
+            {"service_name": f"Service {n}", "cost_per_unit": 50, "units": 2, "tuition": 100}
+            for n in range(services)
+        ],
+        "total_tuition": 100.0 * services,
+        "one_to_one_sessions": services,
+        "scheduled_start_date": "2026-09-01",
+    }
+
+
+def one_by_one(items):
+    return [check_agreement_data(**item) for item in items]
+
+
+def batch(items):
+    return check_agreements(items)
+
+
+def _measure(validate, items, rounds: int) -> tuple[float, float, float]:
+    rates = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        validate(items)
+        rates.append(len(items) / (time.perf_counter() - started))
+
+    tracemalloc.start()
+    blocks = tracemalloc.take_snapshot()
+    results = validate(items)
+    peak = tracemalloc.get_traced_memory()[1]
+    retained = sum(stat.count for stat in tracemalloc.take_snapshot().compare_to(blocks, "filename"))
+    tracemalloc.stop()
+    del results
+    return statistics.median(rates), peak / len(items), retained / len(items)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agreements", type=int, default=2000)
+    parser.add_argument("--services", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{args.agreements} agreements with {args.services} services each")
+    print(f"{'':>34} {'agreements/s':>14} {'peak KiB/item':>14} {'blocks/item':>12}")
+    devnull = open(os.devnull, "w")
+    try:
+        for fmt, build in (("user save", user_save), ("extracted from model", extracted)):
+            items = [build(i, args.services) for i in range(args.agreements)]
+            for label, validate in (("one by one", one_by_one), ("batch", batch)):
+                with contextlib.redirect_stdout(devnull):
+                    rate, peak, blocks = _measure(validate, items, args.rounds)
+                name = f"{label} ({fmt})"
+                print(f"{name:>34} {rate:>14.0f} {peak / 1024:>14.1f} {blocks:>12.0f}")
+    finally:
+        devnull.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+"""
+Bulk agreement ingest for backfills and campus imports.
+
+    {"bulk": {"agreements": [{...}, ...], "input_format": "user save"}}
+    {"bulk": {"s3_uri": "s3://bucket/imports/campus.ndjson", "input_format": "extracted from model"}}
+
+Every agreement carries its own s3_path (and may set its own input_format).
+All of them are validated with AgreementData first; the valid ones are
+COPYed into temp staging tables and merged into agreements, agreement_services
+and agreements_service_agreements with set-based statements in one
+transaction, so the number of round trips does not grow with the batch.
+
+The merge follows upsert_agreement: agreements whose content_fingerprint is
+unchanged are not written, and services are reconciled by content (unchanged
+services keep their rows, removed ones are unlinked and deleted when nothing
+else links them). If the same s3_path appears twice the last one wins.
+
+Returns a summary and one result per input row:
+{"index", "s3_path", "status": written|unchanged|invalid|superseded, "errors"}.
+"""
+import io
+import json
+from urllib.parse import urlparse
+
+import boto3
+
+from agreement_rows import AGREEMENT_COLUMNS, SERVICE_COLUMNS, agreement_fingerprint, agreement_values, service_row
+from validators.agreement_validator import check_agreements
+
+STAGED_COLUMNS = ("s3_path", *AGREEMENT_COLUMNS, "content_fingerprint")
+
+# CREATE TABLE AS ... WITH NO DATA copies the target column types, so COPY
+# parses every value exactly as an INSERT into the real tables would
+STAGING_SQL = f"""
+CREATE TEMP TABLE bulk_agreements ON COMMIT DROP AS
+SELECT 0 AS row_no, {", ".join(STAGED_COLUMNS)}
+FROM public.agreements WITH NO DATA;
+
+CREATE TEMP TABLE bulk_services ON COMMIT DROP AS
+SELECT 0 AS row_no, 0 AS position, {", ".join(SERVICE_COLUMNS)}
+FROM public.agreement_services WITH NO DATA;
+
+CREATE TEMP TABLE bulk_written ON COMMIT DROP AS
+SELECT 0 AS row_no, id AS agreement_id
+FROM public.agreements WITH NO DATA;
+"""
+
+
+def _update_assignment(column):
+    # As in upsert_agreement, saving an agreement marks it human approved
+    if column == "is_human_approved":
+        return "is_human_approved = TRUE"
+    return f"{column} = EXCLUDED.{column}"
+
+
+_ASSIGNMENTS = ",\n        ".join(_update_assignment(c) for c in STAGED_COLUMNS[1:])
+
+MERGE_AGREEMENTS_SQL = f"""
+WITH upserted AS (
+    INSERT INTO public.agreements ({", ".join(STAGED_COLUMNS)})
+    SELECT {", ".join(STAGED_COLUMNS)} FROM bulk_agreements
+    ON CONFLICT (s3_path)
+    DO UPDATE SET
+        {_ASSIGNMENTS}
+    WHERE public.agreements.content_fingerprint IS DISTINCT FROM EXCLUDED.content_fingerprint
+    RETURNING id, s3_path
+)
+INSERT INTO bulk_written (row_no, agreement_id)
+SELECT b.row_no, u.id
+FROM upserted u
+JOIN bulk_agreements b ON b.s3_path = u.s3_path;
+"""
+
+# Services of the written agreements are diffed against their current links.
+# Identical services are paired by their rank within (agreement, content), so
+# duplicates are kept as often as they appear. New service rows are matched
+# back to their agreements the same way: rows with equal content are
+# interchangeable, so any pairing by rank is correct.
+RECONCILE_SERVICES_SQL = """
+WITH current_services AS (
+    SELECT l.id AS link_id, l.agreement_id, s.id AS service_id,
+           s.service_name, s.cost_per_unit, s.units, s.tuition,
+           row_number() OVER (
+               PARTITION BY l.agreement_id, s.service_name, s.cost_per_unit, s.units, s.tuition
+               ORDER BY l.id
+           ) AS n
+    FROM public.agreements_service_agreements l
+    JOIN public.agreement_services s ON s.id = l.agreement_service_id
+    WHERE l.agreement_id IN (SELECT agreement_id FROM bulk_written)
+),
+staged_services AS (
+    SELECT w.agreement_id, b.service_name, b.cost_per_unit, b.units, b.tuition,
+           row_number() OVER (
+               PARTITION BY w.agreement_id, b.service_name, b.cost_per_unit, b.units, b.tuition
+               ORDER BY b.position
+           ) AS n
+    FROM bulk_services b
+    JOIN bulk_written w ON w.row_no = b.row_no
+),
+removed AS (
+    SELECT c.link_id, c.service_id
+    FROM current_services c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM staged_services t
+        WHERE t.agreement_id = c.agreement_id AND t.n = c.n
+          AND (t.service_name, t.cost_per_unit, t.units, t.tuition)
+              IS NOT DISTINCT FROM (c.service_name, c.cost_per_unit, c.units, c.tuition)
+    )
+),
+added AS (
+    SELECT t.agreement_id, t.service_name, t.cost_per_unit, t.units, t.tuition,
+           row_number() OVER (
+               PARTITION BY t.service_name, t.cost_per_unit, t.units, t.tuition
+               ORDER BY t.agreement_id, t.n
+           ) AS n
+    FROM staged_services t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM current_services c
+        WHERE c.agreement_id = t.agreement_id AND c.n = t.n
+          AND (c.service_name, c.cost_per_unit, c.units, c.tuition)
+              IS NOT DISTINCT FROM (t.service_name, t.cost_per_unit, t.units, t.tuition)
+    )
+),
+removed_links AS (
+    DELETE FROM public.agreements_service_agreements
+    WHERE id IN (SELECT link_id FROM removed)
+),
+orphans AS (
+    DELETE FROM public.agreement_services s
+    WHERE s.id IN (SELECT service_id FROM removed)
+      AND NOT EXISTS (
+          SELECT 1 FROM public.agreements_service_agreements l
+          WHERE l.agreement_service_id = s.id
+            AND l.id NOT IN (SELECT link_id FROM removed)
+      )
+),
+new_services AS (
+    INSERT INTO public.agreement_services (service_name, cost_per_unit, units, tuition)
+    SELECT service_name, cost_per_unit, units, tuition FROM added
+    RETURNING id, service_name, cost_per_unit, units, tuition
+),
+numbered_services AS (
+    SELECT id, service_name, cost_per_unit, units, tuition,
+           row_number() OVER (
+               PARTITION BY service_name, cost_per_unit, units, tuition
+               ORDER BY id
+           ) AS n
+    FROM new_services
+)
+INSERT INTO public.agreements_service_agreements (agreement_id, agreement_service_id)
+SELECT a.agreement_id, s.id
+FROM added a
+JOIN numbered_services s
+  ON s.n = a.n
+ AND (s.service_name, s.cost_per_unit, s.units, s.tuition)
+     IS NOT DISTINCT FROM (a.service_name, a.cost_per_unit, a.units, a.tuition);
+"""
+
+
+def load_agreements(spec, s3=None):
+    """The raw agreements of a bulk request; NDJSON lines that are not JSON come back as ValueErrors."""
+    if spec.get("agreements") is not None:
+        return list(spec["agreements"])
+
+    uri = urlparse(spec["s3_uri"])
+    s3 = s3 or boto3.client("s3")
+    body = s3.get_object(Bucket=uri.netloc, Key=uri.path.lstrip("/"))["Body"]
+    items = []
+    for line in body.iter_lines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            items.append(e)
+    return items
+
+
+def validate_agreements(items, input_format=None):
+    """
+    Returns (valid, results): valid is [(index, agreement dict)] with the last
+    occurrence of each s3_path; results has an entry per item.
+    """
+    results = []
+    latest = {}
+    for item, check in zip(items, check_agreements(items, input_format)):
+        result = {"index": check.index, "s3_path": item.get("s3_path") if isinstance(item, dict) else None,
+                  "status": "invalid", "errors": check.errors}
+        results.append(result)
+        if isinstance(item, ValueError):
+            result["errors"] = [{"type": "json_invalid", "loc": (), "msg": str(item)}]
+        if not check.ok:
+            continue
+
+        agreement = check.agreement.model_dump()
+        previous = latest.get(agreement["s3_path"])
+        if previous is not None:
+            results[previous[0]]["status"] = "superseded"
+        latest[agreement["s3_path"]] = (check.index, agreement)
+        result["status"] = "valid"
+
+    return list(latest.values()), results
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_rows(cur, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(v) for v in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def merge_agreements(conn, agreements):
+    """Stages and merges [(index, agreement dict)] in one transaction. Returns the indexes that were written."""
+    agreement_rows = []
+    service_rows = []
+    for index, agreement in agreements:
+        services = agreement["services_list"] or []
+        values = agreement_values(agreement)
+        agreement_rows.append((index, agreement["s3_path"], *values, agreement_fingerprint(values, services)))
+        service_rows.extend((index, position, *service_row(s)) for position, s in enumerate(services))
+
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(STAGING_SQL)
+            _copy_rows(cur, "bulk_agreements", ("row_no", *STAGED_COLUMNS), agreement_rows)
+            _copy_rows(cur, "bulk_services", ("row_no", "position", *SERVICE_COLUMNS), service_rows)
+            # Temp tables have no statistics until analysed
+            cur.execute("ANALYZE bulk_agreements; ANALYZE bulk_services;")
+            cur.execute(MERGE_AGREEMENTS_SQL)
+            cur.execute("SELECT row_no FROM bulk_written;")
+            written = {row[0] for row in cur.fetchall()}
+            if written:
+                cur.execute(RECONCILE_SERVICES_SQL)
+    return written
+
+
+def ingest_bulk(conn, spec, s3=None):
+    items = load_agreements(spec, s3)
+    valid, results = validate_agreements(items, spec.get("input_format"))
+    written = merge_agreements(conn, valid) if valid else set()
+
+    for index, _ in valid:
+        results[index]["status"] = "written" if index in written else "unchanged"
+    summary = {"received": len(items)}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    print(f"Bulk ingest: {summary}")
+    return {"summary": summary, "results": results}
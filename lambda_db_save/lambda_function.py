@@ -1,7 +1,11 @@
 import json
+import os
+from collections import defaultdict
 import boto3
-import psycopg2
-from urllib.parse import urlparse
+import bulk
+import maintenance
+from agreement_rows import agreement_fingerprint, agreement_values, service_fingerprint, service_row
+from shared.db import database_from_env
 from validators.agreement_validator import check_agreement_data
 
 
@@ -27,31 +31,12 @@ def get_secret(secret_parameter):
     secret = json.loads(secret)
     return secret[secret_parameter]
 
-_conn = None
-DB_URL = get_secret("DATABASE_URL")
-
-def get_conn():
-    global _conn
-    if _conn is None or _conn.closed:
-        url = urlparse(DB_URL)
-        _conn = psycopg2.connect(
-            dbname=url.path.lstrip("/"),
-            user=url.username,
-            password=url.password,
-            host=url.hostname,
-            port=url.port or 5432,
-            connect_timeout=5,
-        )
-        _conn.autocommit = True
-    return _conn
+# DATABASE_URL in the environment (local runs, benchmarks) skips Secrets Manager
+db = database_from_env(lambda: os.getenv("DATABASE_URL") or get_secret("DATABASE_URL"))
 
-def upsert_agreement(conn, agreement, s3_path):
-    """
-    Insert or update an agreement by s3_path.
-    Returns agreement.id
-    """
 
-    upsert_agreement_sql = """
+UPSERT_AGREEMENT_SQL = """
+WITH upserted AS (
     INSERT INTO public.agreements (
         s3_path,
         document_title,
@@ -76,9 +61,10 @@ def upsert_agreement(conn, agreement, s3_path):
         payment_amount,
         is_human_approved,
         is_valid,
-        document_id
+        document_id,
+        content_fingerprint
     )
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     ON CONFLICT (s3_path)
     DO UPDATE SET
         document_title = EXCLUDED.document_title,
@@ -103,90 +89,161 @@ def upsert_agreement(conn, agreement, s3_path):
         payment_amount = EXCLUDED.payment_amount,
         is_human_approved = TRUE,
         is_valid = EXCLUDED.is_valid,
-        document_id = EXCLUDED.document_id
-    RETURNING id;
+        document_id = EXCLUDED.document_id,
+        content_fingerprint = EXCLUDED.content_fingerprint
+    WHERE public.agreements.content_fingerprint IS DISTINCT FROM EXCLUDED.content_fingerprint
+    RETURNING id
+)
+-- A skipped update returns no row, so read the id from the existing one
+SELECT id, TRUE FROM upserted
+UNION ALL
+SELECT id, FALSE FROM public.agreements
+WHERE s3_path = %s AND NOT EXISTS (SELECT 1 FROM upserted);
+"""
+
+db.prepare("upsert_agreement", UPSERT_AGREEMENT_SQL)
+
+
+def diff_services(current, services):
+    """
+    current: (link_id, service_id, service_name, cost_per_unit, units, tuition)
+    rows linked to the agreement; services: the extracted services.
+    Returns (link ids to remove, service rows to insert). Identical services
+    are matched one to one, so duplicates are kept as often as they appear.
     """
+    linked = defaultdict(list)
+    for link_id, _service_id, *row in current:
+        linked[service_fingerprint(*row)].append(link_id)
 
-    insert_service_sql = """
-    INSERT INTO public.agreement_services (
-        service_name,
-        cost_per_unit,
-        units,
-        tuition
-    )
-    VALUES (%s, %s, %s, %s)
-    RETURNING id;
+    added = []
+    for service in services:
+        row = service_row(service)
+        links = linked.get(service_fingerprint(*row))
+        if links:
+            links.pop()
+        else:
+            added.append(row)
+
+    removed_links = [link_id for links in linked.values() for link_id in links]
+    return removed_links, added
+
+
+def upsert_agreement(conn, agreement, s3_path):
+    """
+    Insert or update an agreement by s3_path.
+    Returns (agreement.id, written). written is False when the stored
+    content_fingerprint matched and nothing was written.
     """
 
-    delete_links_sql = """
-    DELETE FROM public.agreements_service_agreements
-    WHERE agreement_id = %s;
+
+    current_services_sql = """
+    SELECT l.id, s.id, s.service_name, s.cost_per_unit, s.units, s.tuition
+    FROM public.agreements_service_agreements l
+    JOIN public.agreement_services s ON s.id = l.agreement_service_id
+    WHERE l.agreement_id = %s;
     """
 
-    insert_link_sql = """
+    # Applies a service diff in one statement: unlink the removed services,
+    # delete the ones no other agreement links to, insert and link the new ones
+    reconcile_services_sql = """
+    WITH removed_links AS (
+        DELETE FROM public.agreements_service_agreements
+        WHERE id = ANY(%s::bigint[])
+        RETURNING agreement_service_id
+    ),
+    orphans AS (
+        DELETE FROM public.agreement_services s
+        USING removed_links r
+        WHERE s.id = r.agreement_service_id
+          AND NOT EXISTS (
+              SELECT 1 FROM public.agreements_service_agreements l
+              WHERE l.agreement_service_id = s.id
+                AND l.id <> ALL(%s::bigint[])
+          )
+    ),
+    new_services AS (
+        INSERT INTO public.agreement_services (
+            service_name,
+            cost_per_unit,
+            units,
+            tuition
+        )
+        SELECT * FROM unnest(%s::text[], %s::numeric[], %s::numeric[], %s::numeric[])
+        RETURNING id
+    )
     INSERT INTO public.agreements_service_agreements (agreement_id, agreement_service_id)
-    VALUES (%s, %s)
-    RETURNING id;
+    SELECT %s, id FROM new_services;
     """
 
     services = agreement["services_list"] or []
 
+    values = agreement_values(agreement)
+    fingerprint = agreement_fingerprint(values, services)
+
     with conn:
         with conn.cursor() as cur:
-            cur.execute(
-                upsert_agreement_sql,
-                (
-                    s3_path,
-                    agreement["document_title"],
-                    agreement["student_first_name"],
-                    agreement["student_last_name"],
-                    agreement["student_nickname"],
-                    agreement["parent_guardian_full_name"],
-                    agreement["parent_guardian_email"],
-                    agreement["second_parent_guardian_full_name"],
-                    agreement["second_parent_guardian_email"],
-                    agreement["student_courses"],
-                    agreement["student_campus"],
-                    agreement["student_college_bound"],
-                    int(agreement["current_grade"] or 0),
-                    float(agreement["total_tuition"] or 0),
-                    int(agreement["one_to_one_sessions"] or 0),
-                    int(agreement["homework_studio_sessions"] or 0),
-                    str(agreement["scheduled_start_date"]),
-                    agreement["scholarship_type"],
-                    agreement["scholarship_payment"],
-                    bool(agreement["is_single_payment"] or False),
-                    float(agreement["payment_amount"] or 0),
-                    agreement["is_human_approved"],
-                    agreement["is_valid"],
-                    agreement["document_id"]
-                ),
-            )
-
-            agreement_id = cur.fetchone()[0]
-            # 2) Clear existing links (so DB matches current extracted services)
-            cur.execute(delete_links_sql, (agreement_id,))
-
-            # 3) Upsert each service and re-link
-            for s in services:
-                service_name = s["service_name"]
-                cost_per_unit = float(s["cost_per_unit"] or 0)
-                units = int(s["units"] or 0)
-                tuition = float(s["tuition"] or 0)
-
+            db.execute(cur, "upsert_agreement", (s3_path, *values, fingerprint, s3_path))
+            row = cur.fetchone()
+            if row is None:
+                # Inserted by a transaction that committed after this statement started
+                raise RuntimeError(f"Agreement {s3_path} changed during the upsert, retry")
+            agreement_id, written = row
+            if not written:
+                print(f"Agreement {agreement_id} unchanged, skipped the write")
+                return agreement_id, False
+
+            # 2) Diff the linked services against the extracted ones
+            cur.execute(current_services_sql, (agreement_id,))
+            removed_links, added = diff_services(cur.fetchall(), services)
+
+            # 3) Write only what changed; an unchanged save writes no service rows
+            if removed_links or added:
                 cur.execute(
-                    insert_service_sql,
-                    (service_name, cost_per_unit, units, tuition),
+                    reconcile_services_sql,
+                    (
+                        removed_links,
+                        removed_links,
+                        [row[0] for row in added],
+                        [row[1] for row in added],
+                        [row[2] for row in added],
+                        [row[3] for row in added],
+                        agreement_id,
+                    ),
                 )
-                service_id = cur.fetchone()[0]
+            print(f"Services: {len(services) - len(added)} unchanged, {len(added)} added, "
+                  f"{len(removed_links)} removed")
 
-                cur.execute(insert_link_sql, (agreement_id, service_id))
-
-    return agreement_id
+    return agreement_id, True
 
 
 def lambda_handler(event, context):
     print(event)
+    db.begin_request()
+    try:
+        return _handle(event)
+    finally:
+        db.report()
+
+
+def _handle(event):
+    if event.get("maintenance") == "collect_orphan_services":
+        deleted = maintenance.collect_orphan_services(
+            db.connection(),
+            batch_size=int(event.get("batch_size") or 1000),
+            max_batches=event.get("max_batches"),
+        )
+        return {"statusCode": 200, "body": json.dumps({"deleted": deleted})}
+
+    if event.get("bulk"):
+        conn = db.connection()
+        try:
+            result = bulk.ingest_bulk(conn, event["bulk"])
+        except Exception:
+            # Roll back and reconnect on the next request
+            db.close()
+            raise
+        return {"statusCode": 200, "body": json.dumps(result)}
+
     if event.get("invoke_from_extract"):
         agreement = event.get("agreement")
         path_value = event.get("s3_path")
@@ -195,30 +252,24 @@ def lambda_handler(event, context):
 
         valid_data, agreement = check_agreement_data(**agreement)
 
-        conn = get_conn()
+        conn = db.connection()
         agreement_dict = agreement.model_dump()
 
         try:
             print(f"UPDATE...{agreement_dict}")
-            upsert_agreement(conn, agreement_dict, path_value)
-            print("UPDATED")
+            _, written = upsert_agreement(conn, agreement_dict, path_value)
+            print("UPDATED" if written else "UNCHANGED")
             return {
                 "statusCode": 200,
                 "headers": {
                     "Access-Control-Allow-Origin": "*",
                     "Access-Control-Allow-Credentials": "true"
                 },
-                "body": json.dumps("UPDATED")
+                "body": json.dumps("UPDATED" if written else "UNCHANGED")
             }
         except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            try:
-                conn.close()
-            except Exception:
-                pass
+            # Roll back and reconnect on the next request
+            db.close()
             raise
 
     else:
@@ -244,7 +295,7 @@ def lambda_handler(event, context):
 
             valid_data, agreement = check_agreement_data(**agreement)
 
-            conn = get_conn()
+            conn = db.connection()
 
             print(agreement)
             print(type(agreement))
@@ -252,24 +303,17 @@ def lambda_handler(event, context):
 
             try:
                 print(f"UPDATE... {agreement_dict}")
-                upsert_agreement(conn, agreement_dict, path_value)
-                print("UPDATED")
+                _, written = upsert_agreement(conn, agreement_dict, path_value)
+                print("UPDATED" if written else "UNCHANGED")
                 return {
                     "statusCode": 200,
                     "headers": {
                         "Access-Control-Allow-Origin": "*",
                         "Access-Control-Allow-Credentials": "true"
                     },
-                    "body": json.dumps("UPDATED")
+                    "body": json.dumps("UPDATED" if written else "UNCHANGED")
                 }
             except Exception:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                # optionally force reconnect next time:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+                # Roll back and reconnect on the next request
+                db.close()
                 raise
@@ -0,0 +1,130 @@
+"""
+Schema migrations and cleanup for the agreements tables.
+
+--migrate adds the columns upsert_agreement writes (content_fingerprint);
+run it before deploying a Lambda that needs them. Rows saved before then
+have no fingerprint and are rewritten once on their next save.
+
+The rest of the job deletes agreement_services rows that no agreement links
+to any more. Before upserts reconciled services by content, every save
+unlinked all of an agreement's services and inserted new ones, leaving the
+old rows behind. They are deleted in batches so the job can run against a
+live database:
+
+    DATABASE_URL=postgresql://... python maintenance.py --migrate --dry-run
+    DATABASE_URL=postgresql://... python maintenance.py --create-indexes --batch-size 5000
+
+The db Lambda runs the same job for {"maintenance": "collect_orphan_services"}
+events (e.g. from an EventBridge schedule).
+"""
+import argparse
+import os
+import time
+
+import psycopg2
+
+COUNT_ORPHANS_SQL = """
+SELECT count(*)
+FROM public.agreement_services s
+WHERE NOT EXISTS (
+    SELECT 1 FROM public.agreements_service_agreements l
+    WHERE l.agreement_service_id = s.id
+);
+"""
+
+DELETE_ORPHANS_SQL = """
+DELETE FROM public.agreement_services
+WHERE id IN (
+    SELECT s.id
+    FROM public.agreement_services s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM public.agreements_service_agreements l
+        WHERE l.agreement_service_id = s.id
+    )
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+);
+"""
+
+MIGRATIONS_SQL = [
+    "ALTER TABLE public.agreements ADD COLUMN IF NOT EXISTS content_fingerprint text;",
+]
+
+# The orphan check and the per-agreement diff both look links up by these
+INDEXES_SQL = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS agreements_service_agreements_agreement_id_idx "
+    "ON public.agreements_service_agreements (agreement_id);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS agreements_service_agreements_agreement_service_id_idx "
+    "ON public.agreements_service_agreements (agreement_service_id);",
+]
+
+
+def count_orphan_services(conn):
+    with conn.cursor() as cur:
+        cur.execute(COUNT_ORPHANS_SQL)
+        return cur.fetchone()[0]
+
+
+def migrate(conn):
+    with conn:
+        with conn.cursor() as cur:
+            for sql in MIGRATIONS_SQL:
+                cur.execute(sql)
+
+
+def create_indexes(conn):
+    """CREATE INDEX CONCURRENTLY cannot run in a transaction, so conn must be in autocommit."""
+    with conn.cursor() as cur:
+        for sql in INDEXES_SQL:
+            cur.execute(sql)
+
+
+def collect_orphan_services(conn, batch_size=1000, max_batches=None, pause=0.0):
+    """Deletes unlinked services batch_size rows per transaction. Returns the number deleted."""
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(DELETE_ORPHANS_SQL, (batch_size,))
+                count = cur.rowcount
+        deleted += count
+        batches += 1
+        print(f"Deleted {count} orphaned services (batch {batches}, {deleted} total)")
+        if count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Database URL (default DATABASE_URL)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to wait between batches")
+    parser.add_argument("--migrate", action="store_true", help="Add the columns upsert_agreement writes first")
+    parser.add_argument("--create-indexes", action="store_true", help="Create the link indexes first")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the orphaned services")
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    conn = psycopg2.connect(args.dsn, connect_timeout=5)
+    conn.autocommit = True
+    try:
+        if args.migrate:
+            migrate(conn)
+        if args.create_indexes:
+            create_indexes(conn)
+        print(f"{count_orphan_services(conn)} orphaned services")
+        if not args.dry_run:
+            collect_orphan_services(conn, args.batch_size, args.max_batches, args.pause)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+"""
+Tests for the db-save Lambda. Run from lambda_db_save:
+
+    python -m pytest -q
+
+The Postgres-backed tests use the benchmarks' SCHEMA_SQL on the scratch
+database in TEST_DATABASE_URL and skip when it is unset.
+"""
+import contextlib
+import os
+import sys
+import uuid
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.dirname(HERE)
+# lambda_db_save for its modules, the repo root for shared
+for path in (LAMBDA_DIR, os.path.dirname(LAMBDA_DIR)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks.upsert_services import SCHEMA_SQL, sample_agreement  # noqa: E402
+
+
+@pytest.fixture
+def agreement():
+    """A validated agreement (AgreementData.model_dump() shape) with three services."""
+    return dict(sample_agreement(3), s3_path="tests/agreement.pdf", input_format="user save")
+
+
+@pytest.fixture
+def pg_conn():
+    """
+    An autocommit connection to TEST_DATABASE_URL (a scratch database; the
+    tables are created if missing) and a unique s3_path prefix whose rows are
+    removed afterwards.
+    """
+    dsn = os.getenv("TEST_DATABASE_URL")
+    if not dsn:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import psycopg2
+
+    import maintenance
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+    prefix = f"tests/{uuid.uuid4().hex[:8]}"
+    try:
+        yield conn, prefix
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM public.agreements_service_agreements WHERE agreement_id IN "
+                "(SELECT id FROM public.agreements WHERE s3_path LIKE %s)", (f"{prefix}/%",))
+            cur.execute("DELETE FROM public.agreements WHERE s3_path LIKE %s", (f"{prefix}/%",))
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            maintenance.collect_orphan_services(conn)
+        conn.close()
+
+
+def linked_services(conn, s3_path):
+    """(service_id, service_name, cost_per_unit, units, tuition) linked to the agreement, by service id."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT s.id, s.service_name, s.cost_per_unit::float, s.units::float, s.tuition::float "
+            "FROM public.agreements a "
+            "JOIN public.agreements_service_agreements l ON l.agreement_id = a.id "
+            "JOIN public.agreement_services s ON s.id = l.agreement_service_id "
+            "WHERE a.s3_path = %s ORDER BY s.id", (s3_path,))
+        return cur.fetchall()
+
+
+def service_exists(conn, service_id):
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM public.agreement_services WHERE id = %s", (service_id,))
+        return cur.fetchone() is not None
@@ -0,0 +1,130 @@
+import io
+import json
+
+import boto3
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+import bulk
+from benchmarks.upsert_services import sample_agreement, with_changed_service
+from benchmarks.validation import user_save
+from conftest import linked_services
+
+
+class CopyCursor:
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, file):
+        self.copies.append((sql, file.read()))
+
+
+def test_copy_values_are_escaped_for_text_format():
+    assert bulk._copy_value(None) == "\\N"
+    assert (bulk._copy_value(True), bulk._copy_value(False)) == ("t", "f")
+    assert bulk._copy_value(2.5) == "2.5"
+    assert bulk._copy_value("a\tb\nc\rd\\e") == "a\\tb\\nc\\rd\\\\e"
+
+
+def test_copy_rows_writes_one_line_per_row():
+    cur = CopyCursor()
+    bulk._copy_rows(cur, "bulk_services", ("row_no", "service_name"), [(0, "Math\tI"), (1, None)])
+    assert cur.copies == [("COPY bulk_services (row_no, service_name) FROM STDIN", "0\tMath\\tI\n1\t\\N\n")]
+
+
+def test_validate_reports_every_item():
+    first, second, other = user_save(0, 2), user_save(0, 3), user_save(1, 1)
+    broken = dict(user_save(2, 1))
+    del broken["student_campus"]
+    items = [first, broken, ValueError("Expecting value: line 4 column 1"), second, other]
+
+    valid, results = bulk.validate_agreements(items)
+
+    assert [r["status"] for r in results] == ["superseded", "invalid", "invalid", "valid", "valid"]
+    assert [index for index, _ in valid] == [3, 4]
+    assert len(valid[0][1]["services_list"]) == 3
+    assert results[1]["s3_path"] == broken["s3_path"]
+    assert results[2]["errors"][0]["type"] == "json_invalid"
+
+
+def test_input_format_applies_to_items_without_one():
+    item = user_save(0, 1)
+    del item["input_format"]
+    valid, results = bulk.validate_agreements([item], "user save")
+    assert results[0]["status"] == "valid"
+    assert valid[0][1]["input_format"] == "user save"
+
+
+def test_ndjson_lines_that_are_not_json_become_errors():
+    s3 = boto3.client("s3", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+    body = b'{"s3_path": "a.pdf"}\n\nnot json\n{"s3_path": "b.pdf"}\n'
+    with Stubber(s3) as stubber:
+        stubber.add_response("get_object", {"Body": StreamingBody(io.BytesIO(body), len(body))},
+                             {"Bucket": "bucket", "Key": "imports/campus.ndjson"})
+        items = bulk.load_agreements({"s3_uri": "s3://bucket/imports/campus.ndjson"}, s3)
+
+    assert items[0] == {"s3_path": "a.pdf"} and items[2] == {"s3_path": "b.pdf"}
+    assert isinstance(items[1], ValueError)
+
+
+def test_ingest_summary_counts_every_status(monkeypatch):
+    merged = []
+    monkeypatch.setattr(bulk, "merge_agreements", lambda conn, valid: merged.append(valid) or {0})
+    items = [user_save(0, 1), user_save(1, 1), {"s3_path": "broken.pdf"}]
+
+    result = bulk.ingest_bulk(None, {"agreements": items, "input_format": "user save"})
+
+    assert [index for index, _ in merged[0]] == [0, 1]
+    assert [r["status"] for r in result["results"]] == ["written", "unchanged", "invalid"]
+    assert result["summary"] == {"received": 3, "written": 1, "unchanged": 1, "invalid": 1}
+    # The Lambda returns the result as its JSON body
+    json.dumps(result)
+
+
+def _batch(prefix, count, services=2):
+    return [(i, dict(sample_agreement(services), s3_path=f"{prefix}/{i}.pdf")) for i in range(count)]
+
+
+def test_merge_writes_new_then_skips_unchanged(pg_conn):
+    conn, prefix = pg_conn
+    batch = _batch(prefix, 3)
+
+    assert bulk.merge_agreements(conn, batch) == {0, 1, 2}
+    before = [linked_services(conn, a["s3_path"]) for _, a in batch]
+    assert [len(services) for services in before] == [2, 2, 2]
+
+    assert bulk.merge_agreements(conn, batch) == set()
+    assert [linked_services(conn, a["s3_path"]) for _, a in batch] == before
+
+
+def test_merge_reconciles_changed_services(pg_conn):
+    conn, prefix = pg_conn
+    batch = _batch(prefix, 2, services=3)
+    bulk.merge_agreements(conn, batch)
+    before = {row[1]: row for row in linked_services(conn, batch[1][1]["s3_path"])}
+
+    changed = with_changed_service(batch[1][1])
+    # A duplicate of an existing service is kept as a second row
+    changed["services_list"].append(dict(changed["services_list"][0]))
+    assert bulk.merge_agreements(conn, [batch[0], (1, changed)]) == {1}
+
+    after = linked_services(conn, changed["s3_path"])
+    assert sorted(row[1:] for row in after) == sorted([
+        ("Service 0", 50.0, 2.0, 100.0),
+        ("Service 0", 50.0, 2.0, 100.0),
+        ("Service 1", 50.0, 2.0, 100.0),
+        ("Service 2", 50.0, 2.0, 101.0),
+    ])
+    assert before["Service 0"] in after and before["Service 1"] in after
+    assert before["Service 2"] not in after
+
+
+def test_bulk_and_single_upsert_agree(pg_conn):
+    import lambda_function
+
+    conn, prefix = pg_conn
+    (_, agreement), = _batch(prefix, 1)
+    lambda_function.upsert_agreement(conn, agreement, agreement["s3_path"])
+
+    # Same content, so the bulk merge has nothing to write
+    assert bulk.merge_agreements(conn, [(0, agreement)]) == set()
@@ -0,0 +1,195 @@
+from types import SimpleNamespace
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import pytest
+
+from shared import db
+
+IDLE = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    """Records every statement; SELECT 1 fails once broken, EXECUTEs raise the queued errors."""
+
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=IDLE)
+        self.statements = []
+        self.broken = False
+        self.execute_errors = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.info.transaction_status = IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(sql)
+        if sql == "SELECT 1" and self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        if sql.startswith("EXECUTE") and self.connection.execute_errors:
+            raise self.connection.execute_errors.pop(0)
+
+    def fetchone(self):
+        return (1,)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Every psycopg2.connect returns a new FakeConnection, or raises the queued errors first."""
+    made = []
+    failures = []
+
+    def connect(**kwargs):
+        if failures:
+            raise failures.pop(0)
+        made.append(FakeConnection())
+        return made[-1]
+
+    monkeypatch.setattr(db.psycopg2, "connect", connect)
+    monkeypatch.setattr(db.time, "sleep", lambda seconds: None)
+    return SimpleNamespace(made=made, failures=failures)
+
+
+def _database(**kwargs):
+    urls = []
+    database = db.Database(lambda: urls.append(1) or "postgresql://user:pw@db:5432/app", **kwargs)
+    return database, urls
+
+
+def test_connection_is_opened_once_and_reused(connections):
+    database, urls = _database()
+    assert connections.made == []
+
+    first = database.connection()
+    assert database.connection() is first
+    assert (len(connections.made), len(urls)) == (1, 1)
+    assert first.autocommit is True
+
+
+def test_broken_idle_connection_is_replaced(connections):
+    database, urls = _database(health_check_seconds=0)
+    first = database.connection()
+    first.broken = True
+
+    second = database.connection()
+
+    assert second is not first and first.closed
+    assert database.stats["reconnects"] == 1
+    assert len(urls) == 1
+
+
+def test_healthy_idle_connection_is_pinged_and_kept(connections):
+    database, _ = _database(health_check_seconds=0)
+    first = database.connection()
+
+    assert database.connection() is first
+    assert first.statements == ["SELECT 1"]
+    assert database.stats["health_checks"] == 1
+
+
+def test_connection_in_unknown_state_is_replaced(connections):
+    database, _ = _database()
+    first = database.connection()
+    first.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+
+    assert database.connection() is not first
+
+
+def test_failed_connects_are_retried(connections):
+    connections.failures.extend([psycopg2.OperationalError("refused")] * 2)
+    database, _ = _database(connect_attempts=3)
+
+    database.connection()
+    assert database.stats["failed_connects"] == 2
+
+    connections.failures.extend([psycopg2.OperationalError("refused")] * 2)
+    database.close()
+    with pytest.raises(psycopg2.OperationalError):
+        _database(connect_attempts=2)[0].connection()
+
+
+def test_statements_are_prepared_once_per_connection(connections):
+    database, _ = _database(health_check_seconds=0)
+    database.prepare("get_agreement", "SELECT * FROM public.agreements WHERE id = %s AND s3_path = %s")
+    conn = database.connection()
+
+    with conn.cursor() as cur:
+        database.execute(cur, "get_agreement", (1, "a.pdf"))
+        database.execute(cur, "get_agreement", (2, "b.pdf"))
+    assert conn.statements == [
+        "PREPARE get_agreement AS SELECT * FROM public.agreements WHERE id = $1 AND s3_path = $2",
+        "EXECUTE get_agreement (%s, %s)",
+        "EXECUTE get_agreement (%s, %s)",
+    ]
+
+    conn.broken = True
+    replacement = database.connection()
+    with replacement.cursor() as cur:
+        database.execute(cur, "get_agreement", (1, "a.pdf"))
+    assert replacement.statements[0].startswith("PREPARE get_agreement")
+
+
+def test_stale_cached_plan_is_prepared_again_on_the_next_call(connections):
+    database, _ = _database()
+    database.prepare("get_agreement", "SELECT * FROM public.agreements WHERE id = %s")
+    conn = database.connection()
+
+    with conn.cursor() as cur:
+        database.execute(cur, "get_agreement", (1,))
+        # The table changed under the prepared statement
+        conn.execute_errors.append(psycopg2.errors.FeatureNotSupported("cached plan must not change result type"))
+        with pytest.raises(psycopg2.errors.FeatureNotSupported):
+            database.execute(cur, "get_agreement", (1,))
+        database.execute(cur, "get_agreement", (1,))
+
+    assert [s.split()[0] for s in conn.statements] == ["PREPARE", "EXECUTE", "EXECUTE", "DEALLOCATE", "PREPARE",
+                                                       "EXECUTE"]
+    assert database.stats["prepares"] == 2
+
+
+def test_stale_plan_inside_a_transaction_drops_the_connection(connections):
+    database, _ = _database()
+    database.prepare("get_agreement", "SELECT * FROM public.agreements WHERE id = %s")
+    conn = database.connection()
+    conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+    conn.execute_errors.append(psycopg2.errors.FeatureNotSupported("cached plan must not change result type"))
+
+    with conn.cursor() as cur, pytest.raises(psycopg2.errors.FeatureNotSupported):
+        database.execute(cur, "get_agreement", (1,))
+
+    assert conn.closed
+    assert database.connection() is not conn
+
+
+def test_plain_statements_without_prepare_or_on_other_connections(connections):
+    database, _ = _database(use_prepared=False)
+    database.prepare("get_agreement", "SELECT * FROM public.agreements WHERE id = %s")
+    conn = database.connection()
+    with conn.cursor() as cur:
+        database.execute(cur, "get_agreement", (1,))
+    assert conn.statements == ["SELECT * FROM public.agreements WHERE id = %s"]
+
+    prepared, _ = _database()
+    prepared.prepare("get_agreement", "SELECT * FROM public.agreements WHERE id = %s")
+    other = FakeConnection()
+    with other.cursor() as cur:
+        prepared.execute(cur, "get_agreement", (1,))
+    assert other.statements == ["SELECT * FROM public.agreements WHERE id = %s"]
@@ -0,0 +1,63 @@
+from agreement_rows import agreement_fingerprint, agreement_values, service_fingerprint
+from lambda_function import upsert_agreement
+
+
+def _fingerprint(agreement):
+    return agreement_fingerprint(agreement_values(agreement), agreement["services_list"])
+
+
+def test_fingerprint_ignores_service_order(agreement):
+    reordered = dict(agreement, services_list=list(reversed(agreement["services_list"])))
+    assert _fingerprint(reordered) == _fingerprint(agreement)
+
+
+def test_fingerprint_changes_with_any_value(agreement):
+    changed_service = [dict(s) for s in agreement["services_list"]]
+    changed_service[0]["units"] = 3
+
+    fingerprints = {
+        _fingerprint(agreement),
+        _fingerprint(dict(agreement, student_campus="Seattle")),
+        _fingerprint(dict(agreement, services_list=changed_service)),
+        _fingerprint(dict(agreement, services_list=agreement["services_list"][:2])),
+    }
+    assert len(fingerprints) == 4
+
+
+def test_service_fingerprint_matches_numeric_read_back():
+    assert service_fingerprint("Math ", "50.00", 2, 100) == service_fingerprint("Math", 50.0, 2.0, 100.0)
+
+
+def _row(conn, s3_path):
+    with conn.cursor() as cur:
+        cur.execute("SELECT xmin, content_fingerprint, is_human_approved FROM public.agreements WHERE s3_path = %s",
+                    (s3_path,))
+        return cur.fetchone()
+
+
+def test_unchanged_save_writes_nothing(pg_conn, agreement):
+    conn, prefix = pg_conn
+    s3_path = f"{prefix}/a.pdf"
+    first_id, first_written = upsert_agreement(conn, agreement, s3_path)
+    saved = _row(conn, s3_path)
+    assert first_written
+    assert saved[1] == _fingerprint(agreement)
+
+    # Reordered services are the same content
+    reordered = dict(agreement, services_list=list(reversed(agreement["services_list"])))
+    agreement_id, written = upsert_agreement(conn, reordered, s3_path)
+
+    assert (agreement_id, written) == (first_id, False)
+    # xmin changes whenever the row is rewritten
+    assert _row(conn, s3_path) == saved
+
+
+def test_changed_save_is_written(pg_conn, agreement):
+    conn, prefix = pg_conn
+    s3_path = f"{prefix}/a.pdf"
+    upsert_agreement(conn, agreement, s3_path)
+
+    _, written = upsert_agreement(conn, dict(agreement, student_campus="Seattle"), s3_path)
+
+    assert written
+    assert _row(conn, s3_path)[1] == _fingerprint(dict(agreement, student_campus="Seattle"))
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from conftest import linked_services, service_exists
+from lambda_function import diff_services, upsert_agreement
+
+
+def _service(name, cost=50.0, units=2, tuition=100.0):
+    return {"service_name": name, "cost_per_unit": cost, "units": units, "tuition": tuition}
+
+
+def test_unchanged_services_are_a_no_op():
+    current = [(1, 10, "Math", 50.0, 2, 100.0), (2, 11, "Reading", 25.0, 4, 100.0)]
+    services = [_service("Reading", 25.0, 4), _service("Math")]
+    assert diff_services(current, services) == ([], [])
+
+
+def test_changed_service_is_removed_and_added():
+    current = [(1, 10, "Math", 50.0, 2, 100.0), (2, 11, "Reading", 25.0, 4, 100.0)]
+    services = [_service("Math"), _service("Reading", 25.0, 5, 125.0)]
+    assert diff_services(current, services) == ([2], [("Reading", 25.0, 5, 125.0)])
+
+
+def test_duplicates_are_matched_one_to_one():
+    current = [(1, 10, "Math", 50.0, 2, 100.0), (2, 11, "Math", 50.0, 2, 100.0)]
+
+    removed, added = diff_services(current, [_service("Math")])
+    assert len(removed) == 1 and added == []
+
+    removed, added = diff_services(current, [_service("Math")] * 3)
+    assert removed == [] and added == [("Math", 50.0, 2, 100.0)]
+
+
+def test_numeric_columns_match_the_floats_they_were_written_from():
+    # psycopg2 reads numeric columns back as Decimal
+    current = [(1, 10, "Math", Decimal("33.33"), Decimal("3"), Decimal("99.99"))]
+    assert diff_services(current, [_service("Math", 33.33, 3, 99.99)]) == ([], [])
+
+
+def test_upsert_reconciles_only_the_changed_services(pg_conn, agreement):
+    conn, prefix = pg_conn
+    s3_path = f"{prefix}/a.pdf"
+    upsert_agreement(conn, agreement, s3_path)
+    before = {row[1]: row for row in linked_services(conn, s3_path)}
+    assert sorted(before) == ["Service 0", "Service 1", "Service 2"]
+
+    services = [dict(s) for s in agreement["services_list"]]
+    services[1]["tuition"] = 150.0
+    del services[2]
+    services.append(_service("Tutoring", 40.0, 1, 40.0))
+    upsert_agreement(conn, dict(agreement, services_list=services), s3_path)
+
+    after = linked_services(conn, s3_path)
+    assert sorted(row[1:] for row in after) == sorted([
+        ("Service 0", 50.0, 2.0, 100.0),
+        ("Service 1", 50.0, 2.0, 150.0),
+        ("Tutoring", 40.0, 1.0, 40.0),
+    ])
+    # The unchanged service kept its row; the changed and removed ones are gone
+    assert before["Service 0"] in after
+    assert not service_exists(conn, before["Service 1"][0])
+    assert not service_exists(conn, before["Service 2"][0])
+
+
+def test_service_linked_elsewhere_is_not_deleted(pg_conn, agreement):
+    conn, prefix = pg_conn
+    upsert_agreement(conn, agreement, f"{prefix}/a.pdf")
+    shared_id = next(row[0] for row in linked_services(conn, f"{prefix}/a.pdf") if row[1] == "Service 0")
+    upsert_agreement(conn, dict(agreement, document_id="other"), f"{prefix}/b.pdf")
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO public.agreements_service_agreements (agreement_id, agreement_service_id) "
+            "SELECT id, %s FROM public.agreements WHERE s3_path = %s", (shared_id, f"{prefix}/b.pdf"))
+
+    upsert_agreement(conn, dict(agreement, services_list=agreement["services_list"][1:]), f"{prefix}/a.pdf")
+
+    assert shared_id not in [row[0] for row in linked_services(conn, f"{prefix}/a.pdf")]
+    assert service_exists(conn, shared_id)
+
+
+def test_agreement_without_services_has_no_links(pg_conn, agreement):
+    conn, prefix = pg_conn
+    upsert_agreement(conn, dict(agreement, services_list=None), f"{prefix}/a.pdf")
+    assert linked_services(conn, f"{prefix}/a.pdf") == []
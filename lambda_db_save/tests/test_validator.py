@@ -0,0 +1,52 @@
+from benchmarks.validation import extracted, user_save
+from validators.agreement_validator import check_agreement_data, check_agreements
+
+
+def _broken(i):
+    item = user_save(i, 1)
+    del item["student_campus"]
+    return item
+
+
+def test_every_item_gets_a_result():
+    items = [user_save(0, 1), _broken(1), extracted(2, 2)]
+
+    checks = check_agreements(items)
+
+    assert [check.ok for check in checks] == [True, False, True]
+    assert all(check.checked for check in checks)
+    assert checks[1].errors and checks[1].errors[0]["loc"] == ()
+    assert checks[2].agreement.services_list[1].service_name
+
+
+def test_fail_fast_validates_items_before_the_failure():
+    items = [user_save(0, 1), user_save(1, 1), _broken(2), user_save(3, 1), _broken(4)]
+
+    checks = check_agreements(items, fail_fast=True)
+
+    assert [check.ok for check in checks] == [True, True, False, False, False]
+    assert [check.checked for check in checks] == [True, True, True, False, False]
+    assert checks[2].errors
+    assert checks[3].errors == [] and checks[4].errors == []
+
+
+def test_mis_shaped_input_is_an_item_error():
+    # normalize_input raises AttributeError on the list and TypeError iterating the int
+    bad = dict(extracted(1, 1), student=["Bench", "Student"])
+    wrong_type = dict(user_save(2, 1), services_list=5)
+
+    checks = check_agreements([user_save(0, 1), bad, wrong_type, "not an agreement"])
+
+    assert [check.ok for check in checks] == [True, False, False, False]
+    assert all(check.errors for check in checks[1:])
+
+
+def test_check_agreement_data_logs_only_identifiers(capsys):
+    item = user_save(0, 1)
+    check_agreement_data(**item)
+    check_agreement_data(**_broken(1))
+
+    out = capsys.readouterr().out
+    assert item["s3_path"] in out
+    for personal in (item["student_last_name"], item["parent_guardian_full_name"], item["parent_guardian_email"]):
+        assert personal not in out
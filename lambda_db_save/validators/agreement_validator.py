@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field, ValidationError, model_validator, field_validator # pip install email-validator
-from typing import Optional, List
+from dataclasses import dataclass, field
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, ValidationError, model_validator, field_validator # pip install email-validator
+from typing import Annotated, Any, Optional, List
 
 class Service(BaseModel):
     service_name: str
@@ -43,12 +44,15 @@ class AgreementData(BaseModel):
             return data
 
         fmt = data.get("input_format")
-        if fmt == "user save":
-            return cls._normalize_user_save_data(data)
-        elif fmt == "extracted from model":
-            return cls._normalize_model_extracted_data(data)
-        else:
-            raise ValueError("input_format must be provided")
+        try:
+            if fmt == "user save":
+                return cls._normalize_user_save_data(data)
+            elif fmt == "extracted from model":
+                return cls._normalize_model_extracted_data(data)
+        except (KeyError, AttributeError, TypeError) as e:
+            # Missing or mis-shaped input: report it as a validation error, not a crash
+            raise ValueError(f"Cannot read {fmt} data: {type(e).__name__} {e}")
+        raise ValueError("input_format must be provided")
 
     # TODO: Set is_valid to false if something is wrong in a method below
     def is_valid_service(service: dict) -> bool:
@@ -132,9 +136,6 @@ class AgreementData(BaseModel):
 
     @classmethod
     def _normalize_user_save_data(cls, data: dict) -> dict:
-        print("RETURNING USER SAVE DATA")
-        services_list = data.get("services_list") or data.get("services"),
-        print(f"Services list: {services_list}")
         services = data.get("services_list") or data.get("services") or []
 
         services_list = [
@@ -230,7 +231,6 @@ class AgreementData(BaseModel):
     @model_validator(mode="after")
     def check_total_matches_services(self):
         try:
-            print(f"SERVICES validator: {self.services_list}")
             total_from_services = sum(s.tuition for s in self.services_list)
             allowed_diff = self.payment_amount * 0.10  # 10% of total
             diff = abs(total_from_services - self.payment_amount)
@@ -244,10 +244,69 @@ class AgreementData(BaseModel):
 
 
 def check_agreement_data(**kwargs):
-    print(f"Check start: {kwargs}")
+    # Only the identifiers: the payload holds student and guardian details
+    print(f"Check start: s3_path={kwargs.get('s3_path')} document_id={kwargs.get('document_id')}")
     try:
         obj = AgreementData(**kwargs)
         return True, obj
     except ValidationError as e:
-        print(f"Validation Error: {e}")
+        print(f"Validation Error: {e.errors(include_url=False, include_input=False)}")
         return False, e.errors()
+
+
+# Built once: validating a whole list in one call keeps the per-item work in
+# pydantic-core instead of a Python loop of AgreementData(**kwargs)
+_AGREEMENT_LIST = TypeAdapter(list[AgreementData])
+_AGREEMENT_LIST_FAIL_FAST = TypeAdapter(Annotated[list[AgreementData], Field(fail_fast=True)])
+
+
+@dataclass
+class AgreementCheck:
+    index: int
+    agreement: Optional[AgreementData] = None
+    errors: list = field(default_factory=list)
+    # False for items a fail-fast batch stopped before reaching
+    checked: bool = True
+
+    @property
+    def ok(self) -> bool:
+        return self.agreement is not None
+
+
+def check_agreements(items, input_format=None, fail_fast=False):
+    """
+    Validate a batch of agreements. Items without an input_format get the
+    given one. Returns one AgreementCheck per item, in order; errors are
+    pydantic error dicts without the list index, input or URL.
+
+    fail_fast stops at the first invalid item: it gets its errors, the items
+    before it are returned validated and the items after it come back
+    unchecked, with no agreement.
+    """
+    prepared = [
+        {**item, "input_format": item.get("input_format") or input_format} if isinstance(item, dict) else item
+        for item in items
+    ]
+    results = [AgreementCheck(index) for index in range(len(prepared))]
+    try:
+        agreements = (_AGREEMENT_LIST_FAIL_FAST if fail_fast else _AGREEMENT_LIST).validate_python(prepared)
+    except ValidationError as e:
+        for error in e.errors(include_url=False, include_context=False, include_input=False):
+            index, *loc = error["loc"]
+            results[index].errors.append({**error, "loc": tuple(loc)})
+        if fail_fast:
+            failed_at = min(result.index for result in results if result.errors)
+            for result in results[failed_at + 1:]:
+                result.checked = False
+            passing = list(range(failed_at))
+        else:
+            passing = [result.index for result in results if not result.errors]
+        # pydantic returns nothing when any item fails, so validate the rest again
+        agreements = _AGREEMENT_LIST.validate_python([prepared[i] for i in passing]) if passing else []
+        for index, agreement in zip(passing, agreements):
+            results[index].agreement = agreement
+        return results
+
+    for result, agreement in zip(results, agreements):
+        result.agreement = agreement
+    return results
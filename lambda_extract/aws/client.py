@@ -1,11 +1,18 @@
 # from __future__ import annotations
 import json
 import os
-import tempfile
+import re
+import threading
+import time
+from urllib.parse import unquote_plus
 from dataclasses import dataclass
-from typing import Any, Optional
-import boto3
-from botocore.exceptions import ClientError
+from functools import cached_property
+from typing import Any, Callable, Optional
+
+from extract import metrics
+from extract.document import PdfDocument
+
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
 
 
 def get_s3_path(event: dict) -> str:
@@ -23,27 +30,154 @@ def get_s3_path(event: dict) -> str:
     raise ValueError("Could not determine s3_path from event.")
 
 
+# Agreements split out of a scanned bundle are stored under "<key>::pages-<range>".
+# Not "#", which the frontend would send as a URL fragment.
+SEGMENT_SEPARATOR = "::pages-"
+
+
+SEGMENT_RANGE_RE = re.compile(r"\d+-\d+")
+
+
+def segment_key(s3_path: str, page_range: str) -> str:
+    return f"{s3_path}{SEGMENT_SEPARATOR}{page_range}"
+
+
+def split_segment_key(key: str) -> tuple[str, Optional[str]]:
+    """The bundle's S3 key and page range of a segment_key(); (key, None) for a plain key."""
+    base, separator, page_range = key.rpartition(SEGMENT_SEPARATOR)
+    if separator and base and SEGMENT_RANGE_RE.fullmatch(page_range):
+        return base, page_range
+    return key, None
+
+
+@dataclass(frozen=True)
+class S3ObjectRef:
+    bucket: Optional[str]
+    key: str
+    version_id: Optional[str] = None
+    etag: Optional[str] = None
+
+    @property
+    def ledger_key(self) -> str:
+        return f"{self.bucket}/{self.key}#{self.version_id or self.etag or ''}"
+
+
+def get_s3_object(event: dict) -> S3ObjectRef:
+    """The object an event refers to. API Gateway requests only name the key."""
+    key = get_s3_path(event)
+    if event.get("source") == "aws.s3":
+        detail = event.get("detail") or {}
+        obj = detail.get("object") or {}
+        return S3ObjectRef(
+            bucket=(detail.get("bucket") or {}).get("name"),
+            key=key,
+            version_id=obj.get("version-id"),
+            etag=obj.get("etag"),
+        )
+    return S3ObjectRef(bucket=None, key=key)
+
+
+def events_from_sqs_record(record: dict) -> list[dict]:
+    """
+    Handler events carried by one SQS message. The body may be an S3
+    notification (possibly several records), an EventBridge aws.s3 event or
+    {"s3_path": ...}; S3 test events yield nothing.
+    """
+    body = json.loads(record.get("body") or "{}")
+    if body.get("source") == "aws.s3":
+        return [body]
+    if "s3_path" in body:
+        return [{"queryStringParameters": {"s3_path": body["s3_path"]}}]
+    events = []
+    for notification in body.get("Records", []):
+        s3 = notification.get("s3") or {}
+        obj = s3.get("object") or {}
+        events.append({
+            "source": "aws.s3",
+            "detail": {
+                "bucket": {"name": (s3.get("bucket") or {}).get("name")},
+                # Notification keys are URL-encoded, EventBridge keys are not
+                "object": {"key": unquote_plus(obj.get("key", "")), "version-id": obj.get("versionId"),
+                           "etag": obj.get("eTag")},
+            },
+        })
+    return events
+
+
 @dataclass(frozen=True)
 class AwsConfig:
     # region: str = os.getenv("REGION")
     upsert_fn: str = os.getenv("UPSERT_FN")
     bucket: str = os.getenv("PDF_BUCKET")
     secret_name: str = os.getenv("APP_SECRET_NAME")
+    # PDFs up to this size stay in memory, bigger ones spill to /tmp
+    max_memory_bytes: int = int(os.getenv("PDF_MAX_MEMORY_BYTES", 32 * 1024 * 1024))
+    # Ceiling on bytes spilled to /tmp by one container at a time
+    max_disk_bytes: int = int(os.getenv("PDF_MAX_DISK_BYTES", 256 * 1024 * 1024))
+    secrets_ttl_seconds: float = float(os.getenv("SECRETS_TTL_SECONDS", 300))
+
+
+class SecretsCache:
+    """Parsed secret blobs keyed by secret id, refetched once their TTL runs out."""
+
+    def __init__(self, fetch: Callable[[str], str], ttl_seconds: float = 300):
+        self.fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self._entries: dict[str, tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, secret_id: str) -> dict:
+        with self._lock:
+            entry = self._entries.get(secret_id)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            secret = json.loads(self.fetch(secret_id))
+            self._entries[secret_id] = (time.monotonic() + self.ttl_seconds, secret)
+            return secret
+
+    def invalidate(self, secret_id: Optional[str] = None) -> None:
+        with self._lock:
+            if secret_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(secret_id, None)
 
 
 class AwsAdapter:
-    def __init__(self, cfg: Optional[AwsConfig] = None, session: Optional[boto3.session.Session] = None):
+    def __init__(self, cfg: Optional[AwsConfig] = None, session: Optional["boto3.session.Session"] = None):
         self.cfg = cfg if cfg is not None else AwsConfig()
-        # self.session = session or boto3.session.Session(region_name=self.cfg.region)
+        self.session = session
+        # Clients are created on first use so paths that never touch AWS skip the boto3 import
+        self._client_lock = threading.Lock()
+        self._secrets_cache = SecretsCache(self._fetch_secret_string, self.cfg.secrets_ttl_seconds)
+        # Updated by every record of an SQS batch, which run on several threads
+        self.ingest_stats = {"memory_documents": 0, "disk_documents": 0, "memory_bytes": 0, "disk_bytes": 0}
+        self._stats_lock = threading.Lock()
+
+    def _client(self, service_name: str):
+        with self._client_lock:
+            if self.session is not None:
+                return self.session.client(service_name)
+            import boto3
+            return boto3.client(service_name)
 
-        # Create clients once (reused)
-        # self.s3 = self.session.client("s3")
-        # self.lambda_client = self.session.client("lambda")
-        # self.secrets = self.session.client("secretsmanager")
-        self.s3 = boto3.client("s3")
-        self.lambda_client = boto3.client("lambda")
-        self.secrets = boto3.client("secretsmanager")
+    @cached_property
+    def s3(self):
+        return self._client("s3")
 
+    @cached_property
+    def lambda_client(self):
+        return self._client("lambda")
+
+    @cached_property
+    def secrets(self):
+        return self._client("secretsmanager")
+
+    @cached_property
+    def dynamodb(self):
+        return self._client("dynamodb")
+
+    @metrics.timed("upsert_invoke")
     def call_upsert(self, agreement: dict, s3_path: str) -> dict:
         payload = {
             "agreement": agreement,
@@ -57,27 +191,70 @@ class AwsAdapter:
             Payload=json.dumps(payload).encode("utf-8"),
         )
 
+    def _fetch_secret_string(self, secret_id: str) -> str:
+        return self.secrets.get_secret_value(SecretId=secret_id)["SecretString"]
+
     def get_secret_value(self, secret_parameter: str) -> Any:
-        try:
-            get_secret_value_response = self.secrets.get_secret_value(
-                SecretId=self.cfg.secret_name
-            )
-        except ClientError as e:
-            raise e
+        return self._secrets_cache.get(self.cfg.secret_name)[secret_parameter]
 
-        secret = get_secret_value_response["SecretString"]
-        secret = json.loads(secret)
-        return secret[secret_parameter]
+    def resolve_object(self, ref: S3ObjectRef) -> S3ObjectRef:
+        """Fill in bucket and ETag (one HEAD request) when the event did not carry them."""
+        bucket = ref.bucket or self.cfg.bucket
+        if ref.version_id or ref.etag:
+            return S3ObjectRef(bucket, ref.key, ref.version_id, ref.etag)
+        # A segment of a bundle is versioned by the bundle object; the ledger keeps the segment key
+        head = self.s3.head_object(Bucket=bucket, Key=split_segment_key(ref.key)[0])
+        return S3ObjectRef(bucket, ref.key, head.get("VersionId"), head.get("ETag", "").strip('"') or None)
+
+    def list_pdf_keys(self, prefix: str = "") -> list[str]:
+        keys = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.cfg.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if obj["Key"].lower().endswith(".pdf"):
+                    keys.append(obj["Key"])
+        return keys
+
+    @metrics.timed("s3_download")
+    def fetch_pdf(self, key: str) -> PdfDocument:
+        """
+        Stream an S3 object into memory, spilling to a managed temp file once
+        it grows past max_memory_bytes. Close the returned document (or use it
+        as a context manager) to remove any spilled file.
+        """
+        obj = self.s3.get_object(Bucket=self.cfg.bucket, Key=key)
+        body = obj["Body"]
+        content_length = obj.get("ContentLength") or 0
+        name = os.path.basename(key)
+
+        if content_length > self.cfg.max_memory_bytes:
+            document = PdfDocument.spill(
+                body.iter_chunks(DOWNLOAD_CHUNK_BYTES), name, self.cfg.max_disk_bytes, content_length
+            )
+        else:
+            buffer = bytearray()
+            chunks = body.iter_chunks(DOWNLOAD_CHUNK_BYTES)
+            for chunk in chunks:
+                buffer += chunk
+                if len(buffer) > self.cfg.max_memory_bytes:
+                    # ContentLength was missing or wrong; continue on disk
+                    head = bytes(buffer)
+                    buffer = None
 
-    def download_pdf_to_tmp(self, key: str) -> str:
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir="/tmp")
-        tmp_path = tmp.name
-        tmp.close()
+                    def rest():
+                        yield head
+                        yield from chunks
 
-        print(f"Start download s3://{self.cfg.bucket}/{key} -> {tmp_path}")
-        with open(tmp_path, "wb") as f:
-            self.s3.download_fileobj(self.cfg.bucket, key, f)
-            f.flush()
-            os.fsync(f.fileno())
+                    document = PdfDocument.spill(rest(), name, self.cfg.max_disk_bytes)
+                    break
+            else:
+                document = PdfDocument(data=bytes(buffer), name=name)
 
-        return tmp_path
+        path = "memory" if document.in_memory else "disk"
+        with self._stats_lock:
+            self.ingest_stats[f"{path}_documents"] += 1
+            self.ingest_stats[f"{path}_bytes"] += document.size
+        metrics.put_property("IngestPath", path)
+        metrics.count("downloaded_bytes", document.size, "Bytes")
+        print(f"Fetched {document.size} bytes via {path}")
+        return document
@@ -0,0 +1,240 @@
+"""
+Dedup ledger for S3-triggered extractions. S3 and EventBridge deliver at
+least once and one upload can fire several events, so every invocation first
+claims its object version:
+
+    claim = ledger.claim(object_ref.ledger_key)
+    if claim.status == "done":       -> return the stored outcome
+    if claim.status == "in_flight":  -> another invocation owns it, drop
+    ... extract and upsert ...
+    ledger.complete(claim, response)   (or ledger.release(claim) on failure)
+
+In-flight claims expire after lease_seconds so a crashed invocation does not
+block the object forever; completed outcomes are kept for window_seconds.
+Failures are released, never cached, so a redelivery gets a fresh attempt.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Optional
+
+CLAIMED = "claimed"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+
+
+@dataclass
+class Claim:
+    key: str
+    status: str
+    token: str = ""
+    outcome: Optional[dict] = None
+
+    @property
+    def owned(self) -> bool:
+        return self.status == CLAIMED
+
+
+class LedgerStore:
+    def __init__(self, window_seconds: float = 3600, lease_seconds: float = 900):
+        self.window_seconds = window_seconds
+        self.lease_seconds = lease_seconds
+
+    def claim(self, key: str) -> Claim:
+        raise NotImplementedError
+
+    def complete(self, claim: Claim, outcome: dict) -> None:
+        raise NotImplementedError
+
+    def release(self, claim: Claim) -> None:
+        raise NotImplementedError
+
+
+class MemoryLedger(LedgerStore):
+    """Per-container ledger; only catches duplicates that land on the same warm container."""
+
+    def __init__(self, window_seconds: float = 3600, lease_seconds: float = 900):
+        super().__init__(window_seconds, lease_seconds)
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Claim:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] > now:
+                return Claim(key, entry["status"], outcome=entry.get("outcome"))
+            token = uuid.uuid4().hex
+            self._entries[key] = {"status": IN_FLIGHT, "token": token, "expires_at": now + self.lease_seconds}
+            return Claim(key, CLAIMED, token)
+
+    def complete(self, claim: Claim, outcome: dict) -> None:
+        with self._lock:
+            entry = self._entries.get(claim.key)
+            if entry is not None and entry["token"] == claim.token:
+                self._entries[claim.key] = {
+                    "status": DONE,
+                    "token": claim.token,
+                    "outcome": outcome,
+                    "expires_at": time.time() + self.window_seconds,
+                }
+
+    def release(self, claim: Claim) -> None:
+        with self._lock:
+            entry = self._entries.get(claim.key)
+            if entry is not None and entry["token"] == claim.token:
+                del self._entries[claim.key]
+
+
+class SqliteLedger(LedgerStore):
+    def __init__(self,
+                 path: str = "/tmp/extract_ledger.sqlite3",
+                 window_seconds: float = 3600,
+                 lease_seconds: float = 900,
+    ):
+        super().__init__(window_seconds, lease_seconds)
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit; claims take an explicit write lock so separate processes can share the file
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extract_ledger (
+                key TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                token TEXT NOT NULL,
+                outcome TEXT,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+
+    def claim(self, key: str) -> Claim:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT status, outcome, expires_at FROM extract_ledger WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[2] > now:
+                    self._db.execute("COMMIT")
+                    return Claim(key, row[0], outcome=json.loads(row[1]) if row[1] else None)
+                token = uuid.uuid4().hex
+                self._db.execute(
+                    "INSERT OR REPLACE INTO extract_ledger (key, status, token, outcome, expires_at) "
+                    "VALUES (?, ?, ?, NULL, ?)",
+                    (key, IN_FLIGHT, token, now + self.lease_seconds),
+                )
+                self._db.execute("COMMIT")
+                return Claim(key, CLAIMED, token)
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def complete(self, claim: Claim, outcome: dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE extract_ledger SET status = ?, outcome = ?, expires_at = ? WHERE key = ? AND token = ?",
+                (DONE, json.dumps(outcome), time.time() + self.window_seconds, claim.key, claim.token),
+            )
+
+    def release(self, claim: Claim) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM extract_ledger WHERE key = ? AND token = ?", (claim.key, claim.token))
+
+
+class DynamoDbLedger(LedgerStore):
+    """
+    Items: pk (S), status (S), token (S), outcome (S, JSON), expires_at (N).
+    Enable the table's TTL on expires_at so old records clean themselves up;
+    claims compare against expires_at themselves, TTL deletion is only housekeeping.
+    """
+
+    def __init__(self,
+                 dynamodb_client: Any,
+                 table: str,
+                 window_seconds: float = 3600,
+                 lease_seconds: float = 900,
+    ):
+        super().__init__(window_seconds, lease_seconds)
+        self.dynamodb = dynamodb_client
+        self.table = table
+
+    def claim(self, key: str) -> Claim:
+        now = int(time.time())
+        token = uuid.uuid4().hex
+        try:
+            self.dynamodb.put_item(
+                TableName=self.table,
+                Item={
+                    "pk": {"S": key},
+                    "status": {"S": IN_FLIGHT},
+                    "token": {"S": token},
+                    "expires_at": {"N": str(now + int(self.lease_seconds))},
+                },
+                ConditionExpression="attribute_not_exists(pk) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+            return Claim(key, CLAIMED, token)
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            pass
+
+        item = self.dynamodb.get_item(TableName=self.table, Key={"pk": {"S": key}}, ConsistentRead=True).get("Item")
+        if item is None:
+            # Released between our put and get; let the redelivery pick it up
+            return Claim(key, IN_FLIGHT)
+        outcome = item.get("outcome", {}).get("S")
+        return Claim(key, item["status"]["S"], outcome=json.loads(outcome) if outcome else None)
+
+    def complete(self, claim: Claim, outcome: dict) -> None:
+        try:
+            self.dynamodb.update_item(
+                TableName=self.table,
+                Key={"pk": {"S": claim.key}},
+                UpdateExpression="SET #status = :done, outcome = :outcome, expires_at = :expires",
+                ConditionExpression="#token = :token",
+                ExpressionAttributeNames={"#status": "status", "#token": "token"},
+                ExpressionAttributeValues={
+                    ":done": {"S": DONE},
+                    ":outcome": {"S": json.dumps(outcome)},
+                    ":expires": {"N": str(int(time.time() + self.window_seconds))},
+                    ":token": {"S": claim.token},
+                },
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            print(f"Ledger claim for {claim.key} was taken over before completion")
+
+    def release(self, claim: Claim) -> None:
+        try:
+            self.dynamodb.delete_item(
+                TableName=self.table,
+                Key={"pk": {"S": claim.key}},
+                ConditionExpression="#token = :token",
+                ExpressionAttributeNames={"#token": "token"},
+                ExpressionAttributeValues={":token": {"S": claim.token}},
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            pass
+
+
+def ledger_from_env(aws: Any = None) -> Optional[LedgerStore]:
+    """
+    DEDUP_LEDGER=dynamodb uses DEDUP_TABLE, DEDUP_LEDGER=sqlite uses
+    DEDUP_LEDGER_PATH, DEDUP_LEDGER=memory keeps it per container. Anything
+    else disables dedup.
+    """
+    kind = os.getenv("DEDUP_LEDGER", "").lower()
+    window = float(os.getenv("DEDUP_WINDOW_SECONDS", 3600))
+    lease = float(os.getenv("DEDUP_LEASE_SECONDS", 900))
+    if kind == "dynamodb" and aws is not None:
+        return DynamoDbLedger(aws.dynamodb, os.getenv("DEDUP_TABLE"), window, lease)
+    if kind == "sqlite":
+        return SqliteLedger(os.getenv("DEDUP_LEDGER_PATH", "/tmp/extract_ledger.sqlite3"), window, lease)
+    if kind == "memory":
+        return MemoryLedger(window, lease)
+    return None
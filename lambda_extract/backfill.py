@@ -0,0 +1,235 @@
+"""
+Bulk (re)extraction of every PDF under an S3 prefix or a local directory.
+
+    python backfill.py s3://my-bucket/campus-x/ --workers 8 --upsert
+    python backfill.py ./samples --stub-extractor --checkpoint samples.ckpt
+
+Documents go through the same extraction as the Lambda
+(lambda_function.extract_agreements), so with SEGMENT_BUNDLES=1 a bundle is
+split and each agreement is upserted under its segment key, exactly as an S3
+event would. Completed documents are appended to the checkpoint file;
+re-running with the same checkpoint skips them and retries only the failures.
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aws.client import AwsAdapter, AwsConfig
+from extract.document import PdfDocument
+from lambda_function import build_extractor, extract_agreements
+
+
+class LocalSource:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def list_keys(self) -> list[str]:
+        keys = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.lower().endswith(".pdf"):
+                    keys.append(os.path.relpath(os.path.join(root, name), self.directory))
+        return sorted(keys)
+
+    def fetch(self, key: str) -> PdfDocument:
+        return PdfDocument(path=os.path.join(self.directory, key))
+
+    def release(self, key: str, document) -> None:
+        pass
+
+
+class S3Source:
+    def __init__(self, aws, prefix: str):
+        self.aws = aws
+        self.prefix = prefix
+
+    def list_keys(self) -> list[str]:
+        return sorted(self.aws.list_pdf_keys(self.prefix))
+
+    def fetch(self, key: str):
+        return self.aws.fetch_pdf(key)
+
+    def release(self, key: str, document) -> None:
+        document.close()
+
+
+class StubExtractor:
+    """Stand-in for LLMExtractor so backfills can be exercised without AWS or LlamaExtract."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def extract(self, document) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        name = document if isinstance(document, str) else document.name
+        return {"document_title": "stub", "source": os.path.basename(name)}
+
+    def extract_bundle(self, document) -> list:
+        from extract.app import SegmentResult
+        from extract.title import Segment
+        return [SegmentResult(Segment("stub", 1, 1, 1.0), agreement=self.extract(document))]
+
+
+class Checkpoint:
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done: set[str] = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    if record.get("status") == "ok":
+                        self.done.add(record["key"])
+
+    def record(self, record: dict) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+@dataclass
+class DocumentOutcome:
+    key: str
+    ok: bool
+    elapsed: float
+    # key -> agreement; several for a bundle split by SEGMENT_BUNDLES
+    agreements: dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def process_document(source, extractor, key: str, upsert_fn=None) -> DocumentOutcome:
+    start = time.monotonic()
+    document = None
+    try:
+        document = source.fetch(key)
+        extracted = {}
+        error = None
+        for agreement_key, agreement, segment_error in extract_agreements(extractor, document, key):
+            if segment_error is not None:
+                error = error or segment_error
+                continue
+            if upsert_fn is not None:
+                upsert_fn(agreement, agreement_key)
+            extracted[agreement_key] = agreement
+        return DocumentOutcome(key, error is None, time.monotonic() - start, agreements=extracted,
+                               error=repr(error) if error is not None else None)
+    except Exception as e:
+        return DocumentOutcome(key, False, time.monotonic() - start, error=repr(e))
+    finally:
+        if document is not None:
+            source.release(key, document)
+
+
+def run_backfill(source,
+                 extractor,
+                 workers: int = 4,
+                 checkpoint: Optional[Checkpoint] = None,
+                 upsert_fn=None,
+                 output_path: Optional[str] = None,
+                 limit: Optional[int] = None,
+) -> dict:
+    checkpoint = checkpoint or Checkpoint(None)
+    keys = [k for k in source.list_keys() if k not in checkpoint.done]
+    if limit is not None:
+        keys = keys[:limit]
+    print(f"{len(keys)} documents to process ({len(checkpoint.done)} already done)")
+
+    output = open(output_path, "a") if output_path else None
+    outcomes: list[DocumentOutcome] = []
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(process_document, source, extractor, key, upsert_fn) for key in keys]
+            for future in as_completed(futures):
+                outcome = future.result()
+                outcomes.append(outcome)
+                checkpoint.record({
+                    "key": outcome.key,
+                    "status": "ok" if outcome.ok else "failed",
+                    "elapsed": round(outcome.elapsed, 3),
+                    "error": outcome.error,
+                })
+                if output:
+                    for key, agreement in outcome.agreements.items():
+                        output.write(json.dumps({"key": key, "agreement": agreement}) + "\n")
+                print(f"[{len(outcomes)}/{len(keys)}] {'ok' if outcome.ok else 'FAILED'} "
+                      f"{outcome.key} ({outcome.elapsed:.2f}s)")
+    finally:
+        if output:
+            output.close()
+
+    wall = time.monotonic() - started
+    latencies = [o.elapsed for o in outcomes]
+    failures = [o for o in outcomes if not o.ok]
+    return {
+        "documents": len(outcomes),
+        "succeeded": len(outcomes) - len(failures),
+        "failed": len(failures),
+        "wall_seconds": round(wall, 3),
+        "docs_per_second": round(len(outcomes) / wall, 3) if wall > 0 else 0.0,
+        "p50_seconds": round(percentile(latencies, 50), 3),
+        "p95_seconds": round(percentile(latencies, 95), 3),
+        "failures": [{"key": o.key, "error": o.error} for o in failures],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Extract every PDF under an S3 prefix or local directory.")
+    parser.add_argument("source", help="s3://bucket/prefix or a local directory")
+    parser.add_argument("--workers", type=int, default=4, help="Documents processed concurrently")
+    parser.add_argument("--checkpoint", help="Resumable checkpoint file (JSON lines)")
+    parser.add_argument("--output", help="Append extracted agreements to this JSON lines file")
+    parser.add_argument("--upsert", action="store_true", help="Send each agreement to the upsert Lambda")
+    parser.add_argument("--limit", type=int, help="Process at most this many documents")
+    parser.add_argument("--stub-extractor", action="store_true", help="Use StubExtractor instead of LlamaExtract")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Simulated seconds per stub extraction")
+    args = parser.parse_args(argv)
+
+    if args.source.startswith("s3://"):
+        bucket, _, prefix = args.source[len("s3://"):].partition("/")
+        aws = AwsAdapter(AwsConfig(bucket=bucket))
+        source = S3Source(aws, prefix)
+    else:
+        aws = AwsAdapter()
+        source = LocalSource(args.source)
+
+    if args.stub_extractor:
+        extractor = StubExtractor(args.stub_latency)
+    else:
+        extractor = build_extractor(aws)
+    report = run_backfill(
+        source,
+        extractor,
+        workers=args.workers,
+        checkpoint=Checkpoint(args.checkpoint),
+        upsert_fn=aws.call_upsert if args.upsert else None,
+        output_path=args.output,
+        limit=args.limit,
+    )
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,121 @@
+"""
+Runs lambda_handler on a synthetic SQS batch without AWS or LlamaExtract.
+
+    python -m benchmarks.batch_events --records 40 --fail-every 7 --latency 0.5
+    python -m benchmarks.batch_events --samples ./pdfs --real-extractor --cassettes ./cassettes
+
+Records alternate between S3 notification, EventBridge and {"s3_path"}
+bodies. Every --fail-every-th record names a missing object so the
+batchItemFailures path is exercised. The batch is timed against handling the
+same records one invocation at a time.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+from extract.document import PdfDocument
+
+
+class LocalAws:
+    """The parts of AwsAdapter the handler uses, served from in-memory PDFs."""
+
+    def __init__(self, documents: dict):
+        self.documents = documents
+        self.upserts = []
+
+    def resolve_object(self, ref):
+        from aws.client import S3ObjectRef
+        return S3ObjectRef(ref.bucket or "local", ref.key, ref.version_id, ref.etag or "local")
+
+    def fetch_pdf(self, key: str) -> PdfDocument:
+        if key not in self.documents:
+            raise FileNotFoundError(key)
+        return PdfDocument(data=self.documents[key], name=key)
+
+    def call_upsert(self, agreement: dict, s3_path: str) -> dict:
+        self.upserts.append(s3_path)
+        return {}
+
+
+def sqs_record(key: str, shape: int) -> dict:
+    if shape == 0:
+        body = {"Records": [{"s3": {"bucket": {"name": "local"}, "object": {"key": key, "eTag": uuid.uuid4().hex}}}]}
+    elif shape == 1:
+        body = {"source": "aws.s3", "detail": {"bucket": {"name": "local"}, "object": {"key": key}}}
+    else:
+        body = {"s3_path": key}
+    return {"messageId": uuid.uuid4().hex, "eventSource": "aws:sqs", "body": json.dumps(body)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20)
+    parser.add_argument("--fail-every", type=int, default=0, help="Make every Nth record point at a missing object")
+    parser.add_argument("--workers", type=int, default=4, help="BATCH_MAX_WORKERS")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per stub extraction")
+    parser.add_argument("--samples", help="Directory of PDFs to use instead of generated samples")
+    parser.add_argument("--real-extractor", action="store_true",
+                        help="Use LLMExtractor with ReplayExtractor instead of StubExtractor")
+    parser.add_argument("--cassettes", help="Cassette directory for --real-extractor")
+    args = parser.parse_args(argv)
+
+    import lambda_function
+    from backfill import StubExtractor
+    from benchmarks.pipeline import _load_documents
+
+    samples = _load_documents(args.samples)
+    names = list(samples)
+    keys = [f"batch/{i:04d}-{names[i % len(names)]}" for i in range(args.records)]
+    documents = {key: samples[key.split("-", 1)[1]] for key in keys}
+    if args.fail_every:
+        for key in keys[args.fail_every - 1::args.fail_every]:
+            del documents[key]
+
+    if args.real_extractor:
+        from extract.app import LLMExtractor
+        from extract.replay import ReplayExtractor
+        from schemas.registry import EXTRACTION_PLANS, POST_PROCESSING_PLAN
+        extractor = LLMExtractor(
+            api_key="",
+            extraction_plans=EXTRACTION_PLANS,
+            post_processing_plan=POST_PROCESSING_PLAN,
+            client=ReplayExtractor(args.cassettes, latency=args.latency, synthesize_missing=not args.cassettes),
+        )
+    else:
+        extractor = StubExtractor(args.latency)
+
+    local_aws = LocalAws(documents)
+    lambda_function.aws = local_aws
+    lambda_function.ledger = None
+    lambda_function._extractor = extractor
+    lambda_function.BATCH_MAX_WORKERS = args.workers
+
+    records = [sqs_record(key, i % 3) for i, key in enumerate(keys)]
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        started = time.perf_counter()
+        result = lambda_function.lambda_handler({"Records": records}, None)
+        batch_wall = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for record in records:
+            lambda_function.lambda_handler({"Records": [record]}, None)
+        single_wall = time.perf_counter() - started
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+    failed = {f["itemIdentifier"] for f in result["batchItemFailures"]}
+    expected = {r["messageId"] for r, key in zip(records, keys) if key not in documents}
+    print(f"{len(records)} records, {len(failed)} reported failed "
+          f"({'matches' if failed == expected else 'DOES NOT match'} the missing objects)")
+    print(f"batch ({args.workers} workers): {batch_wall:.2f}s, one record per invocation: {single_wall:.2f}s")
+    return 0 if failed == expected else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+"""
+Import-time benchmark for the extract Lambda cold start.
+
+    python -m benchmarks.cold_start --runs 10
+
+Each measurement runs in a fresh interpreter. "lazy" is what a cold start
+costs now (import lambda_function, then the extractor dependencies only when
+an invocation needs them); "eager" is the old import-time work of loading
+every heavy dependency and creating the boto3 clients up front.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    "lazy: import lambda_function": "import lambda_function",
+    "lazy: + get_s3_path failure": (
+        "import lambda_function\n"
+        "try:\n"
+        "    lambda_function.lambda_handler({}, None)\n"
+        "except ValueError:\n"
+        "    pass"
+    ),
+    "eager: heavy imports + boto3 clients": (
+        "import boto3\n"
+        "boto3.client('s3'); boto3.client('lambda'); boto3.client('secretsmanager')\n"
+        "import llama_cloud_services, llama_cloud, pdfplumber\n"
+        "import schemas.registry, extract.app"
+    ),
+}
+
+
+def time_snippet(code: str, runs: int) -> list[float]:
+    timer = (
+        "import time\n"
+        "_t = time.perf_counter()\n"
+        f"{code}\n"
+        "print(time.perf_counter() - _t)"
+    )
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", timer],
+            cwd=LAMBDA_ROOT, env=env, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip().splitlines()[-1])
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    medians = {}
+    for label, code in SNIPPETS.items():
+        try:
+            samples = time_snippet(code, args.runs)
+        except RuntimeError as e:
+            print(f"{label:<40} unavailable ({e})")
+            continue
+        medians[label] = statistics.median(samples)
+        print(f"{label:<40} median {medians[label] * 1000:8.1f} ms  (min {min(samples) * 1000:.1f} ms)")
+
+    eager = medians.get("eager: heavy imports + boto3 clients")
+    lazy = medians.get("lazy: + get_s3_path failure")
+    if eager is not None and lazy is not None:
+        print(f"\nInvocations rejected by get_s3_path save ~{(eager - lazy) * 1000:.1f} ms of cold start")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,182 @@
+"""
+Local stand-in for the LlamaExtract API that throttles like the real one.
+
+    python -m benchmarks.fake_llama --calls 200 --threads 24 --capacity 6 --rate 8
+
+The server accepts up to --capacity concurrent requests and --rate requests
+per second; anything beyond that gets a 429 with Retry-After. Accepted
+requests take --latency seconds (plus jitter). The same workload runs once
+with retries only and once through AdaptiveLimiter, and the report compares
+429s, throughput and where the limiter settled.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeApiError(Exception):
+    def __init__(self, status_code: int, retry_after: float = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FakeLlamaServer:
+    def __init__(self, capacity: int = 6, rate: float = 8.0, latency: float = 0.2, jitter: float = 0.3,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.capacity = capacity
+        self.rate = rate
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._tokens = float(capacity)
+        self._refilled = time.monotonic()
+        self.stats = {"accepted": 0, "throttled": 0, "errors": 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/extract"
+
+    def _admit(self) -> tuple[int, float]:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._in_flight >= self.capacity or self._tokens < 1:
+                self.stats["throttled"] += 1
+                return 429, 0.0
+            if self._random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 503, 0.0
+            self._tokens -= 1
+            self._in_flight += 1
+            self.stats["accepted"] += 1
+            return 200, self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, latency = server._admit()
+                if status == 200:
+                    time.sleep(latency)
+                    with server._lock:
+                        server._in_flight -= 1
+                body = json.dumps({"data": {}} if status == 200 else {"detail": "Too Many Requests"}).encode()
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0.5")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+
+class HttpExtractClient:
+    """extract(schema, config, files) against a FakeLlamaServer."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def extract(self, schema, config, files):
+        request = urllib.request.Request(self.url, data=json.dumps({"schema": schema.__name__}).encode(), method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise FakeApiError(e.code, float(e.headers.get("Retry-After") or 0) or None) from None
+
+
+def run(args, limited: bool) -> dict:
+    from extract.limiter import AdaptiveLimiter, LimitedClient
+    from extract.resilience import ResilienceConfig, ResilientClient
+
+    class Schema:
+        pass
+
+    with FakeLlamaServer(args.capacity, args.rate, args.latency, error_rate=args.error_rate) as server:
+        client = HttpExtractClient(server.url)
+        limiter = None
+        if limited:
+            limiter = AdaptiveLimiter(concurrency=2, rate=2.0, latency_target=args.latency * 4)
+            client = LimitedClient(client, limiter)
+        client = ResilientClient(client, ResilienceConfig(
+            deadline=120, max_attempts=args.attempts, base_delay=0.1, max_delay=2.0, hedge=False
+        ), seed=0)
+
+        def one(_):
+            try:
+                client.extract(Schema, None, None)
+                return True
+            except Exception:
+                return False
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            ok = sum(pool.map(one, range(args.calls)))
+        wall = time.perf_counter() - started
+
+    report = {
+        "mode": "adaptive limiter" if limited else "retries only",
+        "succeeded": ok,
+        "failed": args.calls - ok,
+        "server_429s": server.stats["throttled"],
+        "retries": client.stats["retries"],
+        "calls_per_second": round(ok / wall, 2),
+    }
+    if limiter is not None:
+        report.update(
+            final_concurrency=round(limiter.limit, 2),
+            final_rate=round(limiter.rate, 2),
+            mean_wait_seconds=round(limiter.stats["wait_seconds"] / max(1, limiter.stats["acquired"]), 3),
+        )
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=24, help="Concurrent callers")
+    parser.add_argument("--capacity", type=int, default=6, help="Server concurrency before 429s")
+    parser.add_argument("--rate", type=float, default=8.0, help="Server requests per second before 429s")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--attempts", type=int, default=6, help="Retry attempts per call")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    reports = [run(args, limited=False), run(args, limited=True)]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print(", ".join(f"{k}={v}" for k, v in report.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+"""
+Offline throughput benchmark for the extract pipeline.
+
+    python -m benchmarks.pipeline --documents 60 --workers 8 --latency 2.0
+    python -m benchmarks.pipeline --samples ./pdfs --cassettes ./cassettes --latency recorded
+
+LlamaExtract is replaced by ReplayExtractor: recorded cassettes when
+--cassettes is given, schema-shaped placeholders otherwise. Every mode runs
+in its own interpreter so peak RSS is measured per mode.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LAMBDA_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_documents(samples_dir):
+    if samples_dir:
+        documents = {}
+        for name in sorted(os.listdir(samples_dir)):
+            if name.lower().endswith(".pdf"):
+                with open(os.path.join(samples_dir, name), "rb") as f:
+                    documents[name] = f.read()
+        return documents
+    from benchmarks.samples import sample_agreements
+    return {f"{title}.pdf": data for title, data in sample_agreements().items()}
+
+
+def run_mode(args) -> dict:
+    from backfill import percentile
+    from extract import metrics
+    from extract.app import LLMExtractor
+    from extract.document import PdfDocument
+    from extract.local import LocalExtractor
+    from extract.replay import ReplayExtractor
+    from extract.title import TitleClassifier
+    from schemas.enums import DocumentTitle
+    from schemas.layouts import LAYOUT_TEMPLATES
+    from schemas.registry import EXTRACTION_PLANS, POST_PROCESSING_PLAN
+
+    metrics.ENABLED = True
+    latency = args.latency if args.latency == "recorded" else float(args.latency)
+    extractor = LLMExtractor(
+        api_key="",
+        extraction_plans=EXTRACTION_PLANS,
+        post_processing_plan=POST_PROCESSING_PLAN,
+        max_workers=args.step_workers,
+        title_classifier=TitleClassifier([*EXTRACTION_PLANS, *(t.value for t in DocumentTitle)]),
+        local_extractor=LocalExtractor(LAYOUT_TEMPLATES) if args.local else None,
+        client=ReplayExtractor(
+            args.cassettes, latency=latency, jitter=args.jitter, synthesize_missing=not args.cassettes
+        ),
+    )
+    samples = list(_load_documents(args.samples).items())
+    documents = [samples[i % len(samples)] for i in range(args.documents)]
+
+    def one(item):
+        name, data = item
+        start = time.perf_counter()
+        with metrics.invocation(flush=False) as recorder:
+            extractor.extract(PdfDocument(data=data, name=name))
+        timings = {n: v for n, v in recorder.values.items() if recorder.units[n] == "Milliseconds"}
+        return time.perf_counter() - start, timings
+
+    # Keep the benchmark output to the summary
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.run_mode) as pool:
+            results = list(pool.map(one, documents))
+        wall = time.perf_counter() - started
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+    stages: dict = {}
+    for _, values in results:
+        for name, value in values.items():
+            stages.setdefault(name, []).append(value)
+    latencies = [elapsed for elapsed, _ in results]
+    return {
+        "workers": args.run_mode,
+        "documents": len(results),
+        "docs_per_second": round(len(results) / wall, 3),
+        "p50_seconds": round(statistics.median(latencies), 3),
+        "p95_seconds": round(percentile(latencies, 95), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages_ms": {
+            name: {"p50": round(statistics.median(v), 2), "p95": round(percentile(v, 95), 2)}
+            for name, v in sorted(stages.items())
+        },
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=8, help="Documents in flight for the concurrent run")
+    parser.add_argument("--step-workers", type=int, default=4, help="LLMExtractor max_workers")
+    parser.add_argument("--latency", default="1.0", help='Simulated seconds per LlamaExtract call, or "recorded"')
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--samples", help="Directory of PDFs to use instead of generated samples")
+    parser.add_argument("--cassettes", help="Replay recorded cassettes from this directory")
+    parser.add_argument("--no-local", dest="local", action="store_false", help="Disable the local extraction tier")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    parser.add_argument("--run-mode", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args)))
+        return 0
+
+    passthrough = [a for a in (argv if argv is not None else sys.argv[1:]) if a != "--json"]
+    reports = []
+    for workers in (1, args.workers):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.pipeline", *passthrough, "--run-mode", str(workers)],
+            cwd=LAMBDA_ROOT, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            return out.returncode
+        reports.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+
+    for report in reports:
+        label = "sequential" if report["workers"] == 1 else f"concurrent ({report['workers']} workers)"
+        print(f"{label}: {report['docs_per_second']} docs/s, p50 {report['p50_seconds']}s, "
+              f"p95 {report['p95_seconds']}s, peak RSS {report['peak_rss_mb']} MB")
+        for name, stats in report["stages_ms"].items():
+            print(f"    {name:<40} p50 {stats['p50']:>10} p95 {stats['p95']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+"""
+Synthetic agreement PDFs for offline benchmarks. They carry a real text layer
+with the title and the labels from schemas/layouts.py, so title detection,
+page slicing and the local extraction tier all do real work.
+"""
+from schemas.enums import DocumentTitle
+from schemas.registry import EXTRACTION_PLANS
+
+FIRST_PAGE_LINES = [
+    "First Name: Sample",
+    "Last Name: Student",
+    "Parent/Guardian Name: Sample Parent",
+    "Email: parent@example.com",
+    "Campus: Sample Campus",
+    "Courses: Algebra I",
+    "Current Grade: 9",
+    "Total Tuition: $1,200.00",
+    "One-to-One Sessions: 12",
+    "Homework Studio Sessions: 0",
+    "Total Sessions Purchased: 12",
+    "Total Amount: $1,200.00",
+    "Scheduled Start Date: 09/01/25",
+    "Document ID: SAMPLE-0001",
+]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: list[list[str]]) -> bytes:
+    """A minimal PDF with one Helvetica text line per entry on each page."""
+    objects = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(pages)} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_id, lines in zip(page_ids, pages):
+        stream = ["BT", "/F1 11 Tf", "14 TL", "72 740 Td"]
+        stream += [f"({_escape(line)}) Tj T*" for line in lines]
+        stream.append("ET")
+        content = "\n".join(stream)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content.encode('latin-1'))} >>\nstream\n{content}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def sample_agreement(title: str) -> bytes:
+    page_count = max(int(step.page_range.split("-")[-1]) for step in EXTRACTION_PLANS[title])
+    pages = [[title, *FIRST_PAGE_LINES]]
+    for number in range(2, page_count + 1):
+        pages.append([f"{title} - page {number}", "Payment Schedule", "Single Payment: $1,200.00"])
+    return make_pdf(pages)
+
+
+def sample_agreements() -> dict[str, bytes]:
+    titles = [t.value for t in DocumentTitle if t.value in EXTRACTION_PLANS]
+    return {title: sample_agreement(title) for title in titles}
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the per-call setup SchemaRegistry removes.
+
+    python -m benchmarks.schema_registry --iterations 2000 --rtt 0.15
+
+Measures, per extraction call: serialising the step schema and copying the
+ExtractConfig (what every call did before) against the registry and config
+cache lookups, and a cold registry built from scratch against one loaded
+from a baked manifest. --rtt adds the schema-validation round trip that
+stateless extract() makes on every call and an agent makes once per
+container.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _per_call(fn, iterations: int) -> float:
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - start) / iterations)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rtt", type=float, default=0.15, help="Seconds per schema validation round trip")
+    parser.add_argument("--documents", type=int, default=1000, help="Documents per container for the RTT estimate")
+    args = parser.parse_args(argv)
+
+    from extract.agents import SchemaRegistry, agreement_models
+    from extract.app import LLMExtractor
+    from extract.replay import ReplayExtractor
+    from schemas.registry import EXTRACTION_PLANS, POST_PROCESSING_PLAN
+
+    steps = [step for plan in EXTRACTION_PLANS.values() for step in plan]
+    extractor = LLMExtractor("", EXTRACTION_PLANS, POST_PROCESSING_PLAN, client=ReplayExtractor(None))
+    registry = SchemaRegistry()
+    registry.precompute(agreement_models())
+
+    def before():
+        for step in steps:
+            step.schema.model_json_schema()
+            extractor.extract_config.copy(update={"page_range": step.page_range})
+
+    def after():
+        for step in steps:
+            registry.json_schema(step.schema)
+            extractor._config(step.page_range, "default", None)
+
+    before_s = _per_call(before, args.iterations) / len(steps)
+    after_s = _per_call(after, args.iterations) / len(steps)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = os.path.join(tmp, "registry.json")
+        registry.save(manifest)
+        models = agreement_models()
+
+        def cold_build():
+            SchemaRegistry().precompute(models)
+
+        def cold_load():
+            SchemaRegistry(seed_path=manifest).precompute(models)
+
+        build_s = _per_call(cold_build, max(1, args.iterations // 100))
+        load_s = _per_call(cold_load, max(1, args.iterations // 100))
+
+    calls = args.documents * len(steps) / len(EXTRACTION_PLANS)
+    print(f"per call setup: {before_s * 1e6:.1f} us before, {after_s * 1e6:.2f} us with the registry "
+          f"({before_s / after_s:.0f}x)")
+    print(f"cold registry ({len(models)} schemas): {build_s * 1000:.2f} ms generated, {load_s * 1000:.2f} ms from manifest")
+    print(f"schema validation at {args.rtt}s RTT over {args.documents} documents (~{calls:.0f} calls): "
+          f"{calls * args.rtt:.0f}s stateless vs {len(steps) * args.rtt:.1f}s with one agent per step")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
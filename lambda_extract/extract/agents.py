@@ -0,0 +1,216 @@
+"""
+Schema and agent registry for LlamaExtract.
+
+A stateless extract() call serialises the pydantic model and has the API
+validate the schema again on every document. The registry does the
+serialisation once per schema and, with agents enabled, creates one
+LlamaExtract agent per (schema hash, config). Later calls go straight to
+agent.extract(files) without another validation round trip.
+
+Everything is recorded in a JSON manifest:
+
+    {"source_hash": ..., "schemas": {module:Name: {"hash": ..., "json_schema": ...}},
+     "agents": {agent_key: {"id": ..., "name": ...}}}
+
+The Docker build writes one next to the code (python -m extract.agents
+--manifest extract_registry.json), so cold containers load the JSON schemas
+instead of generating them. Agents are created (or found by their
+deterministic name) on first use and their ids go to the writable manifest
+in /tmp for the rest of the container's life. Schemas are only
+trusted while the schemas package source hash matches.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schemas")
+
+
+def source_hash(directory: str = SCHEMAS_DIR) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            digest.update(name.encode("utf-8"))
+            with open(os.path.join(directory, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _schema_id(schema) -> str:
+    return f"{schema.__module__}:{schema.__qualname__}"
+
+
+def _json_hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def agreement_models() -> list:
+    """Every model declared in schemas/agreements.py."""
+    from schemas import agreements
+    return [
+        value for value in vars(agreements).values()
+        if isinstance(value, type) and issubclass(value, BaseModel) and value.__module__ == agreements.__name__
+    ]
+
+
+class SchemaRegistry:
+    def __init__(self, manifest_path: Optional[str] = None, seed_path: Optional[str] = None):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._source_hash = source_hash()
+        self._schemas: dict[str, dict] = {}
+        self._agents: dict[str, dict] = {}
+        # Runtime-only: entries per model class, live agents and config keys per config object
+        self._by_model: dict = {}
+        self._live_agents: dict[str, Any] = {}
+        self._config_keys: dict[int, tuple] = {}
+        for path in (seed_path, manifest_path):
+            self._load(path)
+
+    def _load(self, path: Optional[str]) -> None:
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable registry manifest {path}: {e!r}")
+            return
+        if manifest.get("source_hash") != self._source_hash:
+            print(f"Registry manifest {path} is for another schemas version, ignoring it")
+            return
+        self._schemas.update(manifest.get("schemas", {}))
+        self._agents.update(manifest.get("agents", {}))
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.manifest_path
+        if not path:
+            return
+        with self._lock:
+            manifest = {"source_hash": self._source_hash, "schemas": dict(self._schemas), "agents": dict(self._agents)}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, sort_keys=True)
+        os.replace(tmp, path)
+
+    def entry(self, schema) -> dict:
+        entry = self._by_model.get(schema)
+        if entry is not None:
+            return entry
+        schema_id = _schema_id(schema)
+        # Only models declared in schemas/ have stable names; partial and composite
+        # models built at runtime reuse names across field sets and stay in memory
+        declared = schema.__module__.startswith("schemas.")
+        entry = self._schemas.get(schema_id) if declared else None
+        if entry is None:
+            json_schema = schema.model_json_schema()
+            entry = {"hash": _json_hash(json_schema), "json_schema": json_schema}
+        with self._lock:
+            if declared:
+                self._schemas[schema_id] = entry
+            self._by_model[schema] = entry
+        return entry
+
+    def json_schema(self, schema) -> dict:
+        return self.entry(schema)["json_schema"]
+
+    def precompute(self, schemas) -> int:
+        for schema in schemas:
+            self.entry(schema)
+        return len(self._schemas)
+
+    def config_key(self, config) -> str:
+        cached = self._config_keys.get(id(config))
+        # Holding the config keeps its id from being reused while cached
+        if cached is not None and cached[0] is config:
+            return cached[1]
+        key = _json_hash(config.dict())
+        self._config_keys[id(config)] = (config, key)
+        return key
+
+    def agent_key(self, schema, config) -> str:
+        return hashlib.sha256(f"{self.entry(schema)['hash']}|{self.config_key(config)}".encode("utf-8")).hexdigest()
+
+    def agent(self, client: Any, schema, config) -> Any:
+        key = self.agent_key(schema, config)
+        agent = self._live_agents.get(key)
+        if agent is not None:
+            return agent
+        with self._lock:
+            agent = self._live_agents.get(key)
+            if agent is not None:
+                return agent
+            from llama_cloud.core.api_error import ApiError
+
+            name = f"brightmont-{schema.__name__}-{key[:16]}"
+            known = self._agents.get(key)
+            agent = None
+            # Only a 404 means the agent is missing; auth, 5xx and network errors must not create a duplicate
+            if known is not None:
+                try:
+                    agent = client.get_agent(id=known["id"])
+                except ApiError as e:
+                    if e.status_code != 404:
+                        raise
+                    print(f"Registered agent {known['name']} is gone, recreating: {e!r}")
+            if agent is None:
+                try:
+                    agent = client.get_agent(name=name)
+                except ApiError as e:
+                    if e.status_code != 404:
+                        raise
+                    agent = client.create_agent(name=name, data_schema=self.json_schema(schema), config=config)
+                    print(f"Created extraction agent {name}")
+            self._agents[key] = {"id": agent.id, "name": name}
+            self._live_agents[key] = agent
+        self.save()
+        return agent
+
+
+class RegistryClient:
+    """
+    Wraps the LlamaExtract client itself (inside any replay, limiter or retry
+    wrappers): passes precomputed JSON schemas, or runs through a per-schema
+    agent when use_agents is set.
+    """
+
+    def __init__(self, inner: Any, registry: SchemaRegistry, use_agents: bool = False):
+        self.inner = inner
+        self.registry = registry
+        self.use_agents = use_agents
+
+    def extract(self, schema, config, files):
+        if self.use_agents:
+            return self.registry.agent(self.inner, schema, config).extract(files)
+        return self.inner.extract(self.registry.json_schema(schema), config, files)
+
+
+def registry_from_env() -> SchemaRegistry:
+    """EXTRACT_REGISTRY_MANIFEST is the writable manifest, EXTRACT_REGISTRY_SEED the one baked into the image."""
+    root = os.getenv("LAMBDA_TASK_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return SchemaRegistry(
+        manifest_path=os.getenv("EXTRACT_REGISTRY_MANIFEST", "/tmp/extract_registry.json"),
+        seed_path=os.getenv("EXTRACT_REGISTRY_SEED", os.path.join(root, "extract_registry.json")),
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Write a registry manifest for the schemas in this tree")
+    parser.add_argument("--manifest", required=True)
+    args = parser.parse_args(argv)
+
+    from schemas.registry import EXTRACTION_PLANS
+    registry = SchemaRegistry()
+    count = registry.precompute([*agreement_models(), *(s.schema for plan in EXTRACTION_PLANS.values() for s in plan)])
+    registry.save(args.manifest)
+    print(f"Wrote {count} schemas to {args.manifest}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,24 @@
 from llama_cloud_services import LlamaExtract # pip install llama_cloud_services
+from llama_cloud_services.extract import SourceText
 from llama_cloud import ExtractConfig, ExtractMode, PublicModelName
-from typing import Any
-import pdfplumber
+from typing import Any, Optional, Union
+from dataclasses import dataclass, field
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import contextvars
+import time
+
+from . import metrics
+from .agents import RegistryClient, SchemaRegistry
+from .cache import CacheBackend, step_cache_key
+from .cascade import Cascade, Tier, business_check, checkbox_fields
+from .document import PageRangeError, PdfDocument, parse_page_range
+from .limiter import AdaptiveLimiter, LimitedClient
+from .local import LocalExtractor, partial_schema, split_valid_fields
+from .planner import FusionPolicy, compile_plans
+from .preflight import DIGITAL, DocumentProfile, TextLayerAnalyzer
+from .resilience import ResilienceConfig, ResilientClient
+from .title import Segment, TitleClassifier, UnknownDocumentTitle
 
 """
 @dataclass(frozen=True)
@@ -11,13 +28,83 @@ class ExtractionStep:
 """
 
 
+class ExtractionError(Exception):
+    def __init__(self, title: str, step_results: list):
+        self.title = title
+        self.step_results = step_results
+        errors = "; ".join(r.describe() for r in step_results if r.error)
+        super().__init__(f"Extraction failed for '{title}': {errors}")
+
+
+@dataclass
+class StepResult:
+    index: int
+    step: Any
+    data: Optional[dict] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    # Fields accepted from a cheaper cascade tier, open to escalation by the document-level checks
+    cheap_fields: set = field(default_factory=set)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def describe(self) -> str:
+        return f"step {self.index} ({self.step.schema.__name__}, pages {self.step.page_range}): {self.error}"
+
+    def as_dict(self) -> dict:
+        return {
+            "step": self.index,
+            "schema": self.step.schema.__name__,
+            "page_range": self.step.page_range,
+            "error": self.error,
+        }
+
+
+@dataclass
+class SegmentResult:
+    segment: Segment
+    agreement: Optional[dict] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
 class LLMExtractor:
     def __init__(self,
                  api_key: str,
                  extraction_plans,
                  post_processing_plan,
+                 max_workers: int = 4,
+                 step_timeout: Optional[float] = 240.0,
+                 cache: Optional[CacheBackend] = None,
+                 title_classifier: Optional[TitleClassifier] = None,
+                 local_extractor: Optional[LocalExtractor] = None,
+                 slice_pages: bool = True,
+                 client: Any = None,
+                 fusion_policy: Optional[FusionPolicy] = None,
+                 resilience: Optional[ResilienceConfig] = None,
+                 limiter: Optional[AdaptiveLimiter] = None,
+                 preflight: Optional[TextLayerAnalyzer] = None,
+                 cascade: Optional[Cascade] = None,
+                 registry: Optional[SchemaRegistry] = None,
+                 use_agents: bool = False,
     ):
-        self.extractor = LlamaExtract(api_key=api_key)
+        # client: anything with LlamaExtract's extract(schema, config, files), e.g. extract.replay
+        if client is not None:
+            self.extractor = client
+        else:
+            self.extractor = LlamaExtract(api_key=api_key)
+            if registry is not None:
+                self.extractor = RegistryClient(self.extractor, registry, use_agents)
+        # The limiter sits inside the retries so every attempt and hedge is counted
+        if limiter is not None:
+            self.extractor = LimitedClient(self.extractor, limiter)
+        if resilience is not None:
+            self.extractor = ResilientClient(self.extractor, resilience)
         self.extract_config = ExtractConfig(
             extraction_mode=ExtractMode.PREMIUM,
             # extraction_mode=ExtractMode.PREMIUM, # Must use for checkbox
@@ -34,41 +121,353 @@ class LLMExtractor:
             use_reasoning=True,
             # confidence_scores=True,
         )
-        self.extraction_plans = extraction_plans
+        # Overrides of extract_config per text-layer kind, used when preflight is set.
+        # Scanned and mixed pages keep the full high-resolution config.
+        self.config_profiles = {
+            DIGITAL: {"high_resolution_mode": False},
+        }
+        self.preflight = preflight
+        self.cascade = cascade
+        # ExtractConfigs per (profile, tier, page range), reused across documents
+        self._configs: dict[tuple, ExtractConfig] = {}
+        self.extraction_plans = compile_plans(extraction_plans, fusion_policy)
         self.post_processing_plan = post_processing_plan
+        self.max_workers = max(1, max_workers)
+        self.step_timeout = step_timeout
+        self.cache = cache
+        self.title_classifier = title_classifier or TitleClassifier(extraction_plans)
+        self.local_extractor = local_extractor
+        self.slice_pages = slice_pages
 
     # def _resolve_schema(self, title):
         # return titles[title]
 
-    def _get_title(self, local_file_name: str) -> str:
-        with pdfplumber.open(local_file_name) as pdf:
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-        # lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-        # return lines[0] if lines else ""
-        return text.splitlines()[0]
+    @metrics.timed("title_detection")
+    def _get_title(self, document: PdfDocument) -> str:
+        match = self.title_classifier.classify(document.source())
+        print(f"Title match: {match.title} (confidence {match.confidence})")
+        metrics.count("pages", match.page_count)
+        return match.title
 
     def _resolve_plan(self, title):
-        return self.extraction_plans[title]
+        plan = self.extraction_plans.get(title)
+        if plan is None:
+            raise UnknownDocumentTitle(f"No extraction plan for '{title}'")
+        return plan
+
+    def _upload_source(self, document: PdfDocument, page_range: str) -> tuple[PdfDocument, str]:
+        """The document to upload and the page range to request from it."""
+        if not self.slice_pages:
+            return document, page_range
+        try:
+            sliced = document.slice(page_range)
+        except PageRangeError:
+            # Uploading the whole document would extract from the wrong pages
+            raise
+        except Exception as e:
+            print(f"Page slicing failed, uploading the full document: {e!r}")
+            metrics.count("slicing_fallbacks")
+            return document, page_range
+        if sliced is document:
+            return document, page_range
+        return sliced, f"1-{sliced.page_count}"
+
+    def _analyse(self, document: PdfDocument, plan) -> Optional[DocumentProfile]:
+        if self.preflight is None:
+            return None
+        start = time.monotonic()
+        pages = set()
+        for step in plan:
+            pages |= parse_page_range(step.page_range)
+        try:
+            with metrics.timed("preflight"):
+                profile = self.preflight.analyse(document.source(), pages)
+        except Exception as e:
+            print(f"Preflight failed, using the full config: {e!r}")
+            return None
+        profile.elapsed = time.monotonic() - start
+        metrics.put_property("TextLayer", profile.kind)
+        print(f"Text layer: {profile.kind} ({profile.summary()}) in {profile.elapsed * 1000:.0f} ms")
+        return profile
+
+    def _profile_name(self, page_range: str, profile: Optional[DocumentProfile]) -> str:
+        if profile is None:
+            return "default"
+        kind = profile.kind_for(parse_page_range(page_range))
+        return kind if self.config_profiles.get(kind) else "default"
+
+    def _config(self, page_range: str, profile_name: str, tier: Optional[Tier]) -> ExtractConfig:
+        key = (profile_name, tier.name if tier is not None else None, page_range)
+        config = self._configs.get(key)
+        if config is None:
+            update = dict(self.config_profiles.get(profile_name, {}))
+            if tier is not None:
+                update |= tier.overrides
+            update["page_range"] = page_range
+            config = self._configs.setdefault(key, self.extract_config.copy(update=update))
+        return config
+
+    def _llm_step(self, schema, page_range: str, document: PdfDocument,
+                  profile: Optional[DocumentProfile] = None, tier: Optional[Tier] = None) -> dict:
+        profile_name = self._profile_name(page_range, profile)
+        config = self._config(page_range, profile_name, tier)
+
+        key = None
+        if self.cache is not None:
+            # Keyed on the original document and range, not on the slice
+            key = step_cache_key(document.sha256, schema, page_range, config)
+            try:
+                cached = self.cache.get(key)
+            except Exception as e:
+                # The cache only saves calls; a broken one must not fail the step
+                print(f"Cache read failed, treating as a miss: {e!r}")
+                metrics.count("cache_errors")
+                cached = None
+            if cached is not None:
+                print(f"Cache hit: {schema.__name__} ({page_range})")
+                metrics.count("cache_hits")
+                return cached
+            metrics.count("cache_misses")
+
+        with metrics.timed("page_slicing"):
+            source, source_range = self._upload_source(document, page_range)
+        if source is not document:
+            config = self._config(source_range, profile_name, tier)
+        start = time.monotonic()
+        tier_timer = metrics.timed(f"llm_tier_{tier.name}") if tier is not None else nullcontext()
+        with metrics.timed(f"llm_{schema.__name__}"), metrics.timed(f"llm_profile_{profile_name}"), tier_timer:
+            res = self.extractor.extract(schema, config, self._extract_input(source))
+        metrics.count("llm_calls")
+        metrics.count("bytes_uploaded", source.size, "Bytes")
+        metrics.count("bytes_saved_by_slicing", document.size - source.size, "Bytes")
+        print(f"LlamaExtract {schema.__name__} ({page_range}, {profile_name} config): {source.size} bytes uploaded "
+              f"({document.size - source.size} saved by slicing) in {time.monotonic() - start:.2f}s")
 
-    def extract(self, local_file_name: str) -> Any:
-        title = self._get_title(local_file_name)
+        if key is not None:
+            try:
+                self.cache.put(key, res.data)
+            except Exception as e:
+                print(f"Cache write failed, keeping the result uncached: {e!r}")
+                metrics.count("cache_errors")
+        return res.data
+
+    def _cascade_step(self, schema, page_range: str, document: PdfDocument,
+                      profile: Optional[DocumentProfile]) -> tuple[dict, set]:
+        """
+        Ask each tier only for the fields the cheaper tiers got wrong. Returns the
+        data and the fields accepted below the final tier.
+        """
+        cascade = self.cascade
+        fields = list(schema.model_fields)
+        checkboxes = checkbox_fields(schema)
+        pending = [f for f in fields if f not in checkboxes]
+        deferred = [f for f in fields if f in checkboxes]
+        cascade.stats.record_escalation("checkbox", len(deferred))
+        accepted: dict = {}
+        for tier in cascade.tiers:
+            if tier is cascade.final:
+                pending += deferred
+            if not pending:
+                continue
+            wanted = set(pending)
+            sub = schema if len(wanted) == len(fields) else partial_schema(schema, tuple(f for f in fields if f in wanted))
+            start = time.monotonic()
+            data = self._llm_step(sub, page_range, document, profile, tier)
+            if tier is cascade.final:
+                cascade.stats.record_call(tier.name, len(pending), len(pending), time.monotonic() - start)
+                accepted |= data
+                break
+            valid, missing = split_valid_fields(sub, data)
+            inconsistent = business_check(accepted | valid) & set(valid)
+            for name in inconsistent:
+                del valid[name]
+            cascade.stats.record_escalation("schema", len(missing))
+            cascade.stats.record_escalation("business", len(inconsistent))
+            cascade.stats.record_call(tier.name, len(pending), len(valid), time.monotonic() - start)
+            accepted |= valid
+            pending = [f for f in pending if f not in valid]
+        print(f"Cascade {schema.__name__} ({page_range}): {len(accepted) - len(pending)} of {len(fields)} "
+              f"fields from cheaper tiers")
+        return accepted, set(accepted) - set(pending)
+
+    def _llm_fields(self, schema, page_range: str, document: PdfDocument,
+                    profile: Optional[DocumentProfile]) -> tuple[dict, set]:
+        if self.cascade is None:
+            return self._llm_step(schema, page_range, document, profile), set()
+        return self._cascade_step(schema, page_range, document, profile)
+
+    def _run_step(self, step, document: PdfDocument, title: str,
+                  profile: Optional[DocumentProfile] = None) -> tuple[dict, set]:
+        if self.local_extractor is None:
+            return self._llm_fields(step.schema, step.page_range, document, profile)
+
+        try:
+            with metrics.timed("local_extract"):
+                local = self.local_extractor.extract(title, step, document)
+        except Exception as e:
+            print(f"Local extraction failed for {step.schema.__name__}: {e!r}")
+            local = {}
+        # is_checked only sees text glyphs, so a drawn box reads as unchecked; leave these to the LLM
+        checkboxes = checkbox_fields(step.schema)
+        local = {name: value for name, value in local.items() if name not in checkboxes}
+        valid, missing = split_valid_fields(step.schema, local)
+        print(f"Local tier {step.schema.__name__} ({step.page_range}): "
+              f"{len(valid)} fields, {len(missing)} left for LLM")
+        metrics.count("local_fields", len(valid))
+        metrics.count("llm_fields", len(missing))
+        if not missing:
+            return valid, set()
+
+        # Only ask the LLM for what the layout template could not fill
+        schema = step.schema if not valid else partial_schema(step.schema, tuple(missing))
+        data, cheap_fields = self._llm_fields(schema, step.page_range, document, profile)
+        return valid | data, cheap_fields
+
+    @staticmethod
+    def _extract_input(document: PdfDocument):
+        if document.in_memory:
+            return SourceText(file=document.data, filename=document.name)
+        return document.path
+
+    def _timed_step(self, index: int, step, document: PdfDocument, title: str,
+                    profile: Optional[DocumentProfile] = None) -> StepResult:
+        start = time.monotonic()
+        try:
+            data, cheap_fields = self._run_step(step, document, title, profile)
+            return StepResult(index, step, data=data, elapsed=time.monotonic() - start, cheap_fields=cheap_fields)
+        except Exception as e:
+            return StepResult(index, step, error=repr(e), elapsed=time.monotonic() - start)
+
+    def _run_plan(self, plan, document: PdfDocument, title: str,
+                  profile: Optional[DocumentProfile] = None) -> list[StepResult]:
+        """
+        Run every step of a plan on a bounded thread pool.
+        Results come back in plan order regardless of completion order.
+        """
+        workers = min(self.max_workers, len(plan))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract-step")
+        started = time.monotonic()
+        try:
+            # Each step runs in a copy of the caller's context so its timings
+            # land in the current invocation's metrics
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._timed_step, i, step, document, title, profile)
+                for i, step in enumerate(plan)
+            ]
+            results = []
+            for i, (step, future) in enumerate(zip(plan, futures)):
+                timeout = None
+                if self.step_timeout is not None:
+                    # Steps queued behind a full pool get one extra timeout per wave
+                    deadline = started + self.step_timeout * (i // workers + 1)
+                    timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    results.append(future.result(timeout=timeout))
+                except FutureTimeoutError:
+                    future.cancel()
+                    results.append(StepResult(
+                        i, step,
+                        error=f"timed out after {self.step_timeout}s",
+                        elapsed=time.monotonic() - started,
+                    ))
+            return results
+        finally:
+            # Do not block on a stuck call; its thread finishes in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _escalate_inconsistent(self, agreement: dict, results: list[StepResult], document: PdfDocument,
+                               profile: Optional[DocumentProfile]) -> dict:
+        """Checks that span steps (services on page 1 vs payment on page 2); re-asks the final tier."""
+        failing = business_check(agreement)
+        final = self.cascade.final
+        for r in results:
+            fields = failing & r.cheap_fields
+            if not r.ok or not fields:
+                continue
+            self.cascade.stats.record_escalation("business", len(fields))
+            schema = partial_schema(r.step.schema, tuple(f for f in r.step.schema.model_fields if f in fields))
+            start = time.monotonic()
+            agreement |= self._llm_step(schema, r.step.page_range, document, profile, final)
+            self.cascade.stats.record_call(final.name, len(fields), len(fields), time.monotonic() - start)
+        return agreement
+
+    def segment(self, document: PdfDocument) -> list[Segment]:
+        # A title repeated inside its own plan's page span is a running header
+        min_pages = {
+            title: max(max(parse_page_range(step.page_range)) for step in plan)
+            for title, plan in self.extraction_plans.items()
+        }
+        with metrics.timed("segmentation"):
+            segments = self.title_classifier.segment(document.source(), min_pages)
+        metrics.count("segments", len(segments))
+        return segments
+
+    def extract_bundle(self, document: Union[str, PdfDocument]) -> list[SegmentResult]:
+        """
+        Extract every agreement in a PDF that may hold several (a scanned
+        stack). Segments run in parallel; one failing does not stop the others.
+        """
+        if isinstance(document, str):
+            document = PdfDocument(path=document)
+        segments = self.segment(document)
+        print(f"Found {len(segments)} agreement(s): "
+              + ", ".join(f"{s.title} ({s.page_range})" for s in segments))
+
+        def run(segment: Segment) -> SegmentResult:
+            try:
+                return SegmentResult(segment, agreement=self._extract_titled(document.slice(segment.page_range),
+                                                                             segment.title))
+            except Exception as e:
+                print(f"Segment {segment.page_range} ({segment.title}) failed: {e!r}")
+                return SegmentResult(segment, error=e)
+
+        if len(segments) == 1:
+            return [run(segments[0])]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(segments)),
+                                thread_name_prefix="extract-segment") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, run, s) for s in segments]
+            results = [f.result() for f in futures]
+        metrics.set_dimension("DocumentTitle", "bundle")
+        return results
+
+    def extract(self, document: Union[str, PdfDocument]) -> Any:
+        if isinstance(document, str):
+            document = PdfDocument(path=document)
+        return self._extract_titled(document, self._get_title(document))
+
+    def _extract_titled(self, document: PdfDocument, title: str) -> Any:
         plan = self._resolve_plan(title)
+        metrics.set_dimension("DocumentTitle", title)
+        metrics.count("pdf_bytes", document.size, "Bytes")
+
+        profile = self._analyse(document, plan)
+        results = self._run_plan(plan, document, title, profile)
+        for r in results:
+            print(f"Step {r.index} {r.step.schema.__name__} ({r.step.page_range}): "
+                  f"{'ok' if r.ok else 'FAILED'} in {r.elapsed:.2f}s")
 
+        failed = [r for r in results if not r.ok]
+        metrics.count("failed_steps", len(failed))
+        if len(failed) == len(results):
+            raise ExtractionError(title, results)
 
         agreement: dict = {}
-        for step in plan:
-            config = self.extract_config.copy(update={"page_range": step.page_range})
-            res = self.extractor.extract(step.schema, config, local_file_name)
-            agreement |= res.data
+        for r in results:
+            if r.ok:
+                agreement |= r.data
+        if self.cascade is not None:
+            agreement = self._escalate_inconsistent(agreement, results, document, profile)
+
+        if failed:
+            # Keep what the other pages produced but flag the record for review
+            agreement["is_valid"] = False
+            agreement["extraction_errors"] = [r.as_dict() for r in failed]
+            return agreement
 
         post_processing_plan_fn = self.post_processing_plan.get(title)
-        print(f"Title: {title}")
-        print(self.post_processing_plan)
-        print(f"Post processing plan fn: {post_processing_plan_fn}")
         if post_processing_plan_fn:
-            agreement = post_processing_plan_fn(agreement)
+            print(f"Post processing: {post_processing_plan_fn.__name__}")
+            with metrics.timed("post_processing"):
+                agreement = post_processing_plan_fn(agreement)
 
-        print(agreement)
         return agreement
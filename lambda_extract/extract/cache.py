@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+
+@lru_cache(maxsize=None)
+def schema_hash(schema: Any) -> str:
+    schema_json = json.dumps(schema.model_json_schema(), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(schema_json.encode("utf-8")).hexdigest()
+
+
+def config_hash(config: Any) -> str:
+    # page_range is part of the key on its own, keep it out of the config hash
+    fields = {k: v for k, v in config.dict().items() if k != "page_range"}
+    config_json = json.dumps(fields, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(config_json.encode("utf-8")).hexdigest()
+
+
+def step_cache_key(pdf_sha256: str, schema: Any, page_range: str, config: Any) -> str:
+    """
+    One entry per extraction step, so a schema change only invalidates the
+    steps that use that schema.
+    """
+    parts = (pdf_sha256, schema.__name__, schema_hash(schema), page_range, config_hash(config))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class CacheBackend:
+    def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def put(self, key: str, value: dict) -> None:
+        raise NotImplementedError
+
+
+class SqliteCache(CacheBackend):
+    def __init__(self,
+                 path: str = "/tmp/extract_cache.sqlite3",
+                 ttl_seconds: Optional[float] = 30 * 24 * 3600,
+                 max_bytes: Optional[int] = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extract_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM extract_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._db.execute("DELETE FROM extract_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE extract_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return json.loads(value)
+
+    def put(self, key: str, value: dict) -> None:
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO extract_cache (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self._db.execute("DELETE FROM extract_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_bytes is None:
+            return
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM extract_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Least recently used first
+        for key, size in self._db.execute(
+            "SELECT key, size FROM extract_cache ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM extract_cache WHERE key = ?", (key,))
+            total -= size
+
+
+class S3Cache(CacheBackend):
+    """
+    Entries live under s3://bucket/prefix/<key>.json. TTL is checked on read;
+    evict() trims the prefix to max_bytes and is meant for a scheduled job or
+    an S3 lifecycle rule on the prefix.
+
+    IAM: s3:GetObject and s3:PutObject on the prefix, plus s3:ListBucket on
+    the bucket. Without ListBucket S3 answers a missing key with 403 instead
+    of 404, and get() raises on every miss. evict() also needs s3:DeleteObject.
+    """
+
+    def __init__(self,
+                 s3_client: Any,
+                 bucket: str,
+                 prefix: str = "extract-cache/",
+                 ttl_seconds: Optional[float] = 30 * 24 * 3600,
+                 max_bytes: Optional[int] = None,
+    ):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.s3.exceptions.ClientError as e:
+            # Only a missing key is a miss. A 403 is raised: it means a missing grant,
+            # which would otherwise show up as nothing but a 0% hit rate
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        if self.ttl_seconds is not None:
+            age = time.time() - obj["LastModified"].timestamp()
+            if age > self.ttl_seconds:
+                return None
+        return json.loads(obj["Body"].read())
+
+    def put(self, key: str, value: dict) -> None:
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=json.dumps(value).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    def evict(self) -> int:
+        objects = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            objects.extend(page.get("Contents", []))
+
+        now = time.time()
+        expired = []
+        if self.ttl_seconds is not None:
+            expired = [o for o in objects if now - o["LastModified"].timestamp() > self.ttl_seconds]
+        live = sorted((o for o in objects if o not in expired), key=lambda o: o["LastModified"])
+
+        if self.max_bytes is not None:
+            total = sum(o["Size"] for o in live)
+            while live and total > self.max_bytes:
+                oldest = live.pop(0)
+                expired.append(oldest)
+                total -= oldest["Size"]
+
+        for i in range(0, len(expired), 1000):
+            batch = expired[i:i + 1000]
+            self.s3.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": o["Key"]} for o in batch], "Quiet": True},
+            )
+        return len(expired)
+
+
+def cache_from_env(s3_client: Any = None) -> Optional[CacheBackend]:
+    """
+    EXTRACT_CACHE=s3 uses EXTRACT_CACHE_BUCKET/EXTRACT_CACHE_PREFIX,
+    EXTRACT_CACHE=sqlite uses EXTRACT_CACHE_PATH. Anything else disables caching.
+    """
+    kind = os.getenv("EXTRACT_CACHE", "").lower()
+    ttl = float(os.getenv("EXTRACT_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+    if kind == "s3" and s3_client is not None:
+        return S3Cache(
+            s3_client,
+            bucket=os.getenv("EXTRACT_CACHE_BUCKET") or os.getenv("PDF_BUCKET"),
+            prefix=os.getenv("EXTRACT_CACHE_PREFIX", "extract-cache/"),
+            ttl_seconds=ttl,
+        )
+    if kind == "sqlite":
+        return SqliteCache(os.getenv("EXTRACT_CACHE_PATH", "/tmp/extract_cache.sqlite3"), ttl_seconds=ttl)
+    return None
@@ -0,0 +1,170 @@
+"""
+Extraction mode cascade. A step is first extracted with the cheapest tier;
+only the fields that fail schema validation or the business checks are asked
+again at the next tier, down to the last (PREMIUM) tier, whose answer is
+kept as is. Checkbox-driven fields skip straight to the last tier; they are
+found by type, so partial and fused step schemas are covered too.
+
+The business checks mirror AgreementData in lambda_db_save (service totals vs
+payment within 10%) so the cascade catches what the upsert would flag.
+
+CascadeStats keeps per-tier field hit rates and a latency histogram for the
+life of the container; print(stats.report()) or read stats.as_dict().
+"""
+import bisect
+import os
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional, Union, get_args, get_origin
+
+from llama_cloud import ExtractMode
+
+from schemas.payments import Payment
+from . import metrics
+
+# Field types filled from checkboxes, which only PREMIUM reads reliably: yes/no
+# authorizations and Payment, the single vs multiple payment choice on the
+# tuition agreement. A SinglePayment is printed text, not a checkbox.
+CHECKBOX_TYPES = (bool, Payment)
+
+# Allowed relative difference between amounts that should agree
+AMOUNT_TOLERANCE = 0.10
+
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 240)
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    overrides: dict = field(default_factory=dict, hash=False)
+
+
+@lru_cache(maxsize=None)
+def checkbox_fields(schema) -> frozenset:
+    """Top-level fields of schema whose value comes from a checkbox."""
+    fields = set()
+    for name, info in schema.model_fields.items():
+        annotation = info.annotation
+        # Optional[X] is Union[X, None]
+        types = get_args(annotation) if get_origin(annotation) is Union else (annotation,)
+        if any(isinstance(t, type) and issubclass(t, CHECKBOX_TYPES) for t in types):
+            fields.add(name)
+    return frozenset(fields)
+
+
+def _amount(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _close(a: float, b: float) -> bool:
+    return abs(a - b) <= AMOUNT_TOLERANCE * max(abs(a), abs(b))
+
+
+def _payment_amount(payment) -> Optional[float]:
+    if not isinstance(payment, dict):
+        return None
+    if "amount" in payment:
+        return _amount(payment.get("amount"))
+    multiple = payment.get("multiple_payment")
+    if multiple:
+        return sum(_amount(p.get("amount")) or 0 for p in multiple if isinstance(p, dict))
+    return _payment_amount(payment.get("single_payment"))
+
+
+def business_check(data: dict) -> set[str]:
+    """Fields that are individually valid but disagree with each other."""
+    failing = set()
+    services = data.get("services")
+    if isinstance(services, dict):
+        services = [services]
+    if not isinstance(services, list):
+        return failing
+
+    for service in services:
+        if not isinstance(service, dict):
+            continue
+        units, cost, tuition = (_amount(service.get(k)) for k in ("units", "cost_per_unit", "tuition"))
+        if units and cost and tuition and not _close(units * cost, tuition):
+            failing.add("services")
+
+    services_total = sum(_amount(s.get("tuition")) or 0 for s in services if isinstance(s, dict))
+    total_tuition = _amount(data.get("total_tuition"))
+    if total_tuition and services_total and not _close(services_total, total_tuition):
+        failing |= {"services", "total_tuition"}
+
+    # Same rule as AgreementData.check_total_matches_services. total_tuition goes
+    # too, or a corrected services list would then disagree with it.
+    payment = _payment_amount(data.get("payment"))
+    if payment and services_total and not _close(services_total, payment):
+        failing |= {"services", "payment", "total_tuition"}
+    return failing
+
+
+class CascadeStats:
+    def __init__(self, tiers: list[Tier]):
+        self._lock = threading.Lock()
+        self.tiers = {t.name: {"calls": 0, "fields_requested": 0, "fields_accepted": 0,
+                               "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1)} for t in tiers}
+        self.escalations = {"schema": 0, "business": 0, "checkbox": 0}
+
+    def record_call(self, tier: str, requested: int, accepted: int, elapsed: float) -> None:
+        with self._lock:
+            stats = self.tiers[tier]
+            stats["calls"] += 1
+            stats["fields_requested"] += requested
+            stats["fields_accepted"] += accepted
+            stats["latency_buckets"][bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        metrics.count(f"cascade_{tier}_fields_requested", requested)
+        metrics.count(f"cascade_{tier}_fields_accepted", accepted)
+
+    def record_escalation(self, reason: str, fields: int) -> None:
+        with self._lock:
+            self.escalations[reason] += fields
+        metrics.count(f"cascade_escalated_{reason}", fields)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            tiers = {}
+            for name, stats in self.tiers.items():
+                labels = [f"<={b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+                tiers[name] = {
+                    "calls": stats["calls"],
+                    "hit_rate": round(stats["fields_accepted"] / stats["fields_requested"], 3)
+                    if stats["fields_requested"] else None,
+                    "latency_histogram": dict(zip(labels, stats["latency_buckets"])),
+                }
+            return {"tiers": tiers, "escalated_fields": dict(self.escalations)}
+
+    def report(self) -> str:
+        summary = self.as_dict()
+        lines = []
+        for name, stats in summary["tiers"].items():
+            histogram = " ".join(f"{k}:{v}" for k, v in stats["latency_histogram"].items() if v)
+            lines.append(f"{name}: {stats['calls']} calls, field hit rate {stats['hit_rate']}, latency {histogram}")
+        lines.append(f"escalated fields: {summary['escalated_fields']}")
+        return "\n".join(lines)
+
+
+class Cascade:
+    def __init__(self, tiers: Optional[list[Tier]] = None):
+        self.tiers = tiers or [
+            Tier("fast", {"extraction_mode": ExtractMode.FAST, "use_reasoning": False}),
+            Tier("premium"),
+        ]
+        self.stats = CascadeStats(self.tiers)
+
+    @property
+    def final(self) -> Tier:
+        return self.tiers[-1]
+
+
+def cascade_from_env() -> Optional[Cascade]:
+    """EXTRACT_CASCADE=1 enables; EXTRACT_CASCADE_MODE picks the first tier's mode (FAST, BALANCED)."""
+    if os.getenv("EXTRACT_CASCADE", "0") != "1":
+        return None
+    mode = ExtractMode[os.getenv("EXTRACT_CASCADE_MODE", "FAST").upper()]
+    return Cascade([Tier(mode.name.lower(), {"extraction_mode": mode, "use_reasoning": False}), Tier("premium")])
@@ -0,0 +1,170 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from functools import cached_property
+from typing import Optional, Union
+
+
+class DiskBudgetExceeded(RuntimeError):
+    pass
+
+
+class PageRangeError(ValueError):
+    pass
+
+
+# Bytes currently spilled to /tmp by this container
+_disk_lock = threading.Lock()
+_disk_in_use = 0
+
+
+def _reserve_disk(size: int, ceiling: int) -> None:
+    global _disk_in_use
+    with _disk_lock:
+        if _disk_in_use + size > ceiling:
+            raise DiskBudgetExceeded(
+                f"Spilling {size} bytes would exceed the {ceiling} byte /tmp budget ({_disk_in_use} in use)"
+            )
+        _disk_in_use += size
+
+
+def _release_disk(size: int) -> None:
+    global _disk_in_use
+    with _disk_lock:
+        _disk_in_use = max(0, _disk_in_use - size)
+
+
+def disk_in_use() -> int:
+    return _disk_in_use
+
+
+def parse_page_range(page_range: str) -> set[int]:
+    pages = set()
+    for part in page_range.split(","):
+        start, _, end = part.strip().partition("-")
+        pages.update(range(int(start), int(end or start) + 1))
+    return pages
+
+
+class PdfDocument:
+    """
+    A PDF held either in memory or in a file. Spilled temp files are owned by
+    the document and removed on close().
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 data: Optional[bytes] = None,
+                 name: Optional[str] = None,
+                 owns_file: bool = False,
+                 reserved_bytes: int = 0,
+    ):
+        if (path is None) == (data is None):
+            raise ValueError("PdfDocument needs exactly one of path or data")
+        self.path = path
+        self.data = data
+        self.name = name or (os.path.basename(path) if path else "document.pdf")
+        self._owns_file = owns_file
+        self._reserved_bytes = reserved_bytes
+        self._slices: dict = {}
+        self._slice_lock = threading.Lock()
+
+    @classmethod
+    def spill(cls, chunks, name: str, ceiling: int, expected_size: int = 0) -> "PdfDocument":
+        """Write chunks to a managed temp file, staying under the per-container disk ceiling."""
+        reserved = expected_size
+        _reserve_disk(reserved, ceiling)
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir="/tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                written = 0
+                for chunk in chunks:
+                    written += len(chunk)
+                    if written > reserved:
+                        _reserve_disk(written - reserved, ceiling)
+                        reserved = written
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            _release_disk(reserved)
+            raise
+        return cls(path=path, name=name, owns_file=True, reserved_bytes=reserved)
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    @cached_property
+    def size(self) -> int:
+        return len(self.data) if self.in_memory else os.path.getsize(self.path)
+
+    def source(self) -> Union[str, io.BytesIO]:
+        """Something pdfplumber.open() accepts; a fresh stream per call so threads don't share offsets."""
+        return io.BytesIO(self.data) if self.in_memory else self.path
+
+    @cached_property
+    def sha256(self) -> str:
+        if self.in_memory:
+            return hashlib.sha256(self.data).hexdigest()
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @cached_property
+    def page_count(self) -> int:
+        from pypdf import PdfReader
+        return len(PdfReader(self.source()).pages)
+
+    def slice(self, page_range: str) -> "PdfDocument":
+        """
+        An in-memory PDF with only the pages in page_range, built once per
+        range and shared by every step that asks for it. Returns self when the
+        range covers every page, and raises PageRangeError when none of its
+        pages exist.
+        """
+        with self._slice_lock:
+            if page_range in self._slices:
+                return self._slices[page_range]
+
+            from pypdf import PdfReader, PdfWriter
+
+            start = time.monotonic()
+            reader = PdfReader(self.source())
+            pages = sorted(p for p in parse_page_range(page_range) if p <= len(reader.pages))
+            if not pages:
+                raise PageRangeError(f"Pages {page_range} are past the end of a {len(reader.pages)} page document")
+            if len(pages) == len(reader.pages):
+                sliced = self
+            else:
+                writer = PdfWriter()
+                for number in pages:
+                    writer.add_page(reader.pages[number - 1])
+                buffer = io.BytesIO()
+                writer.write(buffer)
+                stem = os.path.splitext(self.name)[0]
+                sliced = PdfDocument(data=buffer.getvalue(), name=f"{stem}_p{page_range}.pdf")
+                sliced.page_count = len(pages)
+                print(f"Sliced pages {page_range}: {sliced.size} of {self.size} bytes "
+                      f"({self.size - sliced.size} saved) in {(time.monotonic() - start) * 1000:.1f} ms")
+            self._slices[page_range] = sliced
+            return sliced
+
+    def close(self) -> None:
+        if self._owns_file and self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            _release_disk(self._reserved_bytes)
+            self._owns_file = False
+
+    def __enter__(self) -> "PdfDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
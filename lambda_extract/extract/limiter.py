@@ -0,0 +1,253 @@
+"""
+Client-side rate and concurrency control for LlamaExtract calls.
+
+A token bucket caps the request rate and a concurrency limit caps calls in
+flight; both adapt AIMD-style. Every call that comes back without throttling
+and under latency_target raises them additively. A 429 cuts both
+multiplicatively (and honours Retry-After), and a slow call trims the
+concurrency limit. Only calls started after the last cut can trigger another
+one, so a burst of 429s from the same moment counts once.
+
+One limiter is shared by every thread (acquire) and asyncio task
+(acquire_async) in the process. A waiter gives up at its timeout or when its
+cancelled event is set, so calls abandoned by ResilientClient never take a
+slot.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from . import metrics
+from .resilience import current_call_scope, status_code
+
+THROTTLE_STATUS = {429}
+# How often a waiter with a cancelled event checks it; nothing notifies the condition on cancel
+CANCEL_POLL_SECONDS = 0.05
+
+
+class LimiterTimeout(TimeoutError):
+    pass
+
+
+class LimiterCancelled(LimiterTimeout):
+    pass
+
+
+def is_throttle(error: BaseException) -> bool:
+    return status_code(error) in THROTTLE_STATUS
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    def __init__(self,
+                 concurrency: float = 4,
+                 min_concurrency: float = 1,
+                 max_concurrency: float = 32,
+                 rate: float = 2.0,
+                 min_rate: float = 0.1,
+                 max_rate: float = 50.0,
+                 burst: Optional[float] = None,
+                 latency_target: float = 90.0,
+                 decrease_factor: float = 0.5,
+                 latency_decrease_factor: float = 0.9,
+                 rate_increase: float = 0.5,
+    ):
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst if burst is not None else max(1.0, concurrency)
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.latency_decrease_factor = latency_decrease_factor
+        self.rate_increase = rate_increase
+
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {"acquired": 0, "throttled": 0, "slow": 0, "decreases": 0, "wait_seconds": 0.0}
+
+    def _try_acquire(self, now: float) -> tuple[bool, Optional[float]]:
+        """(acquired, seconds worth waiting before retrying; None means until a release)."""
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if now < self._blocked_until:
+            return False, self._blocked_until - now
+        if self.in_flight >= max(1, int(self.limit)):
+            return False, None
+        if self._tokens < 1:
+            return False, (1 - self._tokens) / self.rate
+        self._tokens -= 1
+        self.in_flight += 1
+        self.stats["acquired"] += 1
+        return True, None
+
+    def _acquired(self, waited: float, queue_depth: int) -> float:
+        with self._cond:
+            self.stats["wait_seconds"] += waited
+        metrics.count("llm_limiter_wait", waited * 1000, "Milliseconds")
+        metrics.gauge("llm_limiter_queue_depth", queue_depth)
+        metrics.gauge("llm_limiter_concurrency", round(self.limit, 2))
+        metrics.gauge("llm_limiter_rate", round(self.rate, 2), "Count/Second")
+        return waited
+
+    def acquire(self, timeout: Optional[float] = None, cancelled: Optional[threading.Event] = None) -> float:
+        """Block until a call may start. Returns the seconds spent waiting."""
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            queue_depth = self.waiting
+            try:
+                while True:
+                    if cancelled is not None and cancelled.is_set():
+                        raise LimiterCancelled("LlamaExtract call was abandoned while waiting for a slot")
+                    now = time.monotonic()
+                    acquired, wait = self._try_acquire(now)
+                    if acquired:
+                        break
+                    if timeout is not None:
+                        remaining = start + timeout - now
+                        if remaining <= 0:
+                            raise LimiterTimeout(f"No LlamaExtract slot within {timeout}s")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    if cancelled is not None:
+                        wait = CANCEL_POLL_SECONDS if wait is None else min(wait, CANCEL_POLL_SECONDS)
+                    self._cond.wait(wait)
+            finally:
+                self.waiting -= 1
+        return self._acquired(time.monotonic() - start, queue_depth)
+
+    async def acquire_async(self, timeout: Optional[float] = None, cancelled: Optional[threading.Event] = None) -> float:
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            queue_depth = self.waiting
+        try:
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    raise LimiterCancelled("LlamaExtract call was abandoned while waiting for a slot")
+                now = time.monotonic()
+                with self._cond:
+                    acquired, wait = self._try_acquire(now)
+                if acquired:
+                    break
+                if timeout is not None and now - start >= timeout:
+                    raise LimiterTimeout(f"No LlamaExtract slot within {timeout}s")
+                # The event loop cannot block on the condition, so poll
+                await asyncio.sleep(min(wait, 0.25) if wait is not None else 0.01)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+        return self._acquired(time.monotonic() - start, queue_depth)
+
+    def release(self, latency: float, throttled: bool = False, retry_after_seconds: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self._cond:
+            self.in_flight -= 1
+            # Calls already in flight at the last cut saw the old limits; don't cut twice for them
+            fresh = now - latency >= self._last_decrease
+            if throttled:
+                self.stats["throttled"] += 1
+                if retry_after_seconds:
+                    self._blocked_until = max(self._blocked_until, now + retry_after_seconds)
+                if fresh:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self._tokens = min(self._tokens, 0.0)
+                    self._last_decrease = now
+                    self.stats["decreases"] += 1
+            elif latency > self.latency_target:
+                self.stats["slow"] += 1
+                if fresh:
+                    self.limit = max(self.min_concurrency, self.limit * self.latency_decrease_factor)
+                    self._last_decrease = now
+                    self.stats["decreases"] += 1
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self.rate = min(self.max_rate, self.rate + self.rate_increase / self.rate)
+            self._cond.notify_all()
+        if throttled:
+            metrics.count("llm_throttled")
+
+
+class LimitedClient:
+    """
+    Wraps an extract client so every call, retries and hedges included, goes
+    through the limiter. Inside a ResilientClient call the wait is bounded by
+    that call's deadline and ends when the call is abandoned (a losing hedge,
+    or a step that was given up on), so no request is made for it.
+    """
+
+    def __init__(self, inner: Any, limiter: AdaptiveLimiter):
+        self.inner = inner
+        self.limiter = limiter
+
+    @staticmethod
+    def _wait_bounds(scope) -> dict:
+        if scope is None:
+            return {}
+        return {"timeout": scope.remaining(), "cancelled": scope.cancelled}
+
+    def extract(self, schema, config, files):
+        scope = current_call_scope()
+        self.limiter.acquire(**self._wait_bounds(scope))
+        start = time.monotonic()
+        throttled, wait = False, None
+        try:
+            result = self.inner.extract(schema, config, files)
+            if scope is not None:
+                # The call has its answer. Cancel before releasing the slot, or a hedge
+                # queued for it could take the slot and make a request nobody will read.
+                scope.cancelled.set()
+            return result
+        except Exception as e:
+            throttled, wait = is_throttle(e), retry_after(e)
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - start, throttled, wait)
+
+    async def aextract(self, schema, config, files):
+        scope = current_call_scope()
+        await self.limiter.acquire_async(**self._wait_bounds(scope))
+        start = time.monotonic()
+        throttled, wait = False, None
+        try:
+            result = await self.inner.aextract(schema, config, files)
+            if scope is not None:
+                scope.cancelled.set()
+            return result
+        except Exception as e:
+            throttled, wait = is_throttle(e), retry_after(e)
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - start, throttled, wait)
+
+
+def limiter_from_env() -> Optional[AdaptiveLimiter]:
+    """LLM_LIMITER=0 disables; LLM_CONCURRENCY, LLM_MAX_CONCURRENCY, LLM_RATE_PER_SECOND and LLM_LATENCY_TARGET_SECONDS tune it."""
+    if os.getenv("LLM_LIMITER", "1") == "0":
+        return None
+    return AdaptiveLimiter(
+        concurrency=float(os.getenv("LLM_CONCURRENCY", 4)),
+        max_concurrency=float(os.getenv("LLM_MAX_CONCURRENCY", 32)),
+        rate=float(os.getenv("LLM_RATE_PER_SECOND", 2.0)),
+        latency_target=float(os.getenv("LLM_LATENCY_TARGET_SECONDS", 90)),
+    )
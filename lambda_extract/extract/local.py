@@ -0,0 +1,249 @@
+"""
+Local (non-LLM) extraction tier. Fields are read from the PDF text layer with
+the label-anchored templates in schemas/layouts.py.
+
+Values read here are trusted without review: a field that validates against
+the step schema is returned as-is and LlamaExtract is never asked to confirm
+it. Only missing or invalid fields go to the LLM. The tier is therefore off
+unless LOCAL_EXTRACTION=1, and the templates need checking against the
+current form revisions before it is turned on.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Optional
+
+import pdfplumber
+from pydantic import TypeAdapter, ValidationError, create_model
+
+from schemas.layouts import DerivedRule, FieldRule, TableRule
+from .document import parse_page_range
+
+CHECKED_GLYPHS = {"☒", "☑", "✔", "✓", "✗", "✘", "■", "X", "x"}
+LINE_TOLERANCE = 3.0
+MAX_WORD_GAP = 40.0
+NUMBER_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9/&-]+", "", text.lower())
+
+
+def _parse(value: Optional[str], kind: str) -> Any:
+    if value is None:
+        return None
+    value = value.strip().strip(":_").strip()
+    if not value:
+        return None
+    if kind in ("number", "int"):
+        match = NUMBER_RE.search(value)
+        if not match:
+            return None
+        number = float(match.group().replace(",", ""))
+        return int(number) if kind == "int" else number
+    return value
+
+
+class _PageText:
+    def __init__(self, page):
+        self.page = page
+        self.words = page.extract_words(use_text_flow=False, keep_blank_chars=False)
+        self.chars = page.chars
+        self._table_cache = None
+
+    def find_label(self, label: str, occurrence: int = 0) -> Optional[dict]:
+        tokens = [_normalize(t) for t in label.split() if _normalize(t)]
+        if not tokens:
+            return None
+        found = 0
+        words = self.words
+        for i in range(len(words) - len(tokens) + 1):
+            window = words[i:i + len(tokens)]
+            if any(_normalize(w["text"]) != t for w, t in zip(window, tokens)):
+                continue
+            if any(abs(w["top"] - window[0]["top"]) > LINE_TOLERANCE for w in window):
+                continue
+            if found == occurrence:
+                return {
+                    "x0": window[0]["x0"], "x1": window[-1]["x1"],
+                    "top": window[0]["top"], "bottom": max(w["bottom"] for w in window),
+                }
+            found += 1
+        return None
+
+    def value_right(self, anchor: dict) -> Optional[str]:
+        line = sorted(
+            (w for w in self.words if abs(w["top"] - anchor["top"]) <= LINE_TOLERANCE and w["x0"] >= anchor["x1"]),
+            key=lambda w: w["x0"],
+        )
+        parts, last_x1 = [], anchor["x1"]
+        for w in line:
+            if w["x0"] - last_x1 > MAX_WORD_GAP or (parts and w["text"].endswith(":")):
+                break
+            parts.append(w["text"])
+            last_x1 = w["x1"]
+        return " ".join(parts) or None
+
+    def value_below(self, anchor: dict) -> Optional[str]:
+        below = [w for w in self.words if w["top"] > anchor["bottom"] and w["x1"] >= anchor["x0"] - 10]
+        if not below:
+            return None
+        first_top = min(w["top"] for w in below)
+        line = sorted((w for w in below if abs(w["top"] - first_top) <= LINE_TOLERANCE), key=lambda w: w["x0"])
+        return " ".join(w["text"] for w in line) or None
+
+    def is_checked(self, anchor: dict) -> bool:
+        for c in self.chars:
+            if c["text"] not in CHECKED_GLYPHS:
+                continue
+            if anchor["x0"] - 20 <= c["x0"] <= anchor["x0"] and abs(c["top"] - anchor["top"]) <= LINE_TOLERANCE * 2:
+                return True
+        return False
+
+    def tables(self) -> list:
+        if self._table_cache is None:
+            self._table_cache = self.page.extract_tables() or []
+        return self._table_cache
+
+
+class LocalExtractor:
+    """
+    Fills step schemas from the PDF text layer using the per-title layout
+    templates. Returns whatever it could read; missing or invalid fields are
+    left for the LLM.
+    """
+
+    def __init__(self, templates: dict):
+        self.templates = templates
+
+    def extract(self, title: str, step, document) -> dict:
+        template = self.templates.get(title)
+        if not template:
+            return {}
+        pages = parse_page_range(step.page_range)
+        top_fields = set(step.schema.model_fields)
+        rules = {
+            path: rule for path, rule in template.items()
+            if path.split(".")[0] in top_fields and (isinstance(rule, DerivedRule) or rule.page in pages)
+        }
+        if not rules:
+            return {}
+
+        values: dict = {}
+        with pdfplumber.open(document.source()) as pdf:
+            page_text: dict = {}
+
+            def page_for(number: int) -> Optional[_PageText]:
+                if number > len(pdf.pages):
+                    return None
+                if number not in page_text:
+                    page_text[number] = _PageText(pdf.pages[number - 1])
+                return page_text[number]
+
+            for path, rule in rules.items():
+                if isinstance(rule, DerivedRule):
+                    continue
+                if isinstance(rule, TableRule):
+                    page = page_for(rule.page)
+                    value = self._read_table(page, rule) if page else None
+                else:
+                    value = self._read_field(title, page_for(rule.page), rule)
+                if value is not None:
+                    values[path] = value
+
+        for path, rule in rules.items():
+            if isinstance(rule, DerivedRule) and all(values.get(d) is not None for d in rule.depends):
+                try:
+                    value = rule.fn(*(values[d] for d in rule.depends))
+                except (ArithmeticError, TypeError, ValueError):
+                    value = None
+                if value is not None:
+                    values[path] = value
+
+        return _nest(values)
+
+    @staticmethod
+    def _read_field(title: str, page: Optional[_PageText], rule: FieldRule) -> Any:
+        if rule.kind == "title":
+            return title
+
+        if page is None or not page.words:
+            return None
+
+        if rule.kind == "choice":
+            for option in rule.choices:
+                anchor = page.find_label(option)
+                if anchor and page.is_checked(anchor):
+                    return option
+            return None
+
+        anchor = page.find_label(rule.label, rule.occurrence)
+        if anchor is None:
+            return None
+        if rule.kind == "checkbox":
+            return page.is_checked(anchor)
+        raw = page.value_below(anchor) if rule.direction == "below" else page.value_right(anchor)
+        return _parse(raw, rule.kind)
+
+    @staticmethod
+    def _read_table(page: _PageText, rule: TableRule) -> Optional[list]:
+        wanted = {_normalize(header): name for header, name in rule.columns.items()}
+        for table in page.tables():
+            if not table:
+                continue
+            header = [_normalize(cell or "") for cell in table[0]]
+            index = {name: header.index(h) for h, name in wanted.items() if h in header}
+            if len(index) != len(wanted):
+                continue
+            rows = []
+            for row in table[1:]:
+                item = {name: _parse(row[i], rule.kind.get(name, "text")) for name, i in index.items()}
+                if all(v is None for v in item.values()):
+                    continue
+                rows.append(item)
+            return rows
+        return None
+
+
+def _nest(values: dict) -> dict:
+    nested: dict = {}
+    for path, value in values.items():
+        target = nested
+        *parents, leaf = path.split(".")
+        for key in parents:
+            target = target.setdefault(key, {})
+        target[leaf] = value
+    return nested
+
+
+@lru_cache(maxsize=None)
+def _adapter(annotation) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+def split_valid_fields(schema, data: dict) -> tuple[dict, list[str]]:
+    """
+    Validate each top-level field of schema on its own. Returns the JSON-ready
+    values that passed and the names of fields that are missing or invalid.
+    """
+    valid, missing = {}, []
+    for name, info in schema.model_fields.items():
+        if name not in data:
+            missing.append(name)
+            continue
+        adapter = _adapter(info.annotation)
+        try:
+            value = adapter.validate_python(data[name])
+        except ValidationError:
+            missing.append(name)
+            continue
+        valid[name] = adapter.dump_python(value, mode="json")
+    return valid, missing
+
+
+@lru_cache(maxsize=None)
+def partial_schema(schema, fields: tuple):
+    """A model with only the given fields of schema, for asking the LLM about just those."""
+    definitions = {
+        name: (info.annotation, info) for name, info in schema.model_fields.items() if name in fields
+    }
+    return create_model(f"{schema.__name__}Missing", __doc__=schema.__doc__, **definitions)
@@ -0,0 +1,127 @@
+"""
+Extraction plan compiler. Decides per title whether the declared steps
+should be fused into one LlamaExtract call over the combined page range with
+a composite schema. The composite has the union of the step schemas'
+top-level fields, so its result is exactly the dict the separate steps
+would have merged into.
+
+The decision comes from configuration (FUSE_STEPS=all | none | comma list of
+titles) and, when an accuracy report is available, from measured accuracy:
+a title is fused only if fused extraction scored at least as well as the
+separate steps, within FUSE_ACCURACY_TOLERANCE.
+"""
+import json
+import os
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import create_model
+
+from .document import parse_page_range
+
+
+def format_page_range(pages: set[int]) -> str:
+    ordered = sorted(pages)
+    runs, start, prev = [], ordered[0], ordered[0]
+    for page in ordered[1:]:
+        if page != prev + 1:
+            runs.append((start, prev))
+            start = page
+        prev = page
+    runs.append((start, prev))
+    return ",".join(f"{a}-{b}" for a, b in runs)
+
+
+@lru_cache(maxsize=None)
+def composite_schema(schemas: tuple):
+    definitions = {}
+    for schema in schemas:
+        for name, info in schema.model_fields.items():
+            definitions[name] = (info.annotation, info)
+    return create_model("_".join(s.__name__ for s in schemas), **definitions)
+
+
+def can_fuse(plan) -> bool:
+    if len(plan) < 2:
+        return False
+    seen = set()
+    for step in plan:
+        fields = set(step.schema.model_fields)
+        # Overlapping fields would be merged differently by one call than by several
+        if fields & seen:
+            return False
+        seen |= fields
+    return True
+
+
+def fuse(plan):
+    pages = set()
+    for step in plan:
+        pages |= parse_page_range(step.page_range)
+    schema = composite_schema(tuple(step.schema for step in plan))
+    return [replace(plan[0], schema=schema, page_range=format_page_range(pages))]
+
+
+def field_accuracy(expected: dict, actual: dict) -> float:
+    """Share of leaf values in expected that actual reproduces, for building accuracy reports."""
+    def leaves(value, prefix=""):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                yield from leaves(v, f"{prefix}{k}.")
+        elif isinstance(value, list):
+            for i, v in enumerate(value):
+                yield from leaves(v, f"{prefix}{i}.")
+        else:
+            yield prefix, value
+
+    expected_leaves = dict(leaves(expected))
+    if not expected_leaves:
+        return 1.0
+    actual_leaves = dict(leaves(actual))
+    hits = sum(1 for k, v in expected_leaves.items() if actual_leaves.get(k) == v)
+    return hits / len(expected_leaves)
+
+
+@dataclass
+class FusionPolicy:
+    titles: set = field(default_factory=set)
+    fuse_all: bool = False
+    # title -> {"fused": accuracy, "split": accuracy}
+    accuracy: dict = field(default_factory=dict)
+    tolerance: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "FusionPolicy":
+        setting = os.getenv("FUSE_STEPS", "none").strip()
+        accuracy = {}
+        report = os.getenv("FUSE_ACCURACY_REPORT")
+        if report and os.path.exists(report):
+            with open(report) as f:
+                accuracy = json.load(f)
+        return cls(
+            titles=set() if setting in ("all", "none", "") else {t.strip() for t in setting.split(",")},
+            fuse_all=setting == "all",
+            accuracy=accuracy,
+            tolerance=float(os.getenv("FUSE_ACCURACY_TOLERANCE", 0.0)),
+        )
+
+    def should_fuse(self, title: str) -> bool:
+        if not (self.fuse_all or title in self.titles):
+            return False
+        measured = self.accuracy.get(title)
+        if measured is None:
+            return True
+        return measured["fused"] >= measured["split"] - self.tolerance
+
+
+def compile_plans(extraction_plans: dict, policy: Optional[FusionPolicy] = None) -> dict:
+    policy = policy or FusionPolicy()
+    compiled = {}
+    for title, plan in extraction_plans.items():
+        if policy.should_fuse(title) and can_fuse(plan):
+            compiled[title] = fuse(plan)
+            print(f"Fused {len(plan)} steps for '{title}' into {compiled[title][0].page_range}")
+        else:
+            compiled[title] = plan
+    return compiled
@@ -0,0 +1,98 @@
+"""
+Text-layer preflight. Classifies each page as digital (a real text layer),
+scanned (an image with little or no text) or mixed, so born-digital pages can
+skip the expensive OCR settings.
+
+Pages whose only fonts are OCR glyph fonts (an invisible text layer added by
+a scanner) count as scanned: that text is someone else's OCR, not the
+document's own.
+"""
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import pdfplumber
+
+DIGITAL = "digital"
+SCANNED = "scanned"
+MIXED = "mixed"
+
+# Fonts scanners use for invisible OCR text layers
+OCR_FONTS = ("GlyphLessFont", "OCRFont", "Tesseract")
+
+
+@dataclass
+class PageProfile:
+    page: int
+    kind: str
+    chars: int
+    # Characters per square inch
+    char_density: float
+    image_coverage: float
+    has_fonts: bool
+
+
+@dataclass
+class DocumentProfile:
+    pages: dict = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def kind_for(self, pages: Iterable[int]) -> str:
+        kinds = {self.pages[p].kind for p in pages if p in self.pages}
+        if kinds == {DIGITAL}:
+            return DIGITAL
+        if kinds == {SCANNED}:
+            return SCANNED
+        return MIXED
+
+    @property
+    def kind(self) -> str:
+        return self.kind_for(self.pages)
+
+    def summary(self) -> str:
+        counts = {k: sum(1 for p in self.pages.values() if p.kind == k) for k in (DIGITAL, SCANNED, MIXED)}
+        return ", ".join(f"{n} {k}" for k, n in counts.items() if n)
+
+
+def _image_coverage(page) -> float:
+    page_area = float(page.width * page.height) or 1.0
+    covered = 0.0
+    for image in page.images:
+        x0, x1 = max(0, image["x0"]), min(page.width, image["x1"])
+        top, bottom = max(0, image["top"]), min(page.height, image["bottom"])
+        if x1 > x0 and bottom > top:
+            covered += (x1 - x0) * (bottom - top)
+    # Overlapping images can add up past the page
+    return min(1.0, covered / page_area)
+
+
+class TextLayerAnalyzer:
+    def __init__(self, min_chars: int = 80, max_image_coverage: float = 0.5):
+        self.min_chars = min_chars
+        self.max_image_coverage = max_image_coverage
+
+    def classify_page(self, page, number: int) -> PageProfile:
+        chars = page.chars
+        fonts = {c.get("fontname", "") for c in chars}
+        has_fonts = any(f and not any(ocr in f for ocr in OCR_FONTS) for f in fonts)
+        coverage = _image_coverage(page)
+        square_inches = float(page.width * page.height) / (72 * 72) or 1.0
+
+        if len(chars) >= self.min_chars and has_fonts and coverage < self.max_image_coverage:
+            kind = DIGITAL
+        elif coverage >= self.max_image_coverage and (len(chars) < self.min_chars or not has_fonts):
+            kind = SCANNED
+        else:
+            kind = MIXED
+        return PageProfile(number, kind, len(chars), round(len(chars) / square_inches, 2), round(coverage, 3),
+                           has_fonts)
+
+    def analyse(self, source, pages: Optional[set[int]] = None) -> DocumentProfile:
+        """Profile the given 1-based pages (all pages when None)."""
+        profile = DocumentProfile()
+        with pdfplumber.open(source) as pdf:
+            for number, page in enumerate(pdf.pages, start=1):
+                if pages is not None and number not in pages:
+                    continue
+                profile.pages[number] = self.classify_page(page, number)
+                page.close()
+        return profile
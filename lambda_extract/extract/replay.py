@@ -0,0 +1,168 @@
+"""
+Record/replay stand-ins for the LlamaExtract client.
+
+RecordingExtractor wraps the real client and saves every result as a
+cassette. ReplayExtractor serves those cassettes back with simulated latency
+so LLMExtractor can be benchmarked and regression-tested offline:
+
+    client = RecordingExtractor(LlamaExtract(api_key=...), "cassettes/")
+    extractor = LLMExtractor(api_key="", ..., client=client)
+
+    extractor = LLMExtractor(api_key="", ..., client=ReplayExtractor("cassettes/", latency="recorded"))
+
+Cassettes are keyed by the SHA-256 of the uploaded bytes (the page slice when
+slicing is on), the schema's JSON schema hash and the requested page range.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+from .cache import schema_hash
+
+
+class CassetteMissing(KeyError):
+    pass
+
+
+@dataclass
+class ReplayResult:
+    data: Any
+
+
+def _file_sha256(files: Any) -> str:
+    if isinstance(files, (str, os.PathLike)):
+        with open(files, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    data = getattr(files, "file", files)
+    if isinstance(data, (str, os.PathLike)):
+        return _file_sha256(data)
+    if hasattr(data, "getvalue"):
+        data = data.getvalue()
+    return hashlib.sha256(data).hexdigest()
+
+
+def cassette_key(schema: Any, config: Any, files: Any) -> str:
+    parts = (_file_sha256(files), schema.__name__, schema_hash(schema), config.page_range or "")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class CassetteStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, cassette: dict) -> None:
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cassette, f, indent=2, sort_keys=True)
+        os.replace(tmp, self._path(key))
+
+
+class RecordingExtractor:
+    def __init__(self, inner: Any, cassette_dir: str):
+        self.inner = inner
+        self.store = CassetteStore(cassette_dir)
+
+    def extract(self, schema, config, files):
+        start = time.monotonic()
+        res = self.inner.extract(schema, config, files)
+        self.store.save(cassette_key(schema, config, files), {
+            "schema": schema.__name__,
+            "page_range": config.page_range,
+            "latency_seconds": round(time.monotonic() - start, 3),
+            "data": res.data,
+        })
+        return res
+
+
+class ReplayExtractor:
+    """
+    latency is a fixed number of seconds, or "recorded" to sleep for the
+    latency stored in each cassette (times latency_scale). jitter adds a
+    seeded uniform +/- fraction so runs stay reproducible. With
+    synthesize_missing, schemas without a cassette get placeholder data built
+    from the JSON schema instead of raising CassetteMissing.
+    """
+
+    def __init__(self,
+                 cassette_dir: Optional[str] = None,
+                 latency: Union[float, str] = 0.0,
+                 latency_scale: float = 1.0,
+                 jitter: float = 0.0,
+                 seed: int = 0,
+                 synthesize_missing: bool = False,
+    ):
+        self.store = CassetteStore(cassette_dir) if cassette_dir else None
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.synthesize_missing = synthesize_missing
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _sleep(self, recorded: Optional[float]) -> None:
+        if self.latency == "recorded":
+            seconds = (recorded or 0.0) * self.latency_scale
+        else:
+            seconds = float(self.latency)
+        if self.jitter:
+            with self._lock:
+                seconds *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def extract(self, schema, config, files):
+        with self._lock:
+            self.calls += 1
+        cassette = self.store.load(cassette_key(schema, config, files)) if self.store else None
+        if cassette is None:
+            if not self.synthesize_missing:
+                raise CassetteMissing(f"No cassette for {schema.__name__} ({config.page_range})")
+            cassette = {"data": synthesize(schema), "latency_seconds": None}
+        self._sleep(cassette.get("latency_seconds"))
+        return ReplayResult(json.loads(json.dumps(cassette["data"])))
+
+
+def synthesize(schema: Any) -> dict:
+    """Placeholder data shaped like schema, enough for post-processing to run."""
+    json_schema = schema.model_json_schema()
+    definitions = json_schema.get("$defs", {})
+
+    def build(node: dict) -> Any:
+        if "$ref" in node:
+            return build(definitions[node["$ref"].split("/")[-1]])
+        if "anyOf" in node:
+            options = [o for o in node["anyOf"] if o.get("type") != "null"]
+            return build(options[0]) if options else None
+        if "enum" in node:
+            return node["enum"][0]
+        kind = node.get("type")
+        if kind == "object":
+            return {name: build(prop) for name, prop in node.get("properties", {}).items()}
+        if kind == "array":
+            return [build(node.get("items", {}))]
+        if kind == "integer":
+            return 1
+        if kind == "number":
+            return 100.0
+        if kind == "boolean":
+            return False
+        return "sample"
+
+    return build(json_schema)
@@ -0,0 +1,191 @@
+"""
+Deadlines, jittered retries and hedged requests around a LlamaExtract-style
+client (anything with extract(schema, config, files)).
+
+An attempt that is still running once it passes the observed p95 latency for
+its schema gets one duplicate submission; whichever answer arrives first is
+used. Hedging only starts after hedge_min_samples calls and is capped at
+max_hedge_ratio of all calls, so normal documents never pay twice.
+
+Every submission runs inside a CallScope carrying the call's deadline and a
+cancellation event, set once the call has returned or given up. Inner
+clients that wait before calling out (LimitedClient) read it through
+current_call_scope() and skip the request when nobody is waiting for it.
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from . import metrics
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {"ConnectError", "ReadTimeout", "WriteTimeout", "PoolTimeout", "ConnectTimeout",
+                   "RemoteProtocolError", "ReadError"}
+
+
+class ExtractDeadlineExceeded(TimeoutError):
+    pass
+
+
+@dataclass(frozen=True)
+class CallScope:
+    deadline: float
+    cancelled: threading.Event = field(default_factory=threading.Event)
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+
+_call_scope: ContextVar[Optional[CallScope]] = ContextVar("llm_call_scope", default=None)
+
+
+def current_call_scope() -> Optional[CallScope]:
+    """The deadline and cancellation of the ResilientClient call this thread is serving, if any."""
+    return _call_scope.get()
+
+
+def _in_scope(scope: CallScope, fn, *args):
+    _call_scope.set(scope)
+    return fn(*args)
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if status_code(error) in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES
+
+
+@dataclass(frozen=True)
+class ResilienceConfig:
+    deadline: float = 180.0
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 15.0
+    hedge: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    max_hedge_ratio: float = 0.1
+
+
+class ResilientClient:
+    def __init__(self, inner: Any, config: Optional[ResilienceConfig] = None, seed: Optional[int] = None):
+        self.inner = inner
+        self.config = config or ResilienceConfig()
+        self._latencies: dict = defaultdict(lambda: deque(maxlen=200))
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedges_won": 0, "deadline_exceeded": 0,
+                      "time_spent_seconds": 0.0}
+
+    def _count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+        metrics.count(f"llm_request_{name}", value, "Seconds" if name.endswith("seconds") else "Count")
+
+    def hedge_after(self, key: str) -> Optional[float]:
+        cfg = self.config
+        if not cfg.hedge:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies[key])
+            if len(samples) < cfg.hedge_min_samples:
+                return None
+            if self.stats["hedges"] >= cfg.max_hedge_ratio * max(1, self.stats["calls"]):
+                return None
+        return samples[min(len(samples) - 1, int(cfg.hedge_quantile * len(samples)))]
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter
+        ceiling = min(self.config.max_delay, self.config.base_delay * 2 ** (attempt - 1))
+        with self._lock:
+            return self._random.uniform(0, ceiling)
+
+    def _timed_call(self, schema, config, files):
+        start = time.monotonic()
+        try:
+            return self.inner.extract(schema, config, files), time.monotonic() - start
+        finally:
+            self._count("time_spent_seconds", time.monotonic() - start)
+
+    def _submit(self, executor, scope: CallScope, schema, config, files):
+        # Each submission gets its own context copy so metrics reach the caller's recorder
+        return executor.submit(contextvars.copy_context().run, _in_scope, scope, self._timed_call, schema, config, files)
+
+    def _attempt(self, executor, scope: CallScope, key: str, schema, config, files):
+        """One logical attempt, possibly hedged. Returns the first success or raises the last error."""
+        deadline = scope.deadline
+        pending = {self._submit(executor, scope, schema, config, files)}
+        hedge_after = self.hedge_after(key)
+        hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+        hedged = None
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                raise ExtractDeadlineExceeded(f"{schema.__name__} did not finish before its deadline")
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+
+            # A success wins even if another submission failed in the same wait
+            for future in sorted(done, key=lambda f: f.exception() is not None):
+                error = future.exception()
+                if error is None:
+                    result, elapsed = future.result()
+                    with self._lock:
+                        self._latencies[key].append(elapsed)
+                    if future is hedged:
+                        self._count("hedges_won")
+                    return result
+                if not pending:
+                    raise error
+                # Another submission is still running and may succeed
+
+            if hedge_at is not None and time.monotonic() >= hedge_at and pending:
+                hedged = self._submit(executor, scope, schema, config, files)
+                pending.add(hedged)
+                hedge_at = None
+                self._count("hedges")
+
+    def extract(self, schema, config, files):
+        self._count("calls")
+        key = schema.__name__
+        scope = CallScope(time.monotonic() + self.config.deadline)
+        deadline = scope.deadline
+        # A pool per call (the attempt and its hedge): a call abandoned at its deadline, or a
+        # losing hedge, finishes on its own threads instead of holding a shared pool that later
+        # calls would queue behind
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llama-call")
+        attempt = 1
+        try:
+            while True:
+                try:
+                    return self._attempt(executor, scope, key, schema, config, files)
+                except ExtractDeadlineExceeded:
+                    self._count("deadline_exceeded")
+                    raise
+                except Exception as e:
+                    if attempt >= self.config.max_attempts or not is_retryable(e):
+                        raise
+                    delay = self._backoff(attempt)
+                    if time.monotonic() + delay >= deadline:
+                        raise
+                    print(f"Retrying {key} after {e!r} (attempt {attempt + 1}, sleeping {delay:.1f}s)")
+                    self._count("retries")
+                    time.sleep(delay)
+                    attempt += 1
+        finally:
+            # Submissions still queued for a limiter slot see this and never make their request
+            scope.cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,162 @@
+import re
+from dataclasses import dataclass, replace
+from difflib import SequenceMatcher
+from typing import IO, Iterable, Optional, Union
+import pdfplumber
+
+
+class UnknownDocumentTitle(ValueError):
+    pass
+
+
+def normalize_title(text: str) -> str:
+    text = text.lower().replace("&", " and ")
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return " ".join(text.split())
+
+
+def _token_present(token: str, tokens: set, min_ratio: float = 0.8) -> bool:
+    if token in tokens:
+        return True
+    return any(SequenceMatcher(None, token, other).ratio() >= min_ratio for other in tokens)
+
+
+@dataclass(frozen=True)
+class TitleMatch:
+    title: str
+    confidence: float
+    line: str
+    page_count: int = 0
+
+
+@dataclass(frozen=True)
+class Segment:
+    title: str
+    start: int
+    end: int
+    confidence: float
+
+    @property
+    def page_range(self) -> str:
+        return f"{self.start}-{self.end}"
+
+
+class TitleClassifier:
+    """
+    Matches the first lines of page 1 against a fixed set of document titles.
+    The index is built once; classification reads the top of page 1 and only
+    falls back to the rest of that page when the top band has no good match.
+    """
+
+    def __init__(self,
+                 titles: Iterable[str],
+                 min_confidence: float = 0.8,
+                 max_lines: int = 5,
+                 top_fraction: float = 0.3,
+                 min_segment_confidence: float = 0.9,
+    ):
+        self.index = {}
+        for title in titles:
+            normalized = normalize_title(title)
+            self.index[normalized] = (title, set(normalized.split()))
+        self.min_confidence = min_confidence
+        self.max_lines = max_lines
+        self.top_fraction = top_fraction
+        self.min_segment_confidence = min_segment_confidence
+
+    def _score(self, line: str) -> Optional[TitleMatch]:
+        normalized = normalize_title(line)
+        if not normalized:
+            return None
+        exact = self.index.get(normalized)
+        if exact:
+            return TitleMatch(exact[0], 1.0, line)
+
+        tokens = set(normalized.split())
+        best, best_rank = None, None
+        for key, (title, title_tokens) in self.index.items():
+            containment = sum(_token_present(t, tokens) for t in title_tokens) / len(title_tokens)
+            ratio = SequenceMatcher(None, key, normalized).ratio()
+            score = round(0.5 * containment + 0.5 * ratio, 3)
+            # On a tie prefer the more specific title ("ESA Enrollment ..." over "Enrollment ...")
+            rank = (score, len(title_tokens))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = TitleMatch(title, score, line), rank
+        return best
+
+    def classify_text(self, text: str) -> Optional[TitleMatch]:
+        lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+        best = None
+        for line in lines[:self.max_lines]:
+            match = self._score(line)
+            if match and (best is None or match.confidence > best.confidence):
+                best = match
+            if best and best.confidence == 1.0:
+                break
+        return best
+
+    def _classify_page(self, page) -> Optional[TitleMatch]:
+        top = page.crop((0, 0, page.width, page.height * self.top_fraction))
+        match = self.classify_text(top.extract_text() or "")
+        if match is None or match.confidence < self.min_confidence:
+            match = self.classify_text(page.extract_text() or "") or match
+        return match
+
+    def _title_page_match(self, page) -> Optional[TitleMatch]:
+        """A title that opens the page: its first line, or exactly its first two lines for a wrapped title."""
+        top = page.crop((0, 0, page.width, page.height * self.top_fraction))
+        lines = [ln.strip() for ln in (top.extract_text() or "").splitlines() if ln.strip()]
+        if not lines:
+            return None
+        if len(lines) > 1:
+            wrapped = f"{lines[0]} {lines[1]}"
+            exact = self.index.get(normalize_title(wrapped))
+            if exact:
+                return TitleMatch(exact[0], 1.0, wrapped)
+        return self._score(lines[0])
+
+    def segment(self, source: Union[str, IO[bytes]], min_pages: Optional[dict] = None) -> list[Segment]:
+        """
+        Split a bundle of agreements into one segment per title page. Page 1
+        is classified as in classify(); a later page starts a new agreement
+        only when its first line (or first two, for a wrapped title) scores
+        strictly above min_segment_confidence, so body text that merely
+        quotes a title does not. A title repeated within min_pages[title]
+        pages of its segment's start is taken as a running header. Pages
+        before the first title page belong to the first segment.
+        """
+        min_pages = min_pages or {}
+        segments: list[list] = []
+        with pdfplumber.open(source) as pdf:
+            for number, page in enumerate(pdf.pages, start=1):
+                if number == 1:
+                    match = self._classify_page(page)
+                    starts = match is not None and match.confidence >= self.min_confidence
+                else:
+                    match = self._title_page_match(page)
+                    starts = match is not None and match.confidence > self.min_segment_confidence
+                page.close()
+                current = segments[-1] if segments else None
+                if starts and current is not None and number - current[1] < min_pages.get(current[0], 1):
+                    starts = False
+                if starts:
+                    segments.append([match.title, 1 if current is None else number, number, match.confidence])
+                elif current is not None:
+                    current[2] = number
+        if not segments:
+            raise UnknownDocumentTitle("Could not find any document title in the bundle")
+        return [Segment(*s) for s in segments]
+
+    def classify(self, source: Union[str, IO[bytes]]) -> TitleMatch:
+        with pdfplumber.open(source) as pdf:
+            if not pdf.pages:
+                raise UnknownDocumentTitle("Document has no pages")
+            match = self._classify_page(pdf.pages[0])
+            page_count = len(pdf.pages)
+
+        if match is None or match.confidence < self.min_confidence:
+            raise UnknownDocumentTitle(
+                f"Could not classify document title (best: {match.title if match else None}, "
+                f"confidence: {match.confidence if match else 0})"
+            )
+        return replace(match, page_count=page_count)
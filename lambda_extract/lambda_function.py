@@ -1,62 +1,218 @@
+import contextvars
 import json
-import boto3
-import tempfile
 import os
-from llama_cloud_services import LlamaExtract # pip install llama_cloud_services
-from llama_cloud import ExtractConfig, ExtractMode, PublicModelName
-import pdfplumber
-from schemas.registry import titles, EXTRACTION_PLANS, POST_PROCESSING_PLAN, \
-    TuitionSchemaFirstPage, TuitionSchemaSecondPage
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from aws.client import AwsAdapter, get_s3_path
+from aws.client import AwsAdapter, events_from_sqs_record, get_s3_object, segment_key, split_segment_key
+from aws.ledger import ledger_from_env
+from extract import metrics
 
+# Boto3 clients, llama_cloud_services, pdfplumber and the schemas are only
+# loaded once an invocation actually needs the extractor.
 aws = AwsAdapter()
+# Dedups repeated S3 events per object version (DEDUP_LEDGER=dynamodb|sqlite|memory)
+ledger = ledger_from_env(aws)
 
-from extract.app import LLMExtractor
-extractor = LLMExtractor(
-    api_key=aws.get_secret_value("LLAMA_PARSE_API_KEY"),
-    extraction_plans=EXTRACTION_PLANS,
-    post_processing_plan=POST_PROCESSING_PLAN
-)
+_extractor = None
+_extractor_lock = threading.Lock()
+
+# Records of one SQS batch processed at a time
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", 4))
+# Split PDFs holding several agreements and upsert each one separately.
+# Off by default: segmentation reads the text of every page.
+SEGMENT_BUNDLES = os.getenv("SEGMENT_BUNDLES", "0") == "1"
+
+
+def build_extractor(aws: AwsAdapter):
+    from extract.agents import registry_from_env
+    from extract.app import LLMExtractor
+    from extract.cache import cache_from_env
+    from extract.cascade import cascade_from_env
+    from extract.limiter import limiter_from_env
+    from extract.local import LocalExtractor
+    from extract.planner import FusionPolicy
+    from extract.preflight import TextLayerAnalyzer
+    from extract.resilience import ResilienceConfig
+    from extract.title import TitleClassifier
+    from schemas.enums import DocumentTitle
+    from schemas.layouts import LAYOUT_TEMPLATES
+    from schemas.registry import EXTRACTION_PLANS, POST_PROCESSING_PLAN
+
+    return LLMExtractor(
+        api_key=os.getenv("LLAMA_PARSE_API_KEY") or aws.get_secret_value("LLAMA_PARSE_API_KEY"),
+        extraction_plans=EXTRACTION_PLANS,
+        post_processing_plan=POST_PROCESSING_PLAN,
+        cache=cache_from_env(aws.s3),
+        title_classifier=TitleClassifier([*EXTRACTION_PLANS, *(t.value for t in DocumentTitle)]),
+        local_extractor=LocalExtractor(LAYOUT_TEMPLATES) if os.getenv("LOCAL_EXTRACTION", "0") == "1" else None,
+        fusion_policy=FusionPolicy.from_env(),
+        resilience=ResilienceConfig(
+            # Below the step timeout so a stuck call fails as a retryable error, not a lost step
+            deadline=float(os.getenv("EXTRACT_DEADLINE_SECONDS", 180)),
+            max_attempts=int(os.getenv("EXTRACT_MAX_ATTEMPTS", 3)),
+            hedge=os.getenv("EXTRACT_HEDGE", "1") != "0",
+            max_hedge_ratio=float(os.getenv("EXTRACT_MAX_HEDGE_RATIO", 0.1)),
+        ),
+        limiter=limiter_from_env(),
+        preflight=TextLayerAnalyzer() if os.getenv("PREFLIGHT", "1") != "0" else None,
+        cascade=cascade_from_env(),
+        registry=registry_from_env(),
+        use_agents=os.getenv("EXTRACT_AGENTS", "0") == "1",
+    )
+
+
+def get_extractor():
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = build_extractor(aws)
+    return _extractor
 
 def lambda_handler(event, context):
-    path_value = get_s3_path(event)
+    records = event.get("Records") or []
+    if records and records[0].get("eventSource") == "aws:sqs":
+        return _handle_batch(records)
+    with metrics.invocation(), metrics.timed("total"):
+        return _handle(event)
+
+
+def _handle_record(record) -> bool:
+    ok = True
+    for event in events_from_sqs_record(record):
+        try:
+            with metrics.invocation(), metrics.timed("total"):
+                response = _handle(event)
+            # In progress elsewhere: let SQS redeliver and pick up the stored outcome then
+            ok = ok and (response or {}).get("statusCode") == 200
+        except Exception as e:
+            print(f"Record {record.get('messageId')} failed: {e!r}")
+            ok = False
+    return ok
+
+
+def _handle_batch(records: list) -> dict:
+    """Process an SQS batch concurrently and report only the failed messages for redelivery."""
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_MAX_WORKERS, len(records)))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _handle_record, record)
+            for record in records
+        ]
+        results = [f.result() for f in futures]
+    failures = [{"itemIdentifier": r["messageId"]} for r, ok in zip(records, results) if not ok]
+    print(f"Batch of {len(records)} records, {len(failures)} failed")
+    return {"batchItemFailures": failures}
+
+
+def _handle(event):
+    ref = get_s3_object(event)
+    path_value = ref.key
 
     print(f"Path value: {path_value}")
     if path_value:
-        local_file_name = aws.download_pdf_to_tmp(path_value)
-        print(f"Processing: {path_value}")
-        print(f"Local file name: {local_file_name}")
-
-        agreement = extractor.extract(local_file_name)
+        claim = None
+        if ledger is not None:
+            ref = aws.resolve_object(ref)
+            claim = ledger.claim(ref.ledger_key)
+            metrics.put_property("LedgerStatus", claim.status)
+            if claim.status == "done":
+                print(f"Already processed: {path_value}")
+                return claim.outcome
+            if claim.status == "in_flight":
+                print(f"Already in progress: {path_value}")
+                return {
+                    "statusCode": 202,
+                    "headers": {
+                        "Access-Control-Allow-Origin": "*",
+                        "Access-Control-Allow-Credentials": "true"
+                    },
+                    "body": json.dumps("IN_PROGRESS")
+                }
 
         try:
-            print(f"UPDATE agreement: {agreement}")
-            aws.call_upsert(agreement, path_value)
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Credentials": "true"
-                },
-                "body": json.dumps("UPDATED")
-            }
+            response = _process(path_value)
         except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            try:
-                conn.close()
-            except Exception:
-                pass
+            if claim is not None:
+                ledger.release(claim)
             raise
+        if claim is not None:
+            ledger.complete(claim, response)
+        return response
+
+
+def extract_agreements(extractor, document, path_value: str) -> list:
+    """
+    (key, agreement, error) for every agreement in a document, keyed the way
+    they are upserted: path_value itself, or one segment_key() per agreement
+    when SEGMENT_BUNDLES splits a bundle. For a segment key, document is the
+    whole bundle. backfill.py goes through here too.
+    """
+    _, page_range = split_segment_key(path_value)
+    if page_range is not None:
+        return [(path_value, extractor.extract(document.slice(page_range)), None)]
+    if not SEGMENT_BUNDLES:
+        return [(path_value, extractor.extract(document), None)]
+
+    results = extractor.extract_bundle(document)
+    if len(results) == 1:
+        if not results[0].ok:
+            raise results[0].error
+        return [(path_value, results[0].agreement, None)]
+    return [(segment_key(path_value, r.segment.page_range), r.agreement, r.error) for r in results]
+
+
+def _process(path_value):
+    print(f"Processing: {path_value}")
+    # "<key>::pages-3-5" (an agreement split from a bundle) is read from the bundle
+    key, _ = split_segment_key(path_value)
+    with aws.fetch_pdf(key) as document:
+        agreements = extract_agreements(get_extractor(), document, path_value)
+
+    if len(agreements) > 1:
+        return _upsert_segments(path_value, agreements)
+    _, agreement, _ = agreements[0]
 
+    try:
+        print("UPDATE agreement")
+        aws.call_upsert(agreement, path_value)
         return {
             "statusCode": 200,
             "headers": {
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Credentials": "true"
             },
-            "body": json.dumps(agreement)
+            "body": json.dumps("UPDATED")
         }
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+        raise
+
+
+def _upsert_segments(path_value, agreements):
+    """One upsert per agreement in a bundle, keyed by its page range."""
+    updated = []
+    for key, agreement, error in agreements:
+        if error is None:
+            aws.call_upsert(agreement, key)
+            updated.append(key)
+    failed = [error for _, _, error in agreements if error is not None]
+    print(f"Bundle {path_value}: {len(updated)} agreements upserted, {len(failed)} failed")
+    if failed:
+        # Retried as a whole; the extract cache keeps the finished segments cheap
+        raise failed[0]
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Credentials": "true"
+        },
+        "body": json.dumps({"updated": updated})
+    }
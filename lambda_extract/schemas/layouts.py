@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .enums import CollegeBound, DocumentTitle
+
+# Layout templates for the local (non-LLM) extraction tier. Fields are found
+# by the label printed on the form, not by coordinates, so small layout shifts
+# between form revisions still work. Paths are dotted into the step schemas
+# ("student.first_name"). Anything a template can't fill is left to LlamaExtract.
+
+
+@dataclass(frozen=True)
+class FieldRule:
+    label: str
+    page: int = 1
+    kind: str = "text"  # text | number | int | checkbox | choice | title
+    direction: str = "right"  # right | below
+    choices: tuple = ()  # kind="choice": option labels, the checked one wins
+    occurrence: int = 0  # use the nth match of the label on the page
+
+
+@dataclass(frozen=True)
+class TableRule:
+    # column header on the form -> field in each row
+    columns: dict
+    page: int = 1
+    kind: dict = field(default_factory=dict)  # field -> number | int
+
+
+@dataclass(frozen=True)
+class DerivedRule:
+    depends: tuple
+    fn: Callable
+
+
+def _common_rules() -> dict:
+    return {
+        # Filled from the already classified title
+        "document_title": FieldRule("", kind="title"),
+        "student.first_name": FieldRule("First Name"),
+        "student.last_name": FieldRule("Last Name"),
+        "student.nickname": FieldRule("Nickname"),
+        "parent_guardian.full_name": FieldRule("Parent/Guardian Name"),
+        "parent_guardian.email": FieldRule("Email"),
+        "second_parent_guardian.full_name": FieldRule("Parent/Guardian Name", occurrence=1),
+        "second_parent_guardian.email": FieldRule("Email", occurrence=1),
+        "student_program.campus": FieldRule("Campus"),
+        "student_program.courses": FieldRule("Courses"),
+        "student_program.current_grade": FieldRule("Current Grade", kind="int"),
+        "student_program.college_bound": FieldRule(
+            "College Bound", kind="choice", choices=tuple(c.value for c in CollegeBound)
+        ),
+        "doc_id": FieldRule("Document ID"),
+    }
+
+
+SERVICES_TABLE = TableRule(
+    columns={
+        "Service": "service_name",
+        "Cost per Unit": "cost_per_unit",
+        "Units": "units",
+        "Tuition": "tuition",
+    },
+    kind={"cost_per_unit": "number", "units": "number", "tuition": "number"},
+)
+
+_TUITION = {
+    **_common_rules(),
+    "services": SERVICES_TABLE,
+    "total_tuition": FieldRule("Total Tuition", kind="number"),
+    "one_to_one_sessions": FieldRule("One-to-One Sessions", kind="int"),
+    "homework_studio_sessions": FieldRule("Homework Studio Sessions", kind="int"),
+    "scheduled_start_date": FieldRule("Scheduled Start Date"),
+}
+
+_TUTORING = {
+    **_common_rules(),
+    "services.service_name": FieldRule(
+        "The program will be designed to support the student in achieving the following", direction="below"
+    ),
+    "services.units": FieldRule("Total Sessions Purchased", kind="number"),
+    "services.tuition": FieldRule("Total Amount", kind="number"),
+    "services.cost_per_unit": DerivedRule(
+        ("services.tuition", "services.units"), lambda tuition, units: round(tuition / units, 2) if units else None
+    ),
+    "scheduled_start_date": FieldRule("Scheduled Start Date"),
+}
+
+LAYOUT_TEMPLATES = {
+    DocumentTitle.ESA_ENROLLMENT.value: _TUITION,
+    DocumentTitle.ENROLLMENT_TUITION_AGREEMENT.value: _TUITION,
+    DocumentTitle.SKILL_BUILDING.value: {
+        **_common_rules(),
+        "services": SERVICES_TABLE,
+        "total_tuition": FieldRule("Total Tuition", kind="number"),
+        "scheduled_start_date": FieldRule("Scheduled Start Date"),
+    },
+    "Tutoring Agreement": _TUTORING,
+    DocumentTitle.RECURRING_TUTORING.value: _TUTORING,
+    DocumentTitle.ADDITIONAL_SESSION.value: {
+        **_common_rules(),
+        "payment.amount": FieldRule("Amount", kind="number"),
+        "payment.due_date": FieldRule("Due Date"),
+    },
+}
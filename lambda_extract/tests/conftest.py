@@ -0,0 +1,94 @@
+"""
+Offline tests for the extract Lambda. Run from lambda_extract:
+
+    python -m pytest -q
+
+LlamaExtract is replaced by FakeLlama, boto3 clients by botocore Stubbers
+or the benchmarks' LocalAws, and real PDFs by the synthetic ones in
+benchmarks.samples; nothing here talks to AWS or LlamaExtract.
+"""
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# boto3 clients are created offline and stubbed; they only need a region and credentials
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+
+class CountingExtractor:
+    """StubExtractor that records every document it extracts and fails on request."""
+
+    def __init__(self, fail=()):
+        from backfill import StubExtractor
+
+        self.stub = StubExtractor()
+        self.fail = set(fail)
+        self.calls = []
+
+    def extract(self, document):
+        self.calls.append(document.name)
+        if document.name in self.fail:
+            raise RuntimeError(f"extraction failed for {document.name}")
+        return self.stub.extract(document)
+
+    def extract_bundle(self, document):
+        self.calls.append(document.name)
+        return self.stub.extract_bundle(document)
+
+
+class FakeLlama:
+    """
+    LlamaExtract stand-in. Answers {schema name: page range} after the
+    schema's delay, or raises for schemas in fail.
+    """
+
+    def __init__(self, api_key=None):
+        self.delay = {}
+        self.fail = set()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def extract(self, schema, config, files):
+        with self._lock:
+            self.calls.append((schema.__name__, config.page_range))
+        time.sleep(self.delay.get(schema.__name__, 0))
+        if schema.__name__ in self.fail:
+            raise RuntimeError(f"{schema.__name__} failed")
+        return SimpleNamespace(data={schema.__name__: config.page_range})
+
+
+@pytest.fixture
+def fake_llama(monkeypatch):
+    """Every LLMExtractor built in the test gets this FakeLlama as its client."""
+    import extract.app
+
+    llama = FakeLlama()
+    monkeypatch.setattr(extract.app, "LlamaExtract", lambda api_key=None: llama)
+    return llama
+
+
+@pytest.fixture
+def sample_pdf():
+    from benchmarks.samples import sample_agreements
+
+    return next(iter(sample_agreements().values()))
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    """lambda_function with LocalAws, no ledger and a CountingExtractor; set .aws.documents per test."""
+    import lambda_function
+    from benchmarks.batch_events import LocalAws
+
+    monkeypatch.setattr(lambda_function, "aws", LocalAws({}))
+    monkeypatch.setattr(lambda_function, "ledger", None)
+    monkeypatch.setattr(lambda_function, "_extractor", CountingExtractor())
+    monkeypatch.setattr(lambda_function, "SEGMENT_BUNDLES", False)
+    return lambda_function
@@ -0,0 +1,78 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from llama_cloud import ExtractConfig, ExtractMode
+from llama_cloud.core.api_error import ApiError
+
+from extract.agents import RegistryClient, SchemaRegistry
+from schemas.agreements import TutoringSchema
+
+
+class AgentClient:
+    def __init__(self, existing=(), error=None):
+        self.agents = {name: SimpleNamespace(id=f"id-{name}", name=name) for name in existing}
+        self.error = error
+        self.created = []
+
+    def get_agent(self, id=None, name=None):
+        if self.error is not None:
+            raise self.error
+        for agent in self.agents.values():
+            if agent.id == id or agent.name == name:
+                return agent
+        raise ApiError(status_code=404, body="not found")
+
+    def create_agent(self, name, data_schema, config):
+        agent = SimpleNamespace(id=f"id-{name}", name=name, extract=lambda files: SimpleNamespace(data={}))
+        self.agents[name] = agent
+        self.created.append(name)
+        return agent
+
+
+CONFIG = ExtractConfig(extraction_mode=ExtractMode.PREMIUM)
+
+
+def test_manifest_is_reused_only_for_the_same_schemas_source(tmp_path):
+    path = tmp_path / "registry.json"
+    first = SchemaRegistry(manifest_path=str(path))
+    first.entry(TutoringSchema)
+    first.save()
+
+    assert SchemaRegistry(manifest_path=str(path))._schemas == first._schemas
+
+    manifest = json.loads(path.read_text())
+    manifest["source_hash"] = "stale"
+    path.write_text(json.dumps(manifest))
+    assert SchemaRegistry(manifest_path=str(path))._schemas == {}
+
+
+def test_agent_is_created_once_and_found_by_its_recorded_id(tmp_path):
+    path = tmp_path / "registry.json"
+    client = AgentClient()
+
+    agent = SchemaRegistry(manifest_path=str(path)).agent(client, TutoringSchema, CONFIG)
+    again = SchemaRegistry(manifest_path=str(path)).agent(client, TutoringSchema, CONFIG)
+
+    assert client.created == [agent.name]
+    assert again is agent
+
+
+@pytest.mark.parametrize("error", [ApiError(status_code=401, body="denied"), ApiError(status_code=503, body="busy"),
+                                   ConnectionError("reset")])
+def test_lookup_errors_other_than_404_do_not_create_a_duplicate(error):
+    client = AgentClient(error=error)
+
+    with pytest.raises(type(error)):
+        SchemaRegistry().agent(client, TutoringSchema, CONFIG)
+    assert client.created == []
+
+
+def test_registry_client_sends_the_precomputed_json_schema():
+    seen = []
+    inner = SimpleNamespace(extract=lambda schema, config, files: seen.append(schema))
+    registry = SchemaRegistry()
+
+    RegistryClient(inner, registry).extract(TutoringSchema, CONFIG, ["doc.pdf"])
+
+    assert seen == [registry.json_schema(TutoringSchema)]
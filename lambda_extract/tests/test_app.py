@@ -0,0 +1,73 @@
+import time
+
+import pytest
+from pydantic import BaseModel
+
+from benchmarks.samples import make_pdf
+from extract.app import ExtractionError, LLMExtractor
+from extract.document import PdfDocument
+from schemas.registry import ExtractionStep
+
+TITLE = "Two Page Agreement"
+
+
+class FirstPage(BaseModel):
+    name: str = ""
+
+
+class SecondPage(BaseModel):
+    amount: float = 0
+
+
+def _document():
+    return PdfDocument(data=make_pdf([["Two Page Agreement"], ["Payment"]]), name="agreement.pdf")
+
+
+def _extractor(**kwargs):
+    # Upload the whole document so each answer carries its plan page range
+    kwargs.setdefault("slice_pages", False)
+    plans = {TITLE: [ExtractionStep(FirstPage, "1-1"), ExtractionStep(SecondPage, "2-2")]}
+    extractor = LLMExtractor("", plans, {}, **kwargs)
+    extractor._get_title = lambda *_: TITLE
+    return extractor
+
+
+def test_steps_run_concurrently_and_merge_in_plan_order(fake_llama):
+    fake_llama.delay = {"FirstPage": 0.3, "SecondPage": 0.3}
+
+    start = time.monotonic()
+    agreement = _extractor().extract(_document())
+
+    assert time.monotonic() - start < 0.5
+    assert agreement == {"FirstPage": "1-1", "SecondPage": "2-2"}
+
+
+def test_failed_step_keeps_the_others_and_flags_the_agreement(fake_llama):
+    fake_llama.fail.add("SecondPage")
+
+    agreement = _extractor().extract(_document())
+
+    assert agreement["FirstPage"] == "1-1"
+    assert agreement["is_valid"] is False
+    assert [e["schema"] for e in agreement["extraction_errors"]] == ["SecondPage"]
+    assert "SecondPage failed" in agreement["extraction_errors"][0]["error"]
+
+
+def test_every_step_failing_raises(fake_llama):
+    fake_llama.fail |= {"FirstPage", "SecondPage"}
+
+    with pytest.raises(ExtractionError) as raised:
+        _extractor().extract(_document())
+
+    assert [r.ok for r in raised.value.step_results] == [False, False]
+
+
+def test_slow_step_times_out_without_holding_the_plan(fake_llama):
+    fake_llama.delay = {"SecondPage": 2.0}
+
+    start = time.monotonic()
+    agreement = _extractor(step_timeout=0.2).extract(_document())
+
+    assert time.monotonic() - start < 1.0
+    assert agreement["FirstPage"] == "1-1"
+    assert "timed out" in agreement["extraction_errors"][0]["error"]
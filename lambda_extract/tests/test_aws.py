@@ -0,0 +1,56 @@
+import io
+
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from aws.client import AwsAdapter, AwsConfig
+from extract import document as document_module
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setattr(document_module, "_disk_in_use", 0)
+    adapter = AwsAdapter(AwsConfig(bucket="bucket", max_memory_bytes=10, max_disk_bytes=1000))
+    with Stubber(adapter.s3) as stubber:
+        def respond(data, content_length=None):
+            response = {"Body": StreamingBody(io.BytesIO(data), len(data))}
+            if content_length is not None:
+                response["ContentLength"] = content_length
+            stubber.add_response("get_object", response, {"Bucket": "bucket", "Key": "x/a.pdf"})
+        yield adapter, respond
+
+
+def test_small_pdf_stays_in_memory(aws):
+    adapter, respond = aws
+    respond(b"%PDF-small", content_length=10)
+
+    document = adapter.fetch_pdf("x/a.pdf")
+
+    assert document.in_memory
+    assert (document.data, document.name) == (b"%PDF-small", "a.pdf")
+    assert adapter.ingest_stats["memory_documents"] == 1
+    assert adapter.ingest_stats["memory_bytes"] == 10
+
+
+def test_large_pdf_spills_to_disk(aws):
+    adapter, respond = aws
+    respond(b"%PDF-" + b"x" * 45, content_length=50)
+
+    with adapter.fetch_pdf("x/a.pdf") as document:
+        assert not document.in_memory
+        assert document.size == 50
+        assert document_module.disk_in_use() == 50
+    assert document_module.disk_in_use() == 0
+    assert adapter.ingest_stats["disk_documents"] == 1
+
+
+def test_missing_content_length_spills_once_the_body_outgrows_memory(aws):
+    adapter, respond = aws
+    data = b"%PDF-" + b"x" * 45
+    respond(data)
+
+    with adapter.fetch_pdf("x/a.pdf") as document:
+        assert not document.in_memory
+        assert open(document.path, "rb").read() == data
+    assert adapter.ingest_stats["disk_bytes"] == 50
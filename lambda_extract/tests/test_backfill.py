@@ -0,0 +1,111 @@
+import json
+
+from botocore.stub import Stubber
+
+from aws.client import AwsAdapter, AwsConfig
+from backfill import Checkpoint, LocalSource, S3Source, StubExtractor, percentile, process_document, run_backfill
+from benchmarks.samples import make_pdf
+from extract.app import SegmentResult
+from extract.title import Segment
+
+
+class BundleExtractor(StubExtractor):
+    """Splits every document into two agreements, the second of which can fail."""
+
+    def __init__(self, fail_second=False):
+        super().__init__()
+        self.fail_second = fail_second
+
+    def extract_bundle(self, document):
+        second = SegmentResult(Segment("stub", 3, 4, 1.0), agreement={"part": 2})
+        if self.fail_second:
+            second = SegmentResult(Segment("stub", 3, 4, 1.0), error=RuntimeError("segment failed"))
+        return [SegmentResult(Segment("stub", 1, 2, 1.0), agreement={"part": 1}), second]
+
+
+def _write_pdfs(directory, names):
+    for name in names:
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_pdf([[name]]))
+
+
+def test_backfill_processes_every_pdf_and_upserts_by_key(tmp_path):
+    _write_pdfs(tmp_path, ["a.pdf", "b/c.pdf", "notes.txt"])
+    upserts = []
+
+    report = run_backfill(LocalSource(str(tmp_path)), StubExtractor(), workers=2,
+                          upsert_fn=lambda agreement, key: upserts.append((key, agreement["source"])))
+
+    assert report["documents"] == 2
+    assert report["failed"] == 0
+    assert sorted(upserts) == [("a.pdf", "a.pdf"), ("b/c.pdf", "c.pdf")]
+
+
+def test_checkpoint_skips_finished_documents_and_retries_failures(tmp_path):
+    _write_pdfs(tmp_path / "pdfs", ["a.pdf", "b.pdf"])
+    checkpoint_path = tmp_path / "run.ckpt"
+
+    class FailB(StubExtractor):
+        def extract(self, document):
+            if document.name == "b.pdf":
+                raise RuntimeError("boom")
+            return super().extract(document)
+
+    first = run_backfill(LocalSource(str(tmp_path / "pdfs")), FailB(), checkpoint=Checkpoint(str(checkpoint_path)))
+    assert (first["succeeded"], first["failed"]) == (1, 1)
+    assert first["failures"][0]["key"] == "b.pdf"
+
+    second = run_backfill(LocalSource(str(tmp_path / "pdfs")), StubExtractor(),
+                          checkpoint=Checkpoint(str(checkpoint_path)))
+    assert second["documents"] == 1
+    assert second["succeeded"] == 1
+    assert Checkpoint(str(checkpoint_path)).done == {"a.pdf", "b.pdf"}
+
+
+def test_bundles_are_keyed_like_the_lambda(tmp_path, monkeypatch):
+    import lambda_function
+
+    _write_pdfs(tmp_path, ["bundle.pdf"])
+    monkeypatch.setattr(lambda_function, "SEGMENT_BUNDLES", True)
+    upserts = []
+
+    outcome = process_document(LocalSource(str(tmp_path)), BundleExtractor(), "bundle.pdf",
+                                upsert_fn=lambda agreement, key: upserts.append(key))
+
+    assert outcome.ok
+    assert upserts == ["bundle.pdf::pages-1-2", "bundle.pdf::pages-3-4"]
+    assert list(outcome.agreements) == upserts
+
+
+def test_failed_segment_fails_the_document_but_keeps_the_others(tmp_path, monkeypatch):
+    import lambda_function
+
+    _write_pdfs(tmp_path, ["bundle.pdf"])
+    monkeypatch.setattr(lambda_function, "SEGMENT_BUNDLES", True)
+    output = tmp_path / "out.jsonl"
+
+    report = run_backfill(LocalSource(str(tmp_path)), BundleExtractor(fail_second=True), output_path=str(output))
+
+    assert report["failed"] == 1
+    assert "segment failed" in report["failures"][0]["error"]
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert lines == [{"key": "bundle.pdf::pages-1-2", "agreement": {"part": 1}}]
+
+
+def test_s3_source_lists_pdfs_across_pages():
+    aws = AwsAdapter(AwsConfig(bucket="bucket"))
+    with Stubber(aws.s3) as stubber:
+        stubber.add_response("list_objects_v2",
+                             {"Contents": [{"Key": "x/b.PDF"}, {"Key": "x/notes.txt"}], "IsTruncated": True,
+                              "NextContinuationToken": "t"},
+                             {"Bucket": "bucket", "Prefix": "x/"})
+        stubber.add_response("list_objects_v2", {"Contents": [{"Key": "x/a.pdf"}], "IsTruncated": False},
+                             {"Bucket": "bucket", "Prefix": "x/", "ContinuationToken": "t"})
+        assert S3Source(aws, "x/").list_keys() == ["x/a.pdf", "x/b.PDF"]
+
+
+def test_percentile():
+    assert percentile([], 95) == 0.0
+    assert percentile([3.0, 1.0, 2.0], 50) == 2.0
+    assert percentile([float(i) for i in range(1, 101)], 95) == 95.0
@@ -0,0 +1,52 @@
+import json
+
+from aws.client import events_from_sqs_record
+from aws.ledger import MemoryLedger
+from benchmarks.batch_events import sqs_record
+
+
+def test_sqs_bodies_become_handler_events():
+    notification = sqs_record("folder/a+b%20c.pdf", 0)
+    eventbridge = sqs_record("folder/a.pdf", 1)
+    direct = sqs_record("folder/a.pdf", 2)
+    test_event = {"messageId": "t", "body": json.dumps({"Event": "s3:TestEvent"})}
+
+    assert events_from_sqs_record(notification)[0]["detail"]["object"]["key"] == "folder/a b c.pdf"
+    assert events_from_sqs_record(eventbridge)[0]["detail"]["object"]["key"] == "folder/a.pdf"
+    assert events_from_sqs_record(direct) == [{"queryStringParameters": {"s3_path": "folder/a.pdf"}}]
+    assert events_from_sqs_record(test_event) == []
+
+
+def test_batch_reports_only_the_failed_messages(handler, sample_pdf):
+    keys = [f"batch/{i}.pdf" for i in range(9)]
+    for key in keys:
+        handler.aws.documents[key] = sample_pdf
+    # A missing object and a failing extraction
+    del handler.aws.documents["batch/2.pdf"]
+    handler._extractor.fail.add("batch/6.pdf")
+    records = [sqs_record(key, i % 3) for i, key in enumerate(keys)]
+
+    result = handler.lambda_handler({"Records": records}, None)
+
+    failed = {f["itemIdentifier"] for f in result["batchItemFailures"]}
+    assert failed == {records[2]["messageId"], records[6]["messageId"]}
+    assert sorted(handler.aws.upserts) == sorted(set(keys) - {"batch/2.pdf", "batch/6.pdf"})
+
+
+def test_record_in_progress_elsewhere_is_redelivered(handler, sample_pdf, monkeypatch):
+    ledger = MemoryLedger()
+    monkeypatch.setattr(handler, "ledger", ledger)
+    handler.aws.documents["a.pdf"] = sample_pdf
+    # Another invocation holds the claim (LocalAws versions every object as "local")
+    ledger.claim("local/a.pdf#local")
+    record = sqs_record("a.pdf", 2)
+
+    result = handler.lambda_handler({"Records": [record]}, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": record["messageId"]}]}
+    assert handler._extractor.calls == []
+
+
+def test_empty_batch_has_no_failures(handler):
+    record = {"messageId": "t", "eventSource": "aws:sqs", "body": json.dumps({"Event": "s3:TestEvent"})}
+    assert handler.lambda_handler({"Records": [record]}, None) == {"batchItemFailures": []}
@@ -0,0 +1,95 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+from pydantic import BaseModel
+
+from extract.app import LLMExtractor
+from extract.cache import CacheBackend, S3Cache, SqliteCache, step_cache_key
+from extract.document import PdfDocument
+from schemas.registry import ExtractionStep
+
+
+class Schema(BaseModel):
+    name: str = ""
+
+
+class OtherSchema(BaseModel):
+    name: str = ""
+
+
+class BrokenCache(CacheBackend):
+    def get(self, key):
+        raise OSError("cache unavailable")
+
+    def put(self, key, value):
+        raise OSError("cache unavailable")
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 stand-in")
+    return PdfDocument(str(path))
+
+
+def test_step_key_depends_on_document_schema_range_and_config(fake_llama):
+    config = LLMExtractor("", {}, {}).extract_config
+    key = step_cache_key("sha", Schema, "1-1", config)
+
+    assert step_cache_key("sha", Schema, "1-1", config) == key
+    assert step_cache_key("other", Schema, "1-1", config) != key
+    assert step_cache_key("sha", OtherSchema, "1-1", config) != key
+    assert step_cache_key("sha", Schema, "2-2", config) != key
+    assert step_cache_key("sha", Schema, "1-1", config.copy(update={"high_res_ocr": False})) != key
+
+
+def test_cached_step_is_not_extracted_again(fake_llama, document, tmp_path):
+    extractor = LLMExtractor("", {}, {}, cache=SqliteCache(str(tmp_path / "cache.sqlite3")))
+    step = ExtractionStep(Schema, "1-1")
+
+    assert extractor._llm_step(step.schema, step.page_range, document) == {"Schema": "1-1"}
+    assert extractor._llm_step(step.schema, step.page_range, document) == {"Schema": "1-1"}
+    assert len(fake_llama.calls) == 1
+
+
+def test_broken_cache_does_not_fail_the_step(fake_llama, document):
+    extractor = LLMExtractor("", {}, {}, cache=BrokenCache())
+    assert extractor._llm_step(Schema, "1-1", document) == {"Schema": "1-1"}
+    assert len(fake_llama.calls) == 1
+
+
+def test_sqlite_cache_expires_and_evicts_least_recently_used(tmp_path):
+    cache = SqliteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=None, max_bytes=60)
+    cache.put("a", {"v": "x" * 20})
+    cache.put("b", {"v": "y" * 20})
+    cache.get("a")
+    cache.put("c", {"v": "z" * 20})
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+    cache.ttl_seconds = -1
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+def s3():
+    client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+    with Stubber(client) as stubber:
+        yield client, stubber
+
+
+def test_s3_cache_missing_key_is_a_miss(s3):
+    client, stubber = s3
+    stubber.add_client_error("get_object", service_error_code="NoSuchKey", http_status_code=404)
+    assert S3Cache(client, "bucket").get("k") is None
+
+
+@pytest.mark.parametrize("code,status", [("AccessDenied", 403), ("SlowDown", 503)])
+def test_s3_cache_other_errors_propagate(s3, code, status):
+    # A 403 is a missing grant, not a miss
+    client, stubber = s3
+    stubber.add_client_error("get_object", service_error_code=code, http_status_code=status)
+    with pytest.raises(client.exceptions.ClientError):
+        S3Cache(client, "bucket").get("k")
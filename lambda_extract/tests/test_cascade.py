@@ -0,0 +1,134 @@
+import threading
+from types import SimpleNamespace
+from typing import List, Optional
+
+from llama_cloud import ExtractMode
+from pydantic import BaseModel
+
+from benchmarks.samples import make_pdf
+from extract.app import LLMExtractor
+from extract.cascade import Cascade, business_check, checkbox_fields
+from extract.document import PdfDocument
+from extract.planner import composite_schema
+from schemas.agreements import AdditionalSchema, TuitionSchemaFirstPage, TuitionSchemaSecondPage, TutoringSchema
+from schemas.payments import Payment
+from schemas.registry import ExtractionStep
+
+TITLE = "Two Page Agreement"
+
+
+class Service(BaseModel):
+    units: float
+    cost_per_unit: float
+    tuition: float
+
+
+class FirstPage(BaseModel):
+    student: str
+    services: List[Service]
+    total_tuition: float
+
+
+class SecondPage(BaseModel):
+    payment: Payment
+
+
+class Renewal(BaseModel):
+    student: str
+    total_tuition: float
+    authorized: Optional[bool]
+
+
+def test_checkbox_fields_are_found_by_type():
+    assert checkbox_fields(TutoringSchema) == {"automatic_renewal_authorization"}
+    assert checkbox_fields(TuitionSchemaSecondPage) == {"payment"}
+    assert checkbox_fields(composite_schema((TuitionSchemaFirstPage, TuitionSchemaSecondPage))) == {"payment"}
+    # A single payment is printed amounts, not a checkbox
+    assert checkbox_fields(AdditionalSchema) == frozenset()
+    assert checkbox_fields(Renewal) == {"authorized"}
+
+
+def _service(units, cost, tuition):
+    return {"units": units, "cost_per_unit": cost, "tuition": tuition}
+
+
+def test_business_check_accepts_consistent_amounts():
+    data = {"services": [_service(10, 50, 500), _service(2, 250, 500)], "total_tuition": 1000,
+            "payment": {"multiple_payment": [{"amount": 500}, {"amount": 520}]}}
+    assert business_check(data) == set()
+
+
+def test_business_check_flags_fields_that_disagree():
+    assert business_check({"services": [_service(10, 50, 900)]}) == {"services"}
+    assert business_check({"services": [_service(10, 50, 500)], "total_tuition": 800}) == {"services", "total_tuition"}
+    assert business_check({"services": _service(10, 50, 500), "payment": {"amount": 300}}) == {
+        "services", "payment", "total_tuition"}
+    assert business_check({"services": [_service(10, 50, 500)],
+                           "payment": {"single_payment": {"amount": 800}}}) == {"services", "payment", "total_tuition"}
+
+
+class TieredClient:
+    """Answers from `fast` or `premium` by the requested mode, limited to the requested fields."""
+
+    def __init__(self, fast: dict, premium: dict):
+        self.answers = {ExtractMode.FAST: fast, ExtractMode.PREMIUM: premium}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def extract(self, schema, config, files):
+        fields = list(schema.model_fields)
+        with self._lock:
+            self.calls.append((config.extraction_mode.name, sorted(fields)))
+        answer = self.answers[config.extraction_mode]
+        return SimpleNamespace(data={f: answer[f] for f in fields if f in answer})
+
+
+def _extractor(client, plan):
+    extractor = LLMExtractor("", {TITLE: plan}, {}, client=client, cascade=Cascade(), slice_pages=False)
+    extractor._get_title = lambda *_: TITLE
+    return extractor
+
+
+DOCUMENT = PdfDocument(data=make_pdf([["Two Page Agreement"], ["Payment"]]))
+
+
+def test_only_invalid_and_checkbox_fields_reach_premium():
+    client = TieredClient(fast={"student": "Jane", "total_tuition": "n/a", "authorized": False},
+                          premium={"student": "Premium", "total_tuition": 500.0, "authorized": True})
+    extractor = _extractor(client, [ExtractionStep(Renewal, "1-1")])
+
+    data, cheap = extractor._run_step(ExtractionStep(Renewal, "1-1"), DOCUMENT, TITLE)
+
+    assert client.calls == [("FAST", ["student", "total_tuition"]), ("PREMIUM", ["authorized", "total_tuition"])]
+    assert data == {"student": "Jane", "total_tuition": 500.0, "authorized": True}
+    assert cheap == {"student"}
+    assert extractor.cascade.stats.escalations == {"schema": 1, "business": 0, "checkbox": 1}
+
+
+def test_amounts_that_disagree_within_a_step_are_escalated():
+    client = TieredClient(fast={"student": "Jane", "services": [_service(10, 50, 500)], "total_tuition": 900.0},
+                          premium={"services": [_service(10, 50, 500)], "total_tuition": 500.0})
+    extractor = _extractor(client, [ExtractionStep(FirstPage, "1-1")])
+
+    data, cheap = extractor._run_step(ExtractionStep(FirstPage, "1-1"), DOCUMENT, TITLE)
+
+    assert client.calls[1] == ("PREMIUM", ["services", "total_tuition"])
+    assert data["total_tuition"] == 500.0
+    assert cheap == {"student"}
+
+
+def test_payment_on_another_page_escalates_the_cheap_services():
+    # Page 1 is self-consistent in the cheap tier; only page 2's payment shows it is wrong
+    client = TieredClient(
+        fast={"student": "Jane", "services": [_service(10, 50, 500)], "total_tuition": 500.0},
+        premium={"services": [_service(10, 80, 800)], "total_tuition": 800.0,
+                 "payment": {"single_payment": {"amount": 800.0, "due_date": "09/01/25"}, "multiple_payment": None}},
+    )
+    extractor = _extractor(client, [ExtractionStep(FirstPage, "1-1"), ExtractionStep(SecondPage, "2-2")])
+
+    agreement = extractor.extract(DOCUMENT)
+
+    assert ("PREMIUM", ["services", "total_tuition"]) in client.calls
+    assert agreement["total_tuition"] == 800.0
+    assert agreement["student"] == "Jane"
+    assert business_check(agreement) == set()
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+from pydantic import BaseModel
+from pypdf import PdfReader
+
+from benchmarks.samples import make_pdf
+from extract import document as document_module
+from extract.app import LLMExtractor
+from extract.document import DiskBudgetExceeded, PageRangeError, PdfDocument
+
+
+@pytest.fixture(autouse=True)
+def empty_disk_budget(monkeypatch):
+    monkeypatch.setattr(document_module, "_disk_in_use", 0)
+
+
+def test_spill_writes_a_temp_file_removed_on_close():
+    document = PdfDocument.spill([b"%PDF", b"-1.4"], "a.pdf", ceiling=100)
+
+    assert not document.in_memory
+    assert open(document.path, "rb").read() == b"%PDF-1.4"
+    assert (document.name, document.size) == ("a.pdf", 8)
+    assert document_module.disk_in_use() == 8
+
+    document.close()
+    assert not os.path.exists(document.path)
+    assert document_module.disk_in_use() == 0
+
+
+def test_spill_past_the_ceiling_raises_and_cleans_up():
+    before = set(os.listdir("/tmp"))
+    with pytest.raises(DiskBudgetExceeded):
+        PdfDocument.spill([b"x" * 60, b"x" * 60], "a.pdf", ceiling=100)
+
+    assert document_module.disk_in_use() == 0
+    assert set(os.listdir("/tmp")) == before
+
+
+def test_expected_size_is_reserved_up_front():
+    with PdfDocument.spill([b"x" * 10], "a.pdf", ceiling=100, expected_size=80):
+        assert document_module.disk_in_use() == 80
+        with pytest.raises(DiskBudgetExceeded):
+            PdfDocument.spill([b"y"], "b.pdf", ceiling=100, expected_size=30)
+    assert document_module.disk_in_use() == 0
+
+
+def test_in_memory_and_on_disk_documents_hash_the_same(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 stand-in")
+
+    assert PdfDocument(data=b"%PDF-1.4 stand-in").sha256 == PdfDocument(path=str(path)).sha256
+    with pytest.raises(ValueError):
+        PdfDocument()
+
+
+class Schema(BaseModel):
+    name: str = ""
+
+
+def _three_pages():
+    return PdfDocument(data=make_pdf([["one"], ["two"], ["three"]]), name="a.pdf")
+
+
+def test_slice_keeps_only_the_requested_pages_and_is_shared():
+    document = _three_pages()
+    sliced = document.slice("2-3")
+
+    assert sliced.page_count == 2
+    assert [p.extract_text().strip() for p in PdfReader(sliced.source()).pages] == ["two", "three"]
+    assert sliced.size < document.size
+    assert document.slice("2-3") is sliced
+
+
+def test_slice_covering_every_page_returns_the_document():
+    document = _three_pages()
+    assert document.slice("1-3") is document
+    assert document.slice("1-5") is document
+
+
+def test_slice_past_the_last_page_raises():
+    with pytest.raises(PageRangeError):
+        _three_pages().slice("4-5")
+
+
+def test_step_past_the_last_page_fails_without_uploading(fake_llama):
+    extractor = LLMExtractor("", {}, {})
+    with pytest.raises(PageRangeError):
+        extractor._llm_step(Schema, "4-4", _three_pages())
+    assert fake_llama.calls == []
+
+
+def test_step_uploads_the_slice_with_a_remapped_range(fake_llama):
+    extractor = LLMExtractor("", {}, {})
+    assert extractor._llm_step(Schema, "3-3", _three_pages()) == {"Schema": "1-1"}
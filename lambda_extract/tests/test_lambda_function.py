@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from botocore.stub import Stubber
+
+from aws.client import AwsAdapter, AwsConfig, SecretsCache
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_module_load_skips_heavy_imports():
+    # A fresh interpreter, since this test session has already imported everything
+    code = (
+        "import sys, lambda_function; "
+        "print(sorted(m for m in ('boto3', 'llama_cloud_services', 'pdfplumber', 'schemas.registry') "
+        "if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=LAMBDA_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_bad_event_is_rejected_before_the_extractor_is_built(monkeypatch):
+    import lambda_function
+
+    def build(aws):
+        raise AssertionError("extractor built")
+
+    monkeypatch.setattr(lambda_function, "build_extractor", build)
+    with pytest.raises(ValueError):
+        lambda_function.lambda_handler({"source": "aws.events"}, None)
+
+
+def test_secret_blob_is_fetched_once_per_ttl():
+    fetches = []
+
+    def fetch(secret_id):
+        fetches.append(secret_id)
+        return json.dumps({"A": "1", "B": "2"})
+
+    cache = SecretsCache(fetch, ttl_seconds=300)
+    assert (cache.get("app")["A"], cache.get("app")["B"]) == ("1", "2")
+    assert fetches == ["app"]
+
+    cache.ttl_seconds = -1
+    cache.invalidate("app")
+    cache.get("app")
+    cache.get("app")
+    assert fetches == ["app"] * 3
+
+
+def test_adapter_reads_each_parameter_from_one_secret_call():
+    aws = AwsAdapter(AwsConfig(secret_name="app"))
+    with Stubber(aws.secrets) as stubber:
+        stubber.add_response("get_secret_value", {"SecretString": json.dumps({"A": "1", "B": "2"})},
+                             {"SecretId": "app"})
+        assert aws.get_secret_value("A") == "1"
+        assert aws.get_secret_value("B") == "2"
+        stubber.assert_no_pending_responses()
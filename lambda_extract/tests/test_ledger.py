@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from aws.ledger import CLAIMED, DONE, IN_FLIGHT, MemoryLedger, SqliteLedger
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def ledger(request, tmp_path):
+    if request.param == "memory":
+        return MemoryLedger(window_seconds=60, lease_seconds=60)
+    return SqliteLedger(str(tmp_path / "ledger.sqlite3"), window_seconds=60, lease_seconds=60)
+
+
+def test_second_claim_is_in_flight_until_completed(ledger):
+    first = ledger.claim("bucket/a.pdf#v1")
+    assert first.status == CLAIMED and first.owned
+
+    assert ledger.claim("bucket/a.pdf#v1").status == IN_FLIGHT
+
+    ledger.complete(first, {"statusCode": 200, "body": "\"UPDATED\""})
+    done = ledger.claim("bucket/a.pdf#v1")
+    assert done.status == DONE
+    assert done.outcome == {"statusCode": 200, "body": "\"UPDATED\""}
+
+
+def test_released_claim_can_be_claimed_again(ledger):
+    claim = ledger.claim("bucket/a.pdf#v1")
+    ledger.release(claim)
+    assert ledger.claim("bucket/a.pdf#v1").status == CLAIMED
+
+
+def test_new_object_version_is_a_new_claim(ledger):
+    ledger.complete(ledger.claim("bucket/a.pdf#v1"), {"statusCode": 200})
+    assert ledger.claim("bucket/a.pdf#v2").status == CLAIMED
+
+
+def test_stale_token_cannot_complete_or_release(ledger):
+    # A crashed invocation's lease ran out and another invocation took over
+    ledger.lease_seconds = 0
+    old = ledger.claim("bucket/a.pdf#v1")
+    ledger.lease_seconds = 60
+    new = ledger.claim("bucket/a.pdf#v1")
+    assert new.status == CLAIMED and new.token != old.token
+
+    ledger.complete(old, {"statusCode": 500})
+    ledger.release(old)
+    assert ledger.claim("bucket/a.pdf#v1").status == IN_FLIGHT
+
+
+def test_handler_extracts_each_object_version_once(handler, sample_pdf, monkeypatch):
+    monkeypatch.setattr(handler, "ledger", MemoryLedger())
+    handler.aws.documents["a.pdf"] = sample_pdf
+    event = {"source": "aws.s3", "detail": {"bucket": {"name": "b"}, "object": {"key": "a.pdf", "etag": "e1"}}}
+
+    first = handler.lambda_handler(event, None)
+    second = handler.lambda_handler(event, None)
+
+    assert first["statusCode"] == 200
+    assert second == first
+    assert handler._extractor.calls == ["a.pdf"]
+    assert handler.aws.upserts == ["a.pdf"]
+
+    changed = json.loads(json.dumps(event))
+    changed["detail"]["object"]["etag"] = "e2"
+    handler.lambda_handler(changed, None)
+    assert handler._extractor.calls == ["a.pdf", "a.pdf"]
+
+
+def test_failed_extraction_is_released_for_redelivery(handler, sample_pdf, monkeypatch):
+    monkeypatch.setattr(handler, "ledger", MemoryLedger())
+    handler._extractor.fail.add("a.pdf")
+    handler.aws.documents["a.pdf"] = sample_pdf
+    event = {"source": "aws.s3", "detail": {"bucket": {"name": "b"}, "object": {"key": "a.pdf", "etag": "e1"}}}
+
+    with pytest.raises(RuntimeError):
+        handler.lambda_handler(event, None)
+    handler._extractor.fail.clear()
+    assert handler.lambda_handler(event, None)["statusCode"] == 200
+    assert handler._extractor.calls == ["a.pdf", "a.pdf"]
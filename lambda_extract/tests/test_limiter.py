@@ -0,0 +1,170 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.fake_llama import FakeLlamaServer, HttpExtractClient
+from extract.limiter import AdaptiveLimiter, LimitedClient, LimiterCancelled, LimiterTimeout
+from extract.resilience import ResilienceConfig, ResilientClient
+
+
+class Schema:
+    pass
+
+
+def test_success_raises_concurrency_and_rate_additively():
+    limiter = AdaptiveLimiter(concurrency=4, rate=2.0, latency_target=10)
+    limiter.acquire()
+    limiter.release(latency=0.1)
+    assert limiter.limit == pytest.approx(4.25)
+    assert limiter.rate == pytest.approx(2.25)
+
+
+def test_burst_of_throttles_cuts_once():
+    limiter = AdaptiveLimiter(concurrency=4, rate=100.0, burst=4)
+    for _ in range(3):
+        limiter.acquire()
+    # All three started before the first 429 came back
+    for _ in range(3):
+        limiter.release(latency=1.0, throttled=True)
+    assert limiter.stats["throttled"] == 3
+    assert limiter.stats["decreases"] == 1
+    assert limiter.limit == pytest.approx(2.0)
+    assert limiter.rate == pytest.approx(50.0)
+
+
+def test_slow_call_only_trims_concurrency():
+    limiter = AdaptiveLimiter(concurrency=10, rate=5.0, latency_target=1.0)
+    limiter.acquire()
+    limiter.release(latency=2.0)
+    assert limiter.limit == pytest.approx(9.0)
+    assert limiter.rate == pytest.approx(5.0)
+    assert limiter.stats["slow"] == 1
+
+
+def test_concurrency_limit_blocks_until_release():
+    limiter = AdaptiveLimiter(concurrency=1, rate=100.0)
+    limiter.acquire()
+    with pytest.raises(LimiterTimeout):
+        limiter.acquire(timeout=0.05)
+    limiter.release(latency=0.01)
+    limiter.acquire(timeout=0.05)
+
+
+def test_retry_after_pauses_new_calls():
+    limiter = AdaptiveLimiter(concurrency=4, rate=100.0)
+    limiter.acquire()
+    limiter.release(latency=0.01, throttled=True, retry_after_seconds=0.3)
+    with pytest.raises(LimiterTimeout):
+        limiter.acquire(timeout=0.05)
+
+
+def test_cancelled_waiter_gives_up_without_a_slot():
+    limiter = AdaptiveLimiter(concurrency=1, rate=100.0)
+    limiter.acquire()
+    cancelled = threading.Event()
+    threading.Timer(0.05, cancelled.set).start()
+
+    with pytest.raises(LimiterCancelled):
+        limiter.acquire(timeout=5, cancelled=cancelled)
+    assert limiter.in_flight == 1
+
+
+class CountingClient:
+    """Answers after delay; the first `hold` calls wait for release instead."""
+
+    def __init__(self, delay=0.0, hold=0):
+        self.delay = delay
+        self.hold = hold
+        self.calls = 0
+        self.released = threading.Event()
+        self._lock = threading.Lock()
+
+    def extract(self, schema, config, files):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call <= self.hold:
+            self.released.wait()
+        time.sleep(self.delay)
+        return "ok"
+
+
+def _limited(inner, limiter, **config):
+    defaults = {"deadline": 5.0, "base_delay": 0.01, "max_delay": 0.02, "hedge": False}
+    return ResilientClient(LimitedClient(inner, limiter), ResilienceConfig(**(defaults | config)), seed=0)
+
+
+def test_call_abandoned_at_its_deadline_never_reaches_the_server():
+    inner = CountingClient(hold=1)
+    limiter = AdaptiveLimiter(concurrency=1, max_concurrency=1, rate=100.0)
+    client = _limited(inner, limiter, deadline=0.1)
+    holder = threading.Thread(target=client.extract, args=(Schema, None, None), daemon=True)
+    holder.start()
+    time.sleep(0.02)
+
+    try:
+        # Queued behind the held slot until its deadline passes (reported by
+        # whichever of the limiter and the call notices first)
+        with pytest.raises(TimeoutError):
+            client.extract(Schema, None, None)
+    finally:
+        inner.released.set()
+    holder.join()
+    time.sleep(0.1)
+
+    assert inner.calls == 1
+    assert limiter.in_flight == 0
+
+
+def test_losing_hedge_still_waiting_for_a_slot_is_not_sent():
+    inner = CountingClient(delay=0.05)
+    limiter = AdaptiveLimiter(concurrency=1, max_concurrency=1, rate=100.0)
+    client = _limited(inner, limiter, hedge=True, hedge_min_samples=1, hedge_quantile=0.0, max_hedge_ratio=1.0)
+    client.extract(Schema, None, None)
+    client._latencies["Schema"].clear()
+    client._latencies["Schema"].append(0.01)
+
+    # The hedge fires after 10ms but the only slot is held by the first attempt
+    assert client.extract(Schema, None, None) == "ok"
+    time.sleep(0.1)
+
+    assert client.stats["hedges"] == 1
+    assert inner.calls == 2
+    assert limiter.in_flight == 0
+
+
+def _run(server, limiter, calls=24, threads=8):
+    client = HttpExtractClient(server.url)
+    if limiter is not None:
+        client = LimitedClient(client, limiter)
+    client = ResilientClient(client, ResilienceConfig(deadline=30, max_attempts=10, base_delay=0.01,
+                                                      max_delay=0.05, hedge=False), seed=0)
+
+    def one(_):
+        try:
+            client.extract(Schema, None, None)
+            return True
+        except Exception:
+            return False
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return sum(pool.map(one, range(calls)))
+
+
+def test_limiter_keeps_a_throttling_server_below_its_capacity():
+    with FakeLlamaServer(capacity=2, rate=100.0, latency=0.02, jitter=0.0) as server:
+        _run(server, None)
+        unlimited_429s = server.stats["throttled"]
+
+    limiter = AdaptiveLimiter(concurrency=2, max_concurrency=2, rate=100.0, latency_target=5.0)
+    with FakeLlamaServer(capacity=2, rate=100.0, latency=0.02, jitter=0.0) as server:
+        succeeded = _run(server, limiter)
+        limited_429s = server.stats["throttled"]
+
+    assert succeeded == 24
+    assert unlimited_429s > 0
+    assert limited_429s < unlimited_429s
+    # Every 429 the server sent went through the limiter
+    assert limiter.stats["throttled"] == limited_429s
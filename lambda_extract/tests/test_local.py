@@ -0,0 +1,82 @@
+from pydantic import BaseModel
+
+from benchmarks.samples import make_pdf
+from extract.app import LLMExtractor
+from extract.document import PdfDocument
+from extract.local import LocalExtractor, split_valid_fields
+from schemas.layouts import FieldRule
+from schemas.registry import ExtractionStep
+
+
+class Enrollment(BaseModel):
+    first_name: str
+    units: float
+    doc_id: str
+
+
+TEMPLATES = {
+    "Enrollment": {
+        "first_name": FieldRule("First Name"),
+        "units": FieldRule("Total Sessions Purchased", kind="number"),
+        "doc_id": FieldRule("Document ID"),
+    }
+}
+STEP = ExtractionStep(Enrollment, "1-1")
+
+
+def _document(*lines):
+    return PdfDocument(data=make_pdf([list(lines)]))
+
+
+def test_fields_are_read_right_of_their_labels():
+    document = _document("First Name: Jane", "Total Sessions Purchased: 0.5", "Document ID: D-1")
+    assert LocalExtractor(TEMPLATES).extract("Enrollment", STEP, document) == {
+        "first_name": "Jane", "units": 0.5, "doc_id": "D-1",
+    }
+
+
+def test_unknown_title_reads_nothing():
+    assert LocalExtractor(TEMPLATES).extract("Invoice", STEP, _document("First Name: Jane")) == {}
+
+
+def test_invalid_values_are_left_for_the_llm():
+    valid, missing = split_valid_fields(Enrollment, {"first_name": "Jane", "units": "many"})
+    assert valid == {"first_name": "Jane"}
+    assert missing == ["units", "doc_id"]
+
+
+def test_llm_is_only_asked_for_fields_the_template_missed(fake_llama):
+    extractor = LLMExtractor("", {}, {}, local_extractor=LocalExtractor(TEMPLATES))
+    document = _document("First Name: Jane", "Total Sessions Purchased: 4")
+
+    data, _ = extractor._run_step(STEP, document, "Enrollment")
+
+    assert fake_llama.calls == [("EnrollmentMissing", "1-1")]
+    assert data == {"first_name": "Jane", "units": 4.0, "EnrollmentMissing": "1-1"}
+
+
+def test_fully_read_step_makes_no_llm_call(fake_llama):
+    extractor = LLMExtractor("", {}, {}, local_extractor=LocalExtractor(TEMPLATES))
+    document = _document("First Name: Jane", "Total Sessions Purchased: 4", "Document ID: D-1")
+
+    data, _ = extractor._run_step(STEP, document, "Enrollment")
+    assert data["doc_id"] == "D-1"
+    assert fake_llama.calls == []
+
+
+def test_checkbox_fields_are_never_taken_from_the_local_tier(fake_llama):
+    class Renewal(BaseModel):
+        first_name: str
+        authorized: bool
+
+    templates = {"Renewal": {
+        "first_name": FieldRule("First Name"),
+        "authorized": FieldRule("I authorize automatic renewal", kind="checkbox"),
+    }}
+    extractor = LLMExtractor("", {}, {}, local_extractor=LocalExtractor(templates))
+    document = _document("First Name: Jane", "I authorize automatic renewal")
+
+    data, _ = extractor._run_step(ExtractionStep(Renewal, "1-1"), document, "Renewal")
+
+    assert data["first_name"] == "Jane"
+    assert fake_llama.calls == [("RenewalMissing", "1-1")]
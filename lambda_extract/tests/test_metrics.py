@@ -0,0 +1,63 @@
+import json
+
+from pydantic import BaseModel
+
+from benchmarks.samples import make_pdf
+from extract import metrics
+from extract.app import LLMExtractor
+from extract.document import PdfDocument
+from schemas.registry import ExtractionStep
+
+TITLE = "Two Page Agreement"
+
+
+class FirstPage(BaseModel):
+    name: str = ""
+
+
+class SecondPage(BaseModel):
+    amount: float = 0
+
+
+def _emf(capsys) -> dict:
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert len(lines) == 1
+    return json.loads(lines[0])
+
+
+def test_invocation_flushes_one_emf_line(capsys):
+    with metrics.invocation():
+        with metrics.timed("s3_download"):
+            pass
+        metrics.count("pdf_bytes", 2048, "Bytes")
+        metrics.count("llm_calls")
+        metrics.count("llm_calls")
+        metrics.set_dimension("DocumentTitle", TITLE)
+
+    emf = _emf(capsys)
+    definition = emf["_aws"]["CloudWatchMetrics"][0]
+    assert definition["Dimensions"] == [["DocumentTitle"]]
+    assert {"Name": "pdf_bytes", "Unit": "Bytes"} in definition["Metrics"]
+    assert {"Name": "s3_download", "Unit": "Milliseconds"} in definition["Metrics"]
+    assert (emf["DocumentTitle"], emf["llm_calls"], emf["pdf_bytes"]) == (TITLE, 2, 2048)
+
+
+def test_calls_outside_an_invocation_record_nothing(capsys):
+    with metrics.timed("s3_download"):
+        metrics.count("llm_calls")
+    assert capsys.readouterr().out == ""
+
+
+def test_step_threads_record_into_the_invocation(fake_llama, capsys):
+    plans = {TITLE: [ExtractionStep(FirstPage, "1-1"), ExtractionStep(SecondPage, "2-2")]}
+    extractor = LLMExtractor("", plans, {})
+    extractor._get_title = lambda *_: TITLE
+    document = PdfDocument(data=make_pdf([["Jane Doe"], ["Amount: 10"]]))
+
+    with metrics.invocation():
+        extractor.extract(document)
+
+    emf = _emf(capsys)
+    assert emf["DocumentTitle"] == TITLE
+    assert emf["llm_calls"] == 2
+    assert "llm_FirstPage" in emf and "llm_SecondPage" in emf
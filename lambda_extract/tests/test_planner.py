@@ -0,0 +1,70 @@
+from pydantic import BaseModel
+
+from benchmarks.samples import make_pdf
+from extract.app import LLMExtractor
+from extract.document import PdfDocument
+from extract.planner import FusionPolicy, compile_plans, field_accuracy, format_page_range
+from schemas.agreements import TuitionSchemaFirstPage, TuitionSchemaSecondPage
+from schemas.registry import EXTRACTION_PLANS, ExtractionStep
+
+TUITION = "Enrollment & Tuition Agreement"
+
+
+class Name(BaseModel):
+    name: str = ""
+
+
+class Amount(BaseModel):
+    amount: float = 0
+
+
+class NameAgain(BaseModel):
+    name: str = ""
+
+
+def test_plans_are_unchanged_by_default():
+    assert compile_plans(EXTRACTION_PLANS) == EXTRACTION_PLANS
+
+
+def test_selected_title_fuses_into_one_step_over_the_union_of_pages():
+    compiled = compile_plans(EXTRACTION_PLANS, FusionPolicy(titles={TUITION}))
+
+    (step,) = compiled[TUITION]
+    assert step.page_range == "1-2"
+    assert set(step.schema.model_fields) == (
+        set(TuitionSchemaFirstPage.model_fields) | set(TuitionSchemaSecondPage.model_fields)
+    )
+    assert compiled["ESA Enrollment & Tuition Agreement"] == EXTRACTION_PLANS["ESA Enrollment & Tuition Agreement"]
+
+
+def test_overlapping_fields_and_single_steps_are_not_fused():
+    plans = {
+        "overlap": [ExtractionStep(Name, "1-1"), ExtractionStep(NameAgain, "2-2")],
+        "single": [ExtractionStep(Name, "1-1")],
+    }
+    assert compile_plans(plans, FusionPolicy(fuse_all=True)) == plans
+
+
+def test_measured_accuracy_vetoes_fusion():
+    plans = {"t": [ExtractionStep(Name, "1-1"), ExtractionStep(Amount, "3-3")]}
+    worse = FusionPolicy(fuse_all=True, accuracy={"t": {"fused": 0.80, "split": 0.95}}, tolerance=0.05)
+    close = FusionPolicy(fuse_all=True, accuracy={"t": {"fused": 0.92, "split": 0.95}}, tolerance=0.05)
+
+    assert compile_plans(plans, worse) == plans
+    (step,) = compile_plans(plans, close)["t"]
+    assert step.page_range == "1-1,3-3"
+
+
+def test_fused_step_makes_one_call_with_the_merged_shape(fake_llama):
+    plans = {"t": [ExtractionStep(Name, "1-1"), ExtractionStep(Amount, "2-2")]}
+    extractor = LLMExtractor("", plans, {}, fusion_policy=FusionPolicy(titles={"t"}))
+
+    (step,) = extractor.extraction_plans["t"]
+    extractor._llm_step(step.schema, step.page_range, PdfDocument(data=make_pdf([["a"], ["b"]])))
+
+    assert fake_llama.calls == [("Name_Amount", "1-2")]
+
+
+def test_format_page_range_and_field_accuracy():
+    assert format_page_range({3, 1, 2, 5}) == "1-3,5-5"
+    assert field_accuracy({"a": 1, "b": {"c": [2, 3]}}, {"a": 1, "b": {"c": [2, 4]}}) == 2 / 3
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from pydantic import BaseModel
+
+from benchmarks.samples import FIRST_PAGE_LINES, make_pdf
+from extract.app import LLMExtractor
+from extract.document import PdfDocument
+from extract.preflight import DIGITAL, MIXED, SCANNED, DocumentProfile, PageProfile, TextLayerAnalyzer
+
+FULL_PAGE_IMAGE = {"x0": 0, "x1": 612, "top": 0, "bottom": 792}
+
+
+def _page(chars=0, font="Helvetica", images=()):
+    return SimpleNamespace(chars=[{"fontname": font}] * chars, images=list(images), width=612, height=792)
+
+
+def _kind(page):
+    return TextLayerAnalyzer().classify_page(page, 1).kind
+
+
+def test_text_without_images_is_digital():
+    assert _kind(_page(chars=400)) == DIGITAL
+
+
+def test_page_sized_image_without_text_is_scanned():
+    assert _kind(_page(images=[FULL_PAGE_IMAGE])) == SCANNED
+
+
+def test_invisible_ocr_layer_counts_as_scanned():
+    assert _kind(_page(chars=2000, font="ABCDEF+GlyphLessFont", images=[FULL_PAGE_IMAGE])) == SCANNED
+
+
+def test_real_text_over_a_page_image_is_mixed():
+    assert _kind(_page(chars=400, images=[FULL_PAGE_IMAGE])) == MIXED
+    assert _kind(_page(chars=10)) == MIXED
+
+
+def test_analyse_profiles_only_the_requested_pages():
+    pdf = make_pdf([FIRST_PAGE_LINES, FIRST_PAGE_LINES, []])
+    profile = TextLayerAnalyzer().analyse(PdfDocument(data=pdf).source(), {1, 3})
+
+    assert sorted(profile.pages) == [1, 3]
+    assert profile.pages[1].kind == DIGITAL
+    assert profile.kind_for({1}) == DIGITAL
+    assert profile.kind == MIXED
+
+
+def test_digital_steps_turn_off_high_resolution_mode():
+    class Schema(BaseModel):
+        name: str = ""
+
+    class RecordingClient:
+        def __init__(self):
+            self.high_res = []
+
+        def extract(self, schema, config, files):
+            self.high_res.append(config.high_resolution_mode)
+            return SimpleNamespace(data={})
+
+    client = RecordingClient()
+    extractor = LLMExtractor("", {}, {}, client=client, preflight=TextLayerAnalyzer())
+    document = PdfDocument(data=make_pdf([FIRST_PAGE_LINES, []]))
+    digital = DocumentProfile({1: PageProfile(1, DIGITAL, 400, 4.0, 0.0, True)})
+    scanned = DocumentProfile({1: PageProfile(1, SCANNED, 0, 0.0, 1.0, False)})
+
+    extractor._llm_step(Schema, "1-1", document, digital)
+    extractor._llm_step(Schema, "1-1", document, scanned)
+    extractor._llm_step(Schema, "1-1", document, None)
+
+    assert client.high_res == [False, True, True]
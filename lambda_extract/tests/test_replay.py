@@ -0,0 +1,52 @@
+import pytest
+from pydantic import BaseModel
+
+from benchmarks.samples import make_pdf
+from extract.app import LLMExtractor
+from extract.document import PdfDocument
+from extract.replay import CassetteMissing, RecordingExtractor, ReplayExtractor, synthesize
+from schemas.agreements import TutoringSchema
+from schemas.registry import ExtractionStep
+
+TITLE = "Two Page Agreement"
+
+
+class FirstPage(BaseModel):
+    name: str = ""
+
+
+class SecondPage(BaseModel):
+    amount: float = 0
+
+
+def _extractor(client):
+    plans = {TITLE: [ExtractionStep(FirstPage, "1-1"), ExtractionStep(SecondPage, "2-2")]}
+    extractor = LLMExtractor("", plans, {}, client=client)
+    extractor._get_title = lambda *_: TITLE
+    return extractor
+
+
+def _document():
+    return PdfDocument(data=make_pdf([["Two Page Agreement"], ["Payment"]]), name="agreement.pdf")
+
+
+def test_recorded_results_replay_without_the_real_client(fake_llama, tmp_path):
+    recorded = _extractor(RecordingExtractor(fake_llama, str(tmp_path))).extract(_document())
+
+    replay = ReplayExtractor(str(tmp_path))
+    assert _extractor(replay).extract(_document()) == recorded
+    assert replay.calls == 2
+    assert len(fake_llama.calls) == 2
+
+
+def test_missing_cassette_raises_unless_synthesized(fake_llama, tmp_path):
+    extractor = _extractor(ReplayExtractor(str(tmp_path)))
+    with pytest.raises(CassetteMissing):
+        extractor._llm_step(FirstPage, "1-1", _document())
+
+    extractor = _extractor(ReplayExtractor(str(tmp_path), synthesize_missing=True))
+    assert extractor._llm_step(FirstPage, "1-1", _document()) == {"name": "sample"}
+
+
+def test_synthesized_data_validates_against_the_schema():
+    TutoringSchema.model_validate(synthesize(TutoringSchema))
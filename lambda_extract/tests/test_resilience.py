@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from extract.resilience import ExtractDeadlineExceeded, ResilienceConfig, ResilientClient
+
+
+class Schema:
+    pass
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+class FlakyClient:
+    """Fails the first `failures` calls with a 429 and holds the next `hangs` until released."""
+
+    def __init__(self, failures=0, hangs=0):
+        self.failures = failures
+        self.hangs = hangs
+        self.calls = 0
+        self.released = threading.Event()
+        self._lock = threading.Lock()
+
+    def extract(self, schema, config, files):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call <= self.failures:
+            raise Throttled()
+        if call <= self.failures + self.hangs:
+            self.released.wait()
+        return "ok"
+
+
+def _client(inner, **config):
+    defaults = {"deadline": 5.0, "base_delay": 0.01, "max_delay": 0.02, "hedge": False}
+    return ResilientClient(inner, ResilienceConfig(**(defaults | config)), seed=0)
+
+
+def test_retryable_errors_are_retried():
+    client = _client(FlakyClient(failures=2))
+    assert client.extract(Schema, None, None) == "ok"
+    assert client.stats["retries"] == 2
+
+
+def test_non_retryable_errors_are_not_retried():
+    class Broken:
+        def extract(self, schema, config, files):
+            raise ValueError("bad schema")
+
+    client = _client(Broken())
+    with pytest.raises(ValueError):
+        client.extract(Schema, None, None)
+    assert client.stats["retries"] == 0
+
+
+def test_abandoned_calls_do_not_delay_later_calls():
+    inner = FlakyClient(hangs=20)
+    client = _client(inner, deadline=0.05)
+    for _ in range(20):
+        with pytest.raises(ExtractDeadlineExceeded):
+            client.extract(Schema, None, None)
+
+    # The twenty abandoned calls are still holding their threads
+    start = time.monotonic()
+    try:
+        assert client.extract(Schema, None, None) == "ok"
+        assert time.monotonic() - start < 0.5
+    finally:
+        inner.released.set()
@@ -0,0 +1,81 @@
+import io
+
+import pytest
+
+from aws.client import segment_key, split_segment_key
+from benchmarks.samples import FIRST_PAGE_LINES, make_pdf
+from extract.title import TitleClassifier, UnknownDocumentTitle
+from schemas.enums import DocumentTitle
+from schemas.registry import EXTRACTION_PLANS
+
+TITLE = "ESA Enrollment & Tuition Agreement"
+
+
+@pytest.fixture
+def classifier():
+    return TitleClassifier([*EXTRACTION_PLANS, *(t.value for t in DocumentTitle)])
+
+
+def _segments(classifier, pages):
+    # One-page plans, so only the title test decides where agreements start
+    return [(s.title, s.page_range) for s in classifier.segment(io.BytesIO(make_pdf(pages)), {TITLE: 1})]
+
+
+def test_title_page_starts_a_new_agreement(classifier):
+    pages = [[TITLE, *FIRST_PAGE_LINES], ["Payment Schedule"], [TITLE, *FIRST_PAGE_LINES]]
+    assert _segments(classifier, pages) == [(TITLE, "1-2"), (TITLE, "3-3")]
+
+
+def test_wrapped_title_starts_a_new_agreement(classifier):
+    pages = [[TITLE, *FIRST_PAGE_LINES], ["ESA Enrollment &", "Tuition Agreement", *FIRST_PAGE_LINES]]
+    assert _segments(classifier, pages) == [(TITLE, "1-1"), (TITLE, "2-2")]
+
+
+@pytest.mark.parametrize("page_two", [
+    # Body text quoting the title scores 0.853, above min_confidence
+    [f"This {TITLE} is governed by state law", "Payment Schedule"],
+    # The title, but not as the first line
+    ["Payment Schedule", TITLE],
+    ["Payment Schedule", f"Signed under the {TITLE}"],
+])
+def test_title_mentioned_in_the_body_does_not_split(classifier, page_two):
+    assert _segments(classifier, [[TITLE, *FIRST_PAGE_LINES], page_two]) == [(TITLE, "1-2")]
+
+
+def test_title_repeated_within_min_pages_is_a_running_header(classifier):
+    pages = [[TITLE, *FIRST_PAGE_LINES], [TITLE, "Payment Schedule"], [TITLE, *FIRST_PAGE_LINES]]
+    segments = classifier.segment(io.BytesIO(make_pdf(pages)), {TITLE: 2})
+    assert [(s.title, s.page_range) for s in segments] == [(TITLE, "1-2"), (TITLE, "3-3")]
+
+
+def test_bundle_without_any_title_is_rejected(classifier):
+    with pytest.raises(UnknownDocumentTitle):
+        classifier.segment(io.BytesIO(make_pdf([["Payment Schedule"], ["Signatures"]])))
+
+
+def test_segment_keys_round_trip():
+    key = segment_key("campus/scan 1.pdf", "3-5")
+    assert key == "campus/scan 1.pdf::pages-3-5"
+    assert split_segment_key(key) == ("campus/scan 1.pdf", "3-5")
+    assert split_segment_key("campus/scan 1.pdf") == ("campus/scan 1.pdf", None)
+    assert split_segment_key("campus/odd::pages-x.pdf") == ("campus/odd::pages-x.pdf", None)
+
+
+def test_segment_key_is_extracted_from_its_pages_of_the_bundle(handler):
+    handler.aws.documents["bundle.pdf"] = make_pdf([["p1"], ["p2"], ["p3"], ["p4"]])
+    pages = []
+    handler._extractor.extract = lambda document: pages.append(document.page_count) or {"pages": document.page_count}
+
+    response = handler.lambda_handler({"queryStringParameters": {"s3_path": "bundle.pdf::pages-2-3"}}, None)
+
+    assert response["statusCode"] == 200
+    assert pages == [2]
+    assert handler.aws.upserts == ["bundle.pdf::pages-2-3"]
+
+
+def test_unsplit_document_keeps_its_key(handler, sample_pdf, monkeypatch):
+    monkeypatch.setattr(handler, "SEGMENT_BUNDLES", True)
+    handler.aws.documents["a.pdf"] = sample_pdf
+
+    assert handler.lambda_handler({"queryStringParameters": {"s3_path": "a.pdf"}}, None)["statusCode"] == 200
+    assert handler.aws.upserts == ["a.pdf"]
@@ -0,0 +1,59 @@
+import pytest
+
+from benchmarks.samples import make_pdf
+from extract.app import LLMExtractor
+from extract.title import TitleClassifier, UnknownDocumentTitle, normalize_title
+from schemas.enums import DocumentTitle
+from schemas.registry import EXTRACTION_PLANS
+
+
+@pytest.fixture
+def classifier():
+    return TitleClassifier([*EXTRACTION_PLANS, *(t.value for t in DocumentTitle)])
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    def write(*pages):
+        path = tmp_path / "document.pdf"
+        path.write_bytes(make_pdf(list(pages)))
+        return str(path)
+    return write
+
+
+def test_normalize_title():
+    assert normalize_title("  ESA Enrollment &  Tuition-Agreement ") == "esa enrollment and tuition agreement"
+
+
+def test_exact_title_on_the_first_line(classifier, pdf):
+    match = classifier.classify(pdf(["Enrollment & Tuition Agreement", "First Name: Sample"]))
+    assert (match.title, match.confidence) == ("Enrollment & Tuition Agreement", 1.0)
+
+
+def test_title_after_a_header_line(classifier, pdf):
+    match = classifier.classify(pdf(["Brightmont Academy", "Skill Building Agreement", "First Name: Sample"]))
+    assert match.title == "Skill Building Agreement"
+
+
+def test_ocr_noise_still_matches_the_most_specific_title(classifier, pdf):
+    match = classifier.classify(pdf(["ESA Enro1lment & Tuition Agreernent"]))
+    assert match.title == "ESA Enrollment & Tuition Agreement"
+    assert classifier.min_confidence <= match.confidence < 1.0
+
+
+def test_only_the_first_page_is_read(classifier, pdf):
+    with pytest.raises(UnknownDocumentTitle):
+        classifier.classify(pdf(["Invoice"], ["Skill Building Agreement"]))
+
+
+def test_unknown_title_raises_before_any_llm_call(classifier, pdf):
+    with pytest.raises(UnknownDocumentTitle):
+        classifier.classify(pdf(["Quarterly Newsletter", "Campus events"]))
+
+
+def test_title_without_a_plan_raises(fake_llama, pdf):
+    extractor = LLMExtractor("", EXTRACTION_PLANS, {},
+                             title_classifier=TitleClassifier(["Tutoring Agreement", "Field Trip Waiver"]))
+    with pytest.raises(UnknownDocumentTitle):
+        extractor.extract(pdf(["Field Trip Waiver"]))
+    assert fake_llama.calls == []
@@ -17,6 +17,8 @@ def lambda_handler(event, context):
 
         else:
             print("START DOWNLOADING...")
+            # Agreements split from a bundle are stored as "<key>::pages-<range>"; serve the bundle
+            path_value = path_value.split("::pages-")[0]
             # 1) Download PDF from S3 into memory
             obj = s3.get_object(Bucket=BUCKET, Key=path_value)
             pdf_bytes = obj["Body"].read()
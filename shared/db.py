@@ -0,0 +1,234 @@
+"""
+Postgres access shared by the database Lambdas (lambda_db_save and
+lambda_agreements_feedback_handler).
+
+Each container keeps one connection, created on first use. Before a
+connection that has been idle for DB_HEALTH_CHECK_SECONDS is reused it is
+pinged with SELECT 1; a broken one is replaced, with up to
+DB_CONNECT_ATTEMPTS connects and full-jitter backoff between them.
+
+Hot statements are registered once with prepare(name, sql) and PREPAREd on
+the server the first time each connection runs them; execute() then sends
+only EXECUTE name (...). DB_PREPARE=0 turns this off (e.g. behind a
+transaction-pooling PgBouncer, which cannot keep prepared statements).
+
+Connect, health check, prepare and execute times are recorded per request
+and for the life of the container; call begin_request() at the start of an
+invocation and report() at the end.
+"""
+import itertools
+import os
+import random
+import re
+import time
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+_PLACEHOLDER = re.compile(r"%s")
+
+
+def _numbered(sql):
+    """%s placeholders to $1, $2, ... as PREPARE expects."""
+    counter = itertools.count(1)
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", sql), sql.count("%s")
+
+
+class Database:
+    def __init__(
+        self,
+        url: Callable[[], str],
+        connect_timeout: int = 5,
+        connect_attempts: int = 3,
+        backoff: float = 0.2,
+        max_backoff: float = 2.0,
+        health_check_seconds: float = 30.0,
+        use_prepared: bool = True,
+    ):
+        # Called once, on the first connect, so importing a handler does not read secrets
+        self._url_provider = url
+        self._url: Optional[str] = None
+        self.connect_timeout = connect_timeout
+        self.connect_attempts = max(1, connect_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.health_check_seconds = health_check_seconds
+        self.use_prepared = use_prepared
+
+        self._conn = None
+        self._last_used = 0.0
+        # name -> (sql with %s, sql with $n, parameter count)
+        self._statements: dict[str, tuple[str, str, int]] = {}
+        self._prepared: set[str] = set()
+
+        self.stats = {"requests": 0, "connects": 0, "reconnects": 0, "failed_connects": 0,
+                      "health_checks": 0, "prepares": 0, "executes": 0}
+        self.request = {}
+
+    # Statements
+
+    def prepare(self, name: str, sql: str) -> None:
+        """Register sql (with %s placeholders) under name; PREPAREd lazily per connection."""
+        self._statements[name] = (sql, *_numbered(sql))
+
+    def execute(self, cur, name: str, params=()) -> None:
+        raw_sql, sql, count = self._statements[name]
+        if not self.use_prepared or cur.connection is not self._conn:
+            # A connection this object did not open (scripts, benchmarks): plain statement
+            cur.execute(raw_sql, params)
+            return
+
+        if len(params) != count:
+            raise ValueError(f"{name} takes {count} parameters, got {len(params)}")
+        if name not in self._prepared:
+            started = time.perf_counter()
+            cur.execute(f"PREPARE {name} AS {sql}")
+            self._prepared.add(name)
+            self._add("prepare_seconds", time.perf_counter() - started)
+            self.stats["prepares"] += 1
+
+        started = time.perf_counter()
+        try:
+            if count:
+                cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * count)})", params)
+            else:
+                cur.execute(f"EXECUTE {name}")
+        except psycopg2.errors.FeatureNotSupported as e:
+            # "cached plan must not change result type" after a schema change;
+            # the next request prepares the statement again
+            if "cached plan" in str(e):
+                self._prepared.discard(name)
+                self._deallocate_after_error(name)
+            raise
+        finally:
+            self._add("execute_seconds", time.perf_counter() - started)
+            self.stats["executes"] += 1
+            self._last_used = time.monotonic()
+
+    def _deallocate_after_error(self, name: str) -> None:
+        conn = self._conn
+        # Inside a failed transaction the DEALLOCATE has to wait for the rollback
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self.close()
+            return
+        with conn.cursor() as cur:
+            cur.execute(f"DEALLOCATE {name}")
+
+    # Connection
+
+    def connection(self):
+        """A healthy connection, reusing the container's one when it is still good."""
+        conn = self._conn
+        if conn is not None and not conn.closed:
+            if self._healthy(conn):
+                self.request.setdefault("reused", True)
+                return conn
+            self.stats["reconnects"] += 1
+            self.close()
+        elif conn is not None:
+            self.stats["reconnects"] += 1
+        return self._connect()
+
+    def _healthy(self, conn) -> bool:
+        status = conn.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            conn.rollback()
+        if time.monotonic() - self._last_used < self.health_check_seconds:
+            return True
+
+        started = time.perf_counter()
+        self.stats["health_checks"] += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            self._last_used = time.monotonic()
+            return True
+        except psycopg2.Error as e:
+            print(f"DB health check failed, reconnecting: {e!r}")
+            return False
+        finally:
+            self._add("health_check_seconds", time.perf_counter() - started)
+
+    def _connect(self):
+        if self._url is None:
+            self._url = self._url_provider()
+        url = urlparse(self._url)
+
+        started = time.perf_counter()
+        for attempt in range(self.connect_attempts):
+            try:
+                conn = psycopg2.connect(
+                    dbname=url.path.lstrip("/"),
+                    user=url.username,
+                    password=url.password,
+                    host=url.hostname,
+                    port=url.port or 5432,
+                    connect_timeout=self.connect_timeout,
+                )
+                break
+            except psycopg2.OperationalError as e:
+                self.stats["failed_connects"] += 1
+                if attempt + 1 == self.connect_attempts:
+                    self._add("connect_seconds", time.perf_counter() - started)
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                print(f"DB connect failed (attempt {attempt + 1}), retrying in {delay:.2f}s: {e!r}")
+                time.sleep(delay)
+
+        conn.autocommit = True
+        self._conn = conn
+        self._prepared = set()
+        self._last_used = time.monotonic()
+        self.stats["connects"] += 1
+        self.request["reused"] = False
+        self._add("connect_seconds", time.perf_counter() - started)
+        return conn
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        self._prepared = set()
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # Instrumentation
+
+    def _add(self, key: str, seconds: float) -> None:
+        self.request[key] = self.request.get(key, 0.0) + seconds
+
+    def begin_request(self) -> None:
+        self.stats["requests"] += 1
+        self.request = {}
+
+    def report(self) -> dict:
+        timings = {k: round(v * 1000, 2) for k, v in self.request.items() if k.endswith("_seconds")}
+        summary = {
+            "reused_connection": self.request.get("reused", False),
+            **{k.replace("_seconds", "_ms"): v for k, v in timings.items()},
+            "container": dict(self.stats),
+        }
+        print(f"DB: {summary}")
+        return summary
+
+
+def database_from_env(url: Callable[[], str]) -> Database:
+    return Database(
+        url,
+        connect_timeout=int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
+        connect_attempts=int(os.getenv("DB_CONNECT_ATTEMPTS", "3")),
+        health_check_seconds=float(os.getenv("DB_HEALTH_CHECK_SECONDS", "30")),
+        use_prepared=os.getenv("DB_PREPARE", "1") == "1",
+    )